@@ -0,0 +1,232 @@
+"""
+Database access for the data processing service
+
+Connections come from a bounded, process-wide pool instead of a new
+psycopg2.connect per request. `get_db_connection()` keeps its interface:
+it returns a connection whose `close()` hands it back to the pool (rolled
+back to a clean state), so existing call sites need no change. Connections
+idle for a while are checked with a cheap query before being reused.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger(__name__)
+
+
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+# Attente maximale d'une connexion libre quand le pool est saturé
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Une connexion inutilisée depuis plus longtemps est testée (SELECT 1) avant d'être rendue
+DB_POOL_HEALTHCHECK_SECONDS = float(os.getenv('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+
+def _connect():
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'postgres'),
+        port=os.getenv('DB_PORT', '5432'),
+        database=os.getenv('DB_NAME', 'inovadata'),
+        user=os.getenv('DB_USER', 'inovadata'),
+        password=os.getenv('DB_PASSWORD', 'djkqsqsldhqkedeqzdfq'),
+        connect_timeout=int(os.getenv('DB_CONNECT_TIMEOUT', '10'))
+    )
+
+
+class PooledConnection:
+    """psycopg2 connection borrowed from the pool; `close()` returns it"""
+
+    def __init__(self, pool: 'ConnectionPool', conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.commit()
+        self.close()
+
+    def close(self) -> None:
+        conn, self._conn = self.__dict__.get('_conn'), None
+        if conn is not None:
+            self._pool.release(conn)
+
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
+
+    def __del__(self):
+        # Filet de sécurité : une connexion oubliée retourne au pool
+        if self.__dict__.get('_conn') is not None:
+            logger.warning("⚠️ Database connection garbage-collected without close(), returned to the pool")
+            try:
+                self.close()
+            except Exception:
+                pass
+
+
+class ConnectionPool:
+    """Bounded pool of psycopg2 connections with health checks and saturation metrics"""
+
+    def __init__(self, max_size: int = DB_POOL_MAX, min_size: int = DB_POOL_MIN,
+                 timeout: float = DB_POOL_TIMEOUT, healthcheck_after: float = DB_POOL_HEALTHCHECK_SECONDS,
+                 connect=_connect):
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self._connect = connect
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = deque()         # (connexion, instant de retour au pool)
+        self._lock = threading.Lock()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'healthcheck_failures': 0
+        }
+        self._in_use = 0
+        self._peak_in_use = 0
+
+    def _count(self, name: str, value=1) -> None:
+        with self._lock:
+            self._stats[name] += value
+
+    def _healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            self._count('healthcheck_failures')
+            return False
+
+    def getconn(self) -> PooledConnection:
+        """Borrow a connection, waiting up to `timeout` seconds when the pool is saturated"""
+        if not self._slots.acquire(blocking=False):
+            self._count('waits')
+            started = time.monotonic()
+            acquired = self._slots.acquire(timeout=self.timeout)
+            self._count('wait_time', time.monotonic() - started)
+            if not acquired:
+                self._count('timeouts')
+                raise PoolError(f"No database connection available after {self.timeout}s "
+                                f"({self.max_size} in use)")
+
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    conn = self._connect()
+                    self._count('created')
+                elif self._healthy(*entry):
+                    conn = entry[0]
+                    self._count('reused')
+                else:
+                    self._discard(entry[0])
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        return PooledConnection(self, conn)
+
+    def release(self, conn) -> None:
+        """Give a connection back: rolled back and kept, or discarded if broken"""
+        try:
+            if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            keep = not conn.closed and conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+        except psycopg2.Error:
+            keep = False
+
+        if keep:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        else:
+            self._discard(conn)
+
+        with self._lock:
+            self._in_use -= 1
+        self._slots.release()
+
+    def _discard(self, conn) -> None:
+        self._count('discarded')
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def warm_up(self) -> None:
+        """Open `min_size` connections ahead of the first requests"""
+        connections = []
+        try:
+            for _ in range(self.min_size - len(self._idle)):
+                connections.append(self.getconn())
+        except Exception as e:
+            logger.warning(f"⚠️ Could not warm up the database pool: {e}")
+        for conn in connections:
+            conn.close()
+
+    def closeall(self) -> None:
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            in_use = self._in_use
+            idle = len(self._idle)
+            peak = self._peak_in_use
+        waits = stats['waits']
+        wait_time = stats.pop('wait_time')
+        return {
+            'max_size': self.max_size,
+            'in_use': in_use,
+            'idle': idle,
+            'peak_in_use': peak,
+            'saturation': round(in_use / self.max_size, 3) if self.max_size else 0.0,
+            'avg_wait_ms': round(wait_time / waits * 1000, 2) if waits else 0.0,
+            **stats
+        }
+
+
+db_pool = ConnectionPool()
+
+
+def get_db_connection() -> PooledConnection:
+    """Get database connection (from the pool - close() returns it)"""
+    return db_pool.getconn()
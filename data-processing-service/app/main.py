@@ -1,20 +1,23 @@
-from fastapi import FastAPI, HTTPException, File, Form
+from fastapi import FastAPI, HTTPException, File, Form, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 import time
 import logging
 from typing import Dict, Any
 import sys
 import pandas as pd  
 import numpy as np
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Literal
 from .models import (
     ProcessRequest, ProcessResponse, 
     DataPreviewRequest, DataPreviewResponse,
     StatisticsRequest, HealthResponse,
-    FileFormat, AdvancedAnalysisRequest
+    FileFormat, AdvancedAnalysisRequest, ResponseFormat
 )
-from app.ml.preprocessor import DataPreprocessor
+from app.ml.registry import model_registry
+from app.ml.inference import as_records, predict_batch, prediction_batcher, PREDICT_BATCHING
 
 import joblib
 import os
@@ -26,8 +29,16 @@ import matplotlib.pyplot as plt
 import io
 import base64
 import json
-from .processors import CSVProcessor, JSONProcessor, ARFFProcessor
-from .utils import clean_records_for_json, clean_value_for_json
+from .processors import CSVProcessor, JSONProcessor, ARFFProcessor, VersionProcessor
+from .db import get_db_connection, db_pool
+from .scheduler import scheduler, offload, SchedulerBusy
+from .processors.cache import frame_cache
+from .storage import chunk_store, MANIFEST_SUFFIX
+from .preprocessing.analyzer import should_stream
+from .preprocessing.stats import describe
+from .preprocessing.pipeline import normalization_op, encoding_op
+from .preprocessing.cleaner import DataCleaner, ROW_ACTIONS
+from .utils import clean_value_for_json, encode_table, negotiate_format, tabular_response
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -56,23 +67,19 @@ app.add_middleware(
 PROCESSORS = {
     FileFormat.CSV: CSVProcessor,
     FileFormat.JSON: JSONProcessor,
-    FileFormat.ARFF: ARFFProcessor
+    FileFormat.NDJSON: JSONProcessor,
+    FileFormat.ARFF: ARFFProcessor,
+    FileFormat.VERSION: VersionProcessor
 }
-def get_db_connection():
-    """Get database connection"""
-    return psycopg2.connect(
-        host=os.getenv('DB_HOST', 'postgres'),
-        port=os.getenv('DB_PORT', '5432'),
-        database=os.getenv('DB_NAME', 'inovadata'),
-        user=os.getenv('DB_USER', 'inovadata'),
-        password=os.getenv('DB_PASSWORD', 'djkqsqsldhqkedeqzdfq')
-    )
-
 def load_dataset(file_path: str, file_format: str) -> pd.DataFrame:
     """Load dataset from file with automatic CSV fallback for ARFF"""
     import os
     
     try:
+        # Version stockée en chunks : reconnue au manifeste, quel que soit le format annoncé
+        if file_format == 'version' or VersionProcessor.is_version(file_path):
+            return VersionProcessor.read(file_path)
+        
         # ✅ Si le fichier n'existe pas
         if not os.path.exists(file_path):
             logger.warning(f"⚠️ File not found: {file_path}")
@@ -88,13 +95,12 @@ def load_dataset(file_path: str, file_format: str) -> pd.DataFrame:
                 else:
                     raise FileNotFoundError(f"Neither ARFF nor CSV found for: {file_path}")
         
-        # Charger selon le format
+        # Charger selon le format (les processors passent par le sidecar colonnaire)
         if file_format == 'csv':
-            return pd.read_csv(file_path)
-        elif file_format == 'json':
-            return pd.read_json(file_path)
+            return CSVProcessor.read(file_path)
+        elif file_format in ('json', 'ndjson'):
+            return JSONProcessor.read(file_path)
         elif file_format == 'arff':
-            from app.processors.arff_processor import ARFFProcessor
             return ARFFProcessor.read(file_path)
         else:
             raise ValueError(f"Unsupported file format: {file_format}")
@@ -103,12 +109,16 @@ def load_dataset(file_path: str, file_format: str) -> pd.DataFrame:
         logger.error(f"❌ Error loading dataset: {str(e)}")
         raise
 
-def save_dataset(df: pd.DataFrame, file_path: str, file_format: str):
-    """Save dataset to file"""
+def save_dataset(df: pd.DataFrame, file_path: str, file_format: str, changed_columns: List[str] = None):
+    """Save dataset to file (`changed_columns` lets a stored version reuse its other chunks)"""
     if file_format == 'csv':
         df.to_csv(file_path, index=False)
     elif file_format == 'json':
         df.to_json(file_path, orient='records', indent=2)
+    elif file_format == 'ndjson':
+        df.to_json(file_path, orient='records', lines=True)
+    elif file_format == 'version':
+        VersionProcessor.write(df, file_path, base=file_path, changed=changed_columns)
     elif file_format == 'arff':
         from scipy.io import arff
         # Implementation for ARFF
@@ -116,6 +126,39 @@ def save_dataset(df: pd.DataFrame, file_path: str, file_format: str):
     else:
         raise ValueError(f"Unsupported file format: {file_format}")
 
+def save_version_file(source_path: str, source_format: str, operation: Dict = None, df: pd.DataFrame = None):
+    """
+    Create a new version of a dataset next to its source, returns (path, format, info)
+    
+    With the chunk store, the version is recorded lazily as the source plus
+    `operation` (see VersionProcessor.record): only the columns it touches
+    are read, nothing is written until a reader needs the data, and `info`
+    is the transformation info of the operation. Without pyarrow, `df` (the
+    transformed data) is written as a full CSV and `info` is None.
+    """
+    from datetime import datetime
+    
+    base_dir = os.path.dirname(source_path)
+    name = os.path.basename(source_path)
+    if name.endswith(MANIFEST_SUFFIX):
+        name = name[:-len(MANIFEST_SUFFIX)]
+    else:
+        name = os.path.splitext(name)[0]
+    
+    if '_v' in name:
+        name = name.split('_v')[0]
+    
+    timestamp = int(datetime.now().timestamp() * 1000)
+    
+    if operation is not None:
+        new_file_path = os.path.join(base_dir, f"{name}_v{timestamp}{MANIFEST_SUFFIX}")
+        info = VersionProcessor.record(new_file_path, source_path, source_format, operation)
+        return new_file_path, FileFormat.VERSION.value, info
+    
+    new_file_path = os.path.join(base_dir, f"{name}_v{timestamp}.csv")
+    df.to_csv(new_file_path, index=False)
+    return new_file_path, FileFormat.CSV.value, None
+
 def create_dataset_version(
     db,
     dataset_id: int,
@@ -163,18 +206,64 @@ async def health_check():
     return HealthResponse(
         status="healthy",
         version="1.0.0",
-        supported_formats=["csv", "json", "arff"]
+        supported_formats=["csv", "json", "ndjson", "arff"]
     )
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit / miss / eviction counters of the in-memory DataFrame cache and model registry"""
+    return {"frame_cache": frame_cache.stats(), "model_registry": model_registry.stats()}
+
+
+@app.get("/db/stats")
+async def db_stats():
+    """Usage, saturation and wait counters of the database connection pool"""
+    return {"db_pool": db_pool.stats()}
+
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Running, queued and rejected requests of each scheduler lane, and /predict batching"""
+    return {"lanes": scheduler.stats(), "predict_batcher": prediction_batcher.stats()}
+
+
+@app.exception_handler(SchedulerBusy)
+async def scheduler_busy_handler(request: Request, exc: SchedulerBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "lane": exc.lane},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.on_event("startup")
+async def open_db_pool():
+    # Connexions ouvertes hors de la boucle d'événements
+    await run_in_threadpool(db_pool.warm_up)
+
+
+@app.on_event("shutdown")
+def close_db_pool():
+    db_pool.closeall()
+
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    scheduler.shutdown()
+
+
 @app.post("/process", response_model=ProcessResponse)
-async def process_dataset(request: ProcessRequest):
+@offload('process')
+def process_dataset(request: ProcessRequest, http_request: Request):
     """Process a dataset file and extract metadata"""
     start_time = time.time()
     errors = []
     columns_info = []
     
     try:
+        response_format = negotiate_format(request.format, http_request.headers.get('accept'))
+        
         logger.info(f"Processing dataset {request.dataset_id} at {request.file_path}")
         
         # ✅ Vérifier si le fichier existe, sinon essayer CSV
@@ -198,54 +287,88 @@ async def process_dataset(request: ProcessRequest):
                 detail=f"Unsupported file format: {file_format}"
             )
         
-        # Read file
-        try:
-            processor = processor_class()
-            df = processor.read(file_path)
-            logger.info(f"Successfully read file: {len(df)} rows, {len(df.columns)} columns")
-        except FileNotFoundError:
-            raise HTTPException(status_code=404, detail="File not found")
-        except Exception as e:
-            logger.error(f"Error reading file: {e}")
-            raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
+        # Gros fichiers : profilage en streaming, sans charger le DataFrame entier
+        if hasattr(processor_class, 'profile') and should_stream(file_path):
+            try:
+                profiler = processor_class.profile(
+                    file_path,
+                    head_rows=request.sample_size,
+                    track_memory=True
+                )
+                logger.info(f"Streamed file: {profiler.rows_count} rows, {len(profiler.columns)} columns")
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail="File not found")
+            except Exception as e:
+                logger.error(f"Error reading file: {e}")
+                raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
+            
+            columns_info = profiler.columns_info()
+            preview_df = profiler.head if profiler.head is not None else pd.DataFrame(columns=profiler.columns)
+            rows_count = profiler.rows_count
+            columns_count = len(profiler.columns)
+            memory_bytes = profiler.memory_usage
+        else:
+            # Read file
+            try:
+                processor = processor_class()
+                df = processor.read(file_path)
+                logger.info(f"Successfully read file: {len(df)} rows, {len(df.columns)} columns")
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail="File not found")
+            except Exception as e:
+                logger.error(f"Error reading file: {e}")
+                raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
+            
+            # Analyze columns (toujours utiliser CSVProcessor)
+            try:
+                columns_info = CSVProcessor.analyze_dataframe(df)
+                logger.info(f"Analyzed {len(columns_info)} columns")
+            except Exception as e:
+                logger.error(f"Error analyzing columns: {e}")
+                errors.append(f"Column analysis error: {str(e)}")
+                columns_info = []
+            
+            preview_df = df.head(request.sample_size)
+            rows_count = len(df)
+            columns_count = len(df.columns)
+            memory_bytes = df.memory_usage(deep=True).sum()
         
-        # Analyze columns (toujours utiliser CSVProcessor)
-        try:
-            columns_info = CSVProcessor.analyze_dataframe(df)
-            logger.info(f"Analyzed {len(columns_info)} columns")
-        except Exception as e:
-            logger.error(f"Error analyzing columns: {e}")
-            errors.append(f"Column analysis error: {str(e)}")
-            columns_info = []
+        # Construire l'index d'offsets pour les futures pages de /preview
+        if hasattr(processor_class, 'ensure_row_index'):
+            try:
+                processor_class.ensure_row_index(file_path)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not build row index: {e}")
         
         # Get preview data
         try:
-            preview_df = df.head(request.sample_size)
-            records = preview_df.to_dict('records')
-            preview_data = clean_records_for_json(records)
+            preview_data = encode_table(preview_df, response_format)
         except Exception as e:
             logger.error(f"Error creating preview: {e}")
             errors.append(f"Preview generation error: {str(e)}")
-            preview_data = []
+            preview_data = encode_table(pd.DataFrame(), response_format)
         
         # Calculate memory usage
-        memory_usage = df.memory_usage(deep=True).sum() / (1024 * 1024)
+        memory_usage = memory_bytes / (1024 * 1024)
         
         processing_time = time.time() - start_time
         
         logger.info(f"Processing completed in {processing_time:.2f}s")
         
-        return ProcessResponse(
+        # Réponse encodée directement (sans re-validation des lignes d'aperçu)
+        response = ProcessResponse.model_construct(
             dataset_id=request.dataset_id,
             success=len(errors) == 0,
-            rows_count=len(df),
-            columns_count=len(df.columns),
+            rows_count=rows_count,
+            columns_count=columns_count,
             columns=columns_info,
             preview_data=preview_data,
             memory_usage=round(memory_usage, 2),
             processing_time=round(processing_time, 2),
+            approximate=any(col.approximate for col in columns_info),
             errors=errors if errors else None
         )
+        return tabular_response(dict(response), 'preview_data', preview_data, response_format)
         
     except HTTPException:
         raise
@@ -254,7 +377,8 @@ async def process_dataset(request: ProcessRequest):
         raise HTTPException(status_code=500, detail=str(e))    
 
 @app.post("/preview", response_model=DataPreviewResponse)
-async def get_data_preview(request: DataPreviewRequest):
+@offload('preview')
+def get_data_preview(request: DataPreviewRequest, http_request: Request):
     """
     Get paginated preview of dataset
     
@@ -271,17 +395,21 @@ async def get_data_preview(request: DataPreviewRequest):
                 detail=f"Unsupported file format: {request.file_format}"
             )
         
+        response_format = negotiate_format(request.format, http_request.headers.get('accept'))
+        
         # Get preview data
-        data, total_rows, columns = processor.get_preview(
+        preview_df, total_rows, columns = processor.get_preview_frame(
             request.file_path,
             limit=request.limit,
             offset=request.offset
         )
         
-        return DataPreviewResponse(
-            data=data,
-            total_rows=total_rows,
-            columns=columns
+        # 'records' (défaut), 'columns' ({colonne: valeurs}) ou 'arrow' (flux Arrow IPC)
+        return tabular_response(
+            {'total_rows': total_rows, 'columns': columns},
+            'data',
+            encode_table(preview_df, response_format),
+            response_format
         )
         
     except FileNotFoundError:
@@ -292,7 +420,8 @@ async def get_data_preview(request: DataPreviewRequest):
 
 
 @app.post("/statistics")
-async def get_statistics(request: StatisticsRequest):
+@offload('process')
+def get_statistics(request: StatisticsRequest):
     """
     Get detailed statistics for specific columns
     
@@ -309,6 +438,18 @@ async def get_statistics(request: StatisticsRequest):
                 detail=f"Unsupported file format: {request.file_format}"
             )
         
+        # Gros fichiers : un seul passage en streaming, limité aux colonnes demandées
+        if hasattr(processor, 'profile') and should_stream(request.file_path):
+            profiler = processor.profile(request.file_path, columns=request.columns)
+            columns_info = profiler.columns_info()
+            
+            return {
+                "columns": [col.dict() for col in columns_info],
+                "total_rows": profiler.rows_count,
+                "total_columns": len(profiler.columns),
+                "approximate": any(col.approximate for col in columns_info)
+            }
+        
         # Read file
         df = processor.read(request.file_path)
         
@@ -322,7 +463,8 @@ async def get_statistics(request: StatisticsRequest):
         return {
             "columns": [col.dict() for col in columns_info],
             "total_rows": len(df),
-            "total_columns": len(df.columns)
+            "total_columns": len(df.columns),
+            "approximate": any(col.approximate for col in columns_info)
         }
         
     except FileNotFoundError:
@@ -334,7 +476,8 @@ async def get_statistics(request: StatisticsRequest):
 
 
 @app.post("/analyze-advanced")
-async def analyze_advanced(request: AdvancedAnalysisRequest):
+@offload('analysis')
+def analyze_advanced(request: AdvancedAnalysisRequest):
     """Advanced analysis with automatic CSV fallback"""
     start_time = time.time()
     
@@ -380,8 +523,8 @@ async def analyze_advanced(request: AdvancedAnalysisRequest):
             for config in request.column_configs:
                 column_config_map[config.name] = config
         
-        # Analyze each column
-        results = []
+        # Options de chaque colonne : (custom missing, détection d'outliers, plage valide)
+        column_options = []
         for column in df.columns:
             # Get config for this column (or use defaults)
             col_config = column_config_map.get(column)
@@ -396,34 +539,15 @@ async def analyze_advanced(request: AdvancedAnalysisRequest):
             if col_config is not None:
                 detect_outliers_flag = col_config.detect_outliers
             
-            # Analyze column
-            analysis = CSVProcessor.analyze_column_advanced(
-                df[column],
-                column,
-                custom_missing,
-                detect_outliers_flag
-            )
-            
             # Add range validation if specified
+            valid_range = None
             if col_config and col_config.valid_range:
-                valid_range = col_config.valid_range
-                range_info = CSVProcessor.detect_outliers_range(
-                    df[column],
-                    min_val=valid_range.min,
-                    max_val=valid_range.max
-                )
-                
-                if 'outliers' not in analysis:
-                    analysis['outliers'] = {}
-                analysis['outliers']['range'] = range_info
-                
-                # Add configured range to response
-                analysis['configured_range'] = {
-                    'min': valid_range.min,
-                    'max': valid_range.max
-                }
+                valid_range = (col_config.valid_range.min, col_config.valid_range.max)
             
-            results.append(analysis)
+            column_options.append((custom_missing, detect_outliers_flag, valid_range))
+        
+        # Analyse en parallèle par colonnes si le dataset est large
+        results = CSVProcessor.analyze_columns_advanced(df, column_options)
         
         processing_time = time.time() - start_time
         
@@ -432,6 +556,7 @@ async def analyze_advanced(request: AdvancedAnalysisRequest):
             'total_rows': len(df),
             'total_columns': len(df.columns),
             'columns': results,
+            'approximate': any(result['approximate'] for result in results),
             'processing_time': round(processing_time, 2)
         }
         
@@ -458,260 +583,163 @@ class PreprocessRequest(BaseModel):
     max_value: Optional[float] = None
     replacement_strategy: Optional[Literal['mean', 'median', 'mode']] = 'mean'
 
+class PreprocessStep(BaseModel):
+    column_name: str
+    action: Literal['fill_mean', 'fill_median', 'fill_mode', 'fill_forward', 'remove_rows', 'remove_outliers', 'replace_outliers']
+    custom_missing_values: Optional[List[str]] = None
+    method: Optional[Literal['iqr', 'zscore', 'range']] = 'iqr'
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    replacement_strategy: Optional[Literal['mean', 'median', 'mode']] = 'mean'
+
+class BatchPreprocessRequest(BaseModel):
+    file_path: str
+    file_format: FileFormat
+    steps: List[PreprocessStep] = Field(..., min_length=1)
+    output_path: Optional[str] = None
+
+def resolve_preprocess_source(request):
+    """(file path, format, processor) of a preprocessing request, with the CSV fallback for ARFF"""
+    # ✅ CORRECTION 1 : Vérifier si le fichier existe, sinon essayer CSV
+    file_path = request.file_path
+    file_format = request.file_format
+    
+    if not os.path.exists(file_path):
+        if file_format == FileFormat.ARFF or file_path.endswith('.arff'):
+            csv_path = file_path.replace('.arff', '.csv')
+            if os.path.exists(csv_path):
+                logger.info(f"⚠️ ARFF not found, using CSV: {csv_path}")
+                file_path = csv_path
+                file_format = FileFormat.CSV
+            else:
+                raise HTTPException(
+                    status_code=404, 
+                    detail=f"File not found: {file_path} (tried CSV alternative too)"
+                )
+    
+    # Get processor
+    processor_class = PROCESSORS.get(file_format)
+    if not processor_class:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {file_format}")
+    
+    # ✅ CORRECTION 2 : Instancier le processor
+    return file_path, file_format, processor_class()
+
+def save_preprocessed(df: pd.DataFrame, request, file_path: str, file_format: FileFormat,
+                      changed_columns: List[str]):
+    """
+    Save the result of /preprocess or /preprocess/batch, returns (output path, format)
+    
+    ARFF datasets are saved as CSV and the dataset row is updated accordingly.
+    """
+    # ✅ CORRECTION 3 : Sauvegarder en CSV si c'était ARFF
+    output_path = request.output_path or file_path
+    original_format = request.file_format
+    save_format = file_format  # Utiliser le format détecté, pas le format original
+
+    # Si le format original était ARFF, forcer CSV
+    if original_format == FileFormat.ARFF:
+        output_path = output_path.replace('.arff', '.csv')
+        save_format = FileFormat.CSV
+        logger.info(f"⚠️ Converting ARFF to CSV: {output_path}")
+
+    try:
+        if save_format == FileFormat.CSV:
+            df.to_csv(output_path, index=False)
+            logger.info(f"✅ Saved CSV to {output_path}")
+        elif save_format == FileFormat.JSON:
+            df.to_json(output_path, orient='records')
+            logger.info(f"✅ Saved JSON to {output_path}")
+        elif save_format == FileFormat.NDJSON:
+            df.to_json(output_path, orient='records', lines=True)
+            logger.info(f"✅ Saved NDJSON to {output_path}")
+        elif save_format == FileFormat.VERSION:
+            # Même nombre de lignes : seules les colonnes traitées sont réécrites
+            VersionProcessor.write(df, output_path, base=file_path, changed=changed_columns)
+            logger.info(f"✅ Saved version to {output_path}")
+        else:
+            # Fallback
+            output_path = output_path.replace('.arff', '.csv')
+            df.to_csv(output_path, index=False)
+            save_format = FileFormat.CSV
+            logger.info(f"✅ Saved as CSV to {output_path}")
+    except Exception as e:
+        logger.error(f"Error saving file: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+
+    # ✅ CORRECTION 4 : Mettre à jour la DB si converti
+    if original_format == FileFormat.ARFF and save_format == FileFormat.CSV:
+        try:
+            db = get_db_connection()
+            cursor = db.cursor()
+
+            cursor.execute(
+                "SELECT id FROM datasets WHERE file_path = %s",
+                (request.file_path,)
+            )
+            result = cursor.fetchone()
+
+            if result:
+                dataset_id = result[0]
+
+                cursor.execute(
+                    """
+                    UPDATE datasets 
+                    SET file_path = %s, 
+                        file_format = %s, 
+                        updated_at = NOW() 
+                    WHERE id = %s
+                    """,
+                    (output_path, 'csv', dataset_id)
+                )
+                db.commit()
+                logger.info(f"✅ Updated dataset {dataset_id}: ARFF → CSV")
+
+            cursor.close()
+            db.close()
+
+        except Exception as db_error:
+            logger.warning(f"⚠️ Could not update database: {db_error}")
+    
+    return output_path, save_format
+
 @app.post("/preprocess")
-async def preprocess_data(request: PreprocessRequest):
+@offload('preprocess')
+def preprocess_data(request: PreprocessRequest):
     """Apply preprocessing action to a column"""
     try:
         logger.info(f"Preprocessing {request.column_name} with action: {request.action}")
         
-        # ✅ CORRECTION 1 : Vérifier si le fichier existe, sinon essayer CSV
-        import os
-        file_path = request.file_path
-        file_format = request.file_format
-        
-        if not os.path.exists(file_path):
-            if file_format == FileFormat.ARFF or file_path.endswith('.arff'):
-                csv_path = file_path.replace('.arff', '.csv')
-                if os.path.exists(csv_path):
-                    logger.info(f"⚠️ ARFF not found, using CSV: {csv_path}")
-                    file_path = csv_path
-                    file_format = FileFormat.CSV
-                else:
-                    raise HTTPException(
-                        status_code=404, 
-                        detail=f"File not found: {file_path} (tried CSV alternative too)"
-                    )
-        
-        # Get processor
-        processor_class = PROCESSORS.get(file_format)
-        if not processor_class:
-            raise HTTPException(status_code=400, detail=f"Unsupported format: {file_format}")
-        
-        # ✅ CORRECTION 2 : Instancier le processor
-        processor = processor_class()
+        file_path, file_format, processor = resolve_preprocess_source(request)
         
         # Read file
         df = processor.read(file_path)
         original_rows = len(df)
         
-        # Detect custom missing values if provided
-        if request.custom_missing_values and request.action in ['fill_mean', 'fill_median', 'fill_mode', 'fill_forward', 'remove_rows']:
-            custom_missing_mask = CSVProcessor.detect_custom_missing_values(
-                df[request.column_name],
-                request.custom_missing_values
+        try:
+            df, result_message, values_replaced = DataCleaner.apply(
+                df,
+                request.column_name,
+                request.action,
+                custom_missing_values=request.custom_missing_values,
+                method=request.method,
+                min_value=request.min_value,
+                max_value=request.max_value,
+                replacement_strategy=request.replacement_strategy
             )
-            df.loc[custom_missing_mask, request.column_name] = pd.NA
-        
-        # Apply the action (votre code existant...)
-        if request.action == 'fill_mean':
-            if not pd.api.types.is_numeric_dtype(df[request.column_name]):
-                raise HTTPException(status_code=400, detail="Mean fill only works with numerical columns")
-            mean_value = df[request.column_name].mean()
-            filled_count = df[request.column_name].isna().sum()
-            df[request.column_name].fillna(mean_value, inplace=True)
-            result_message = f"Filled {filled_count} missing values with mean: {mean_value:.2f}"
-            
-        elif request.action == 'fill_median':
-            if not pd.api.types.is_numeric_dtype(df[request.column_name]):
-                raise HTTPException(status_code=400, detail="Median fill only works with numerical columns")
-            median_value = df[request.column_name].median()
-            filled_count = df[request.column_name].isna().sum()
-            df[request.column_name].fillna(median_value, inplace=True)
-            result_message = f"Filled {filled_count} missing values with median: {median_value:.2f}"
-            
-        elif request.action == 'fill_mode':
-            mode_value = df[request.column_name].mode()
-            if len(mode_value) > 0:
-                filled_count = df[request.column_name].isna().sum()
-                df[request.column_name].fillna(mode_value[0], inplace=True)
-                result_message = f"Filled {filled_count} missing values with mode: {mode_value[0]}"
-            else:
-                result_message = "No mode found"
-                
-        elif request.action == 'fill_forward':
-            filled_count = df[request.column_name].isna().sum()
-            df[request.column_name].fillna(method='ffill', inplace=True)
-            result_message = f"Forward filled {filled_count} missing values"
-            
-        elif request.action == 'remove_rows':
-            df = df.dropna(subset=[request.column_name])
-            result_message = f"Removed {original_rows - len(df)} rows with missing values"
-        
-        elif request.action == 'replace_outliers':
-            method = request.method
-            replacement_strategy = request.replacement_strategy
-
-            outlier_mask = pd.Series([False] * len(df), index=df.index)
-
-            if method == 'range':
-                if request.min_value is not None:
-                    outlier_mask |= df[request.column_name] < request.min_value
-                if request.max_value is not None:
-                    outlier_mask |= df[request.column_name] > request.max_value
-
-            elif method == 'iqr':
-                Q1 = df[request.column_name].quantile(0.25)
-                Q3 = df[request.column_name].quantile(0.75)
-                IQR = Q3 - Q1
-                lower = Q1 - 1.5 * IQR
-                upper = Q3 + 1.5 * IQR
-                outlier_mask = (df[request.column_name] < lower) | (df[request.column_name] > upper)
-
-            elif method == 'zscore':
-                mean = df[request.column_name].mean()
-                std = df[request.column_name].std()
-                if std > 0:
-                    z_scores = np.abs((df[request.column_name] - mean) / std)
-                    outlier_mask = z_scores > 3
-
-            outlier_count = int(outlier_mask.sum())
-
-            if outlier_count > 0:
-                clean_values = df.loc[~outlier_mask, request.column_name]
-
-                if replacement_strategy == 'mean':
-                    replacement_value = clean_values.mean()
-                    result_message = f"Replaced {outlier_count} outliers with mean: {replacement_value:.2f}"
-                elif replacement_strategy == 'median':
-                    replacement_value = clean_values.median()
-                    result_message = f"Replaced {outlier_count} outliers with median: {replacement_value:.2f}"
-                elif replacement_strategy == 'mode':
-                    mode_values = clean_values.mode()
-                    if len(mode_values) > 0:
-                        replacement_value = mode_values[0]
-                        result_message = f"Replaced {outlier_count} outliers with mode: {replacement_value}"
-                    else:
-                        replacement_value = clean_values.median()
-                        result_message = f"Replaced {outlier_count} outliers with median (no mode found): {replacement_value:.2f}"
-                elif replacement_strategy == 'min':
-                    replacement_value = clean_values.min()
-                    result_message = f"Replaced {outlier_count} outliers with min: {replacement_value:.2f}"
-                elif replacement_strategy == 'max':
-                    replacement_value = clean_values.max()
-                    result_message = f"Replaced {outlier_count} outliers with max: {replacement_value:.2f}"
-
-                original_dtype = df[request.column_name].dtype
-
-                if pd.api.types.is_integer_dtype(original_dtype):
-                    replacement_value_int = int(round(replacement_value))
-                    df.loc[outlier_mask, request.column_name] = replacement_value_int
-                    logger.info(f"Replaced {outlier_count} int values with {replacement_value_int}")
-                else:
-                    df[request.column_name] = df[request.column_name].astype(float)
-                    df.loc[outlier_mask, request.column_name] = float(replacement_value)
-                    logger.info(f"Replaced {outlier_count} float values with {replacement_value}")
-            else:
-                outlier_count = 0
-                result_message = "No outliers detected"
-
-            values_replaced = outlier_count
-        
-        elif request.action == 'remove_outliers':
-            method = request.method
-            before = len(df)
-            
-            if method == 'range':
-                if request.min_value is not None:
-                    df = df[df[request.column_name] >= request.min_value]
-                if request.max_value is not None:
-                    df = df[df[request.column_name] <= request.max_value]
-                removed = before - len(df)
-                result_message = f"Removed {removed} rows with outliers outside range [{request.min_value}, {request.max_value}]"
-                
-            elif method == 'iqr':
-                Q1 = df[request.column_name].quantile(0.25)
-                Q3 = df[request.column_name].quantile(0.75)
-                IQR = Q3 - Q1
-                lower = Q1 - 1.5 * IQR
-                upper = Q3 + 1.5 * IQR
-                df = df[(df[request.column_name] >= lower) & (df[request.column_name] <= upper)]
-                removed = before - len(df)
-                result_message = f"Removed {removed} rows with outliers using IQR method"
-                
-            elif method == 'zscore':
-                mean = df[request.column_name].mean()
-                std = df[request.column_name].std()
-                z_scores = np.abs((df[request.column_name] - mean) / std)
-                df = df[z_scores < 3]
-                removed = before - len(df)
-                result_message = f"Removed {removed} rows with outliers using Z-score method"
-        
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown action: {request.action}")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # ✅ CORRECTION 3 : Sauvegarder en CSV si c'était ARFF
-        output_path = request.output_path or file_path
-        original_format = request.file_format
-        save_format = file_format  # Utiliser le format détecté, pas le format original
-
-        # Si le format original était ARFF, forcer CSV
-        if original_format == FileFormat.ARFF:
-            output_path = output_path.replace('.arff', '.csv')
-            save_format = FileFormat.CSV
-            logger.info(f"⚠️ Converting ARFF to CSV: {output_path}")
-
-        try:
-            if save_format == FileFormat.CSV:
-                df.to_csv(output_path, index=False)
-                logger.info(f"✅ Saved CSV to {output_path}")
-            elif save_format == FileFormat.JSON:
-                df.to_json(output_path, orient='records')
-                logger.info(f"✅ Saved JSON to {output_path}")
-            else:
-                # Fallback
-                output_path = output_path.replace('.arff', '.csv')
-                df.to_csv(output_path, index=False)
-                save_format = FileFormat.CSV
-                logger.info(f"✅ Saved as CSV to {output_path}")
-        except Exception as e:
-            logger.error(f"Error saving file: {e}")
-            raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
-
-        # ✅ CORRECTION 4 : Mettre à jour la DB si converti
-        if original_format == FileFormat.ARFF and save_format == FileFormat.CSV:
-            try:
-                db = get_db_connection()
-                cursor = db.cursor()
-                
-                cursor.execute(
-                    "SELECT id FROM datasets WHERE file_path = %s",
-                    (request.file_path,)
-                )
-                result = cursor.fetchone()
-                
-                if result:
-                    dataset_id = result[0]
-                    
-                    cursor.execute(
-                        """
-                        UPDATE datasets 
-                        SET file_path = %s, 
-                            file_format = %s, 
-                            updated_at = NOW() 
-                        WHERE id = %s
-                        """,
-                        (output_path, 'csv', dataset_id)
-                    )
-                    db.commit()
-                    logger.info(f"✅ Updated dataset {dataset_id}: ARFF → CSV")
-                
-                cursor.close()
-                db.close()
-                
-            except Exception as db_error:
-                logger.warning(f"⚠️ Could not update database: {db_error}")
+        output_path, save_format = save_preprocessed(df, request, file_path, file_format, [request.column_name])
 
         logger.info(f"Preprocessing complete: {result_message}")
 
-        if 'values_replaced' not in locals():
-            values_replaced = 0
-
         return {
             'success': True,
             'message': result_message,
             'original_rows': original_rows,
             'final_rows': len(df),
-            'rows_affected': original_rows - len(df) if request.action in ['remove_outliers', 'remove_rows'] else 0,
+            'rows_affected': original_rows - len(df) if request.action in ROW_ACTIONS else 0,
             'values_replaced': values_replaced,
             'file_path': output_path,
             'file_format': save_format.value if hasattr(save_format, 'value') else str(save_format)
@@ -725,8 +753,89 @@ async def preprocess_data(request: PreprocessRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/preprocess/batch")
+@offload('preprocess')
+def preprocess_batch(request: BatchPreprocessRequest):
+    """
+    Apply an ordered list of preprocessing steps with one read and one save
+    
+    Every step is validated against the dataset before any is applied; the
+    response holds the result of each step in order.
+    """
+    try:
+        logger.info(f"Batch preprocessing: {len(request.steps)} steps")
+        
+        file_path, file_format, processor = resolve_preprocess_source(request)
+        
+        df = processor.read(file_path)
+        original_rows = len(df)
+        
+        # Validation de toutes les étapes avant d'en appliquer une seule
+        errors = []
+        for i, step in enumerate(request.steps):
+            error = DataCleaner.validate(df, step.column_name, step.action, step.method,
+                                         step.min_value, step.max_value)
+            if error:
+                errors.append({'step': i, 'column_name': step.column_name, 'action': step.action, 'error': error})
+        if errors:
+            raise HTTPException(status_code=400, detail=errors)
+        
+        results = []
+        for i, step in enumerate(request.steps):
+            rows_before = len(df)
+            try:
+                df, result_message, values_replaced = DataCleaner.apply(
+                    df,
+                    step.column_name,
+                    step.action,
+                    custom_missing_values=step.custom_missing_values,
+                    method=step.method,
+                    min_value=step.min_value,
+                    max_value=step.max_value,
+                    replacement_strategy=step.replacement_strategy
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=[{
+                    'step': i, 'column_name': step.column_name, 'action': step.action, 'error': str(e)
+                }])
+            
+            results.append({
+                'step': i,
+                'column_name': step.column_name,
+                'action': step.action,
+                'message': result_message,
+                'rows_affected': rows_before - len(df),
+                'values_replaced': values_replaced
+            })
+        
+        changed_columns = list(dict.fromkeys(step.column_name for step in request.steps))
+        output_path, save_format = save_preprocessed(df, request, file_path, file_format, changed_columns)
+        
+        logger.info(f"Batch preprocessing complete: {len(results)} steps, {original_rows - len(df)} rows removed")
+        
+        return {
+            'success': True,
+            'message': f"Applied {len(results)} preprocessing steps",
+            'steps': results,
+            'original_rows': original_rows,
+            'final_rows': len(df),
+            'rows_affected': original_rows - len(df),
+            'values_replaced': sum(result['values_replaced'] for result in results),
+            'file_path': output_path,
+            'file_format': save_format.value if hasattr(save_format, 'value') else str(save_format)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch preprocessing error: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/transform-preview-normalize")
-async def preview_normalize(
+@offload('preview')
+def preview_normalize(
     file_path: str = Form(...),
     file_format: str = Form(...),
     columns: str = Form(...),
@@ -750,7 +859,8 @@ async def preview_normalize(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/transform-normalize")
-async def transform_normalize(
+@offload('preprocess')
+def transform_normalize(
     file_path: str = Form(...),
     file_format: str = Form(...),
     columns: str = Form(...),
@@ -766,42 +876,35 @@ async def transform_normalize(
         
         columns_list = json.loads(columns)
         
-        # Charger le dataset
-        df = load_dataset(file_path, file_format)
-        print(f"✅ Dataset loaded: {len(df)} rows")
-        
-        # Appliquer la normalisation
-        transformer = DataTransformer(df)
         feature_range = (feature_range_min, feature_range_max)
-        transformed_df, info = transformer.normalize_columns(
-            columns_list, 
-            method, 
-            feature_range
-        )
-        
-        print(f"✅ Normalization completed")
         
-        if create_new_version:
-            import os
-            from datetime import datetime
-            
-            base_dir = os.path.dirname(file_path)
-            filename = os.path.basename(file_path)
-            name, ext = os.path.splitext(filename)
-            
-            if '_v' in name:
-                name = name.split('_v')[0]
-            
-            timestamp = int(datetime.now().timestamp() * 1000)
+        # Nouvelle version paresseuse : l'opération est journalisée, appliquée à la lecture
+        lazy = create_new_version and chunk_store.enabled
+        if lazy:
+            transformed_df = None
+            operation = normalization_op(columns_list, method, feature_range)
+        else:
+            # Charger le dataset
+            df = load_dataset(file_path, file_format)
+            print(f"✅ Dataset loaded: {len(df)} rows")
             
-            # ✅ CORRECTION : Toujours sauvegarder en CSV après transformation
-            new_filename = f"{name}_v{timestamp}.csv"
-            new_file_path = os.path.join(base_dir, new_filename)
-            new_format = 'csv'
+            # Appliquer la normalisation
+            transformer = DataTransformer(df)
+            transformed_df, info = transformer.normalize_columns(
+                columns_list, 
+                method, 
+                feature_range
+            )
             
-            # Sauvegarder en CSV
-            transformed_df.to_csv(new_file_path, index=False)
-            print(f"✅ New version saved to CSV: {new_file_path}")
+            print(f"✅ Normalization completed")
+        
+        if create_new_version:
+            new_file_path, new_format, recorded_info = save_version_file(
+                file_path, file_format, operation=operation if lazy else None, df=transformed_df
+            )
+            if lazy:
+                info = recorded_info
+            print(f"✅ New version saved ({new_format}): {new_file_path}")
             
             try:
                 db = get_db_connection()
@@ -870,7 +973,7 @@ async def transform_normalize(
                 
                 return {
                     "success": True,
-                    "message": f"Created version {new_version_number} with {method} normalization (saved as CSV)",
+                    "message": f"Created version {new_version_number} with {method} normalization (saved as {new_format})",
                     "version_id": version_id,
                     "version_number": new_version_number,
                     "file_path": new_file_path,
@@ -886,7 +989,7 @@ async def transform_normalize(
         
         else:
             # Mode overwrite
-            save_dataset(transformed_df, file_path, file_format)
+            save_dataset(transformed_df, file_path, file_format, changed_columns=columns_list)
             print(f"✅ Dataset overwritten")
             
             return {
@@ -903,7 +1006,8 @@ async def transform_normalize(
     
 
 @app.post("/transform-preview-encode")
-async def preview_encode(
+@offload('preview')
+def preview_encode(
     file_path: str = Form(...),
     file_format: str = Form(...),
     columns: str = Form(...),
@@ -928,7 +1032,8 @@ async def preview_encode(
 
 
 @app.post("/transform-encode")
-async def transform_encode(
+@offload('preprocess')
+def transform_encode(
     file_path: str = Form(...),
     file_format: str = Form(...),
     columns: str = Form(...),
@@ -966,37 +1071,31 @@ async def transform_encode(
                     actual_file_path = csv_path
                     actual_file_format = 'csv'
         
-        df = load_dataset(actual_file_path, actual_file_format)
-        print(f"✅ Dataset loaded: {len(df)} rows")
-        
-        transformer = DataTransformer(df)
-        transformed_df, info = transformer.encode_columns(
-            columns_list,
-            method,
-            drop_first
-        )
-        
-        print(f"✅ Encoding completed")
-        
-        if create_new_version:
-            from datetime import datetime
-            
-            base_dir = os.path.dirname(actual_file_path)
-            filename = os.path.basename(actual_file_path)
-            name, ext = os.path.splitext(filename)
-            
-            if '_v' in name:
-                name = name.split('_v')[0]
-            
-            timestamp = int(datetime.now().timestamp() * 1000)
+        # Nouvelle version paresseuse : l'opération est journalisée, appliquée à la lecture
+        lazy = create_new_version and chunk_store.enabled
+        if lazy:
+            transformed_df = None
+            operation = encoding_op(columns_list, method, drop_first)
+        else:
+            df = load_dataset(actual_file_path, actual_file_format)
+            print(f"✅ Dataset loaded: {len(df)} rows")
             
-            # ✅ Toujours sauvegarder en CSV
-            new_filename = f"{name}_v{timestamp}.csv"
-            new_file_path = os.path.join(base_dir, new_filename)
-            new_format = 'csv'
+            transformer = DataTransformer(df)
+            transformed_df, info = transformer.encode_columns(
+                columns_list,
+                method,
+                drop_first
+            )
             
-            transformed_df.to_csv(new_file_path, index=False)
-            print(f"✅ New version saved to CSV: {new_file_path}")
+            print(f"✅ Encoding completed")
+        
+        if create_new_version:
+            new_file_path, new_format, recorded_info = save_version_file(
+                actual_file_path, actual_file_format, operation=operation if lazy else None, df=transformed_df
+            )
+            if lazy:
+                info = recorded_info
+            print(f"✅ New version saved ({new_format}): {new_file_path}")
             
             try:
                 db = get_db_connection()
@@ -1071,7 +1170,7 @@ async def transform_encode(
                 
                 return {
                     "success": True,
-                    "message": f"Created version {new_version_number} with {method} encoding (saved as CSV)",
+                    "message": f"Created version {new_version_number} with {method} encoding (saved as {new_format})",
                     "version_id": version_id,
                     "version_number": new_version_number,
                     "file_path": new_file_path,
@@ -1095,7 +1194,7 @@ async def transform_encode(
                 transformed_df.to_csv(csv_path, index=False)
                 print(f"✅ Dataset saved to CSV: {csv_path}")
             else:
-                save_dataset(transformed_df, actual_file_path, actual_file_format)
+                save_dataset(transformed_df, actual_file_path, actual_file_format, changed_columns=columns_list)
                 print(f"✅ Dataset overwritten")
             
             return {
@@ -1113,8 +1212,10 @@ async def transform_encode(
         raise HTTPException(status_code=500, detail=str(e))
     
 
+# Routes avec accès base : fonctions synchrones, exécutées par FastAPI dans son
+# threadpool avec une connexion du pool (la boucle d'événements n'est jamais bloquée)
 @app.get("/datasets/{dataset_id}")
-async def get_dataset(dataset_id: int):
+def get_dataset(dataset_id: int):
     """Récupérer les informations d'un dataset"""
     db = get_db_connection()
     cursor = db.cursor()
@@ -1162,7 +1263,7 @@ async def get_dataset(dataset_id: int):
         db.close()
 
 @app.get("/dataset-versions/{dataset_id}")
-async def get_dataset_versions(dataset_id: int):
+def get_dataset_versions(dataset_id: int):
     """Get all versions of a dataset"""
     try:
         db = get_db_connection()
@@ -1202,7 +1303,7 @@ async def get_dataset_versions(dataset_id: int):
 
 # NOUVEAU : Endpoint pour activer une version
 @app.post("/activate-version/{version_id}")
-async def activate_version(version_id: int):
+def activate_version(version_id: int):
     """Set a specific version as active"""
     try:
         db = get_db_connection()
@@ -1242,78 +1343,94 @@ async def activate_version(version_id: int):
 
 
 
-from app.models import ExperimentCreate, ExperimentResponse
-from app.ml.trainer import MLTrainer
+from app.models import ExperimentCreate, ExperimentResponse, SearchCreate
+from app.ml.worker import training_worker, enqueue, queue_stats, TRAINING_WORKER_EMBEDDED
+from app.ml.search import generate_candidates
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 import json
 
-# Créer un executor pour les tâches longues
-executor = ThreadPoolExecutor(max_workers=2)
+
+@app.on_event("startup")
+def start_training_worker():
+    # Worker embarqué ; désactivé quand un conteneur worker séparé prend la file
+    if TRAINING_WORKER_EMBEDDED:
+        training_worker.start()
+
+
+@app.on_event("shutdown")
+def stop_training_worker():
+    if TRAINING_WORKER_EMBEDDED:
+        training_worker.stop()
 
 # ============================================
 # ROUTES ML
 # ============================================
 
+def _insert_experiment(cursor, experiment: ExperimentCreate, search_config: Optional[Dict] = None):
+    """Vérifie le dataset et les colonnes puis crée l'expérience (commit par l'appelant)"""
+    # Vérifier que le dataset existe
+    cursor.execute("""
+        SELECT id, columns_info FROM datasets WHERE id = %s
+    """, (experiment.dataset_id,))
+    
+    dataset = cursor.fetchone()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset non trouvé")
+    
+    # Vérifier que les colonnes existent
+    columns_info = dataset[1] or []
+    available_columns = [col['name'] for col in columns_info]
+    
+    # Vérifier target
+    if experiment.target_column not in available_columns:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Colonne target '{experiment.target_column}' n'existe pas"
+        )
+    
+    # Vérifier features
+    missing_features = set(experiment.feature_columns) - set(available_columns)
+    if missing_features:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Colonnes features manquantes: {missing_features}"
+        )
+    
+    # Créer l'expérience en base
+    cursor.execute("""
+        INSERT INTO ml_experiments (
+            name, description, project_id, dataset_id,
+            algorithm, hyperparameters, target_column, feature_columns,
+            train_ratio, random_seed, status, search_config, created_by
+        ) VALUES (
+            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'pending', %s, %s
+        ) RETURNING id, name, algorithm, status, created_at
+    """, (
+        experiment.name,
+        experiment.description,
+        experiment.project_id,
+        experiment.dataset_id,
+        experiment.algorithm,
+        json.dumps(experiment.hyperparameters),
+        experiment.target_column,
+        json.dumps(experiment.feature_columns),
+        experiment.train_ratio,
+        experiment.random_seed,
+        json.dumps(search_config) if search_config else None,
+        1  # TODO: Récupérer l'user_id depuis la session
+    ))
+    
+    return cursor.fetchone()
+
+
 @app.post("/ml/experiments/create")
-async def create_experiment(experiment: ExperimentCreate):
+def create_experiment(experiment: ExperimentCreate):
     """Créer une nouvelle expérience ML"""
     db = get_db_connection()
     cursor = db.cursor()
     
     try:
-        # Vérifier que le dataset existe
-        cursor.execute("""
-            SELECT id, columns_info FROM datasets WHERE id = %s
-        """, (experiment.dataset_id,))
-        
-        dataset = cursor.fetchone()
-        if not dataset:
-            raise HTTPException(status_code=404, detail="Dataset non trouvé")
-        
-        # Vérifier que les colonnes existent
-        columns_info = dataset[1] or []
-        available_columns = [col['name'] for col in columns_info]
-        
-        # Vérifier target
-        if experiment.target_column not in available_columns:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Colonne target '{experiment.target_column}' n'existe pas"
-            )
-        
-        # Vérifier features
-        missing_features = set(experiment.feature_columns) - set(available_columns)
-        if missing_features:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Colonnes features manquantes: {missing_features}"
-            )
-        
-        # Créer l'expérience en base
-        cursor.execute("""
-            INSERT INTO ml_experiments (
-                name, description, project_id, dataset_id,
-                algorithm, hyperparameters, target_column, feature_columns,
-                train_ratio, random_seed, status, created_by
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'pending', %s
-            ) RETURNING id, name, algorithm, status, created_at
-        """, (
-            experiment.name,
-            experiment.description,
-            experiment.project_id,
-            experiment.dataset_id,
-            experiment.algorithm,
-            json.dumps(experiment.hyperparameters),
-            experiment.target_column,
-            json.dumps(experiment.feature_columns),
-            experiment.train_ratio,
-            experiment.random_seed,
-            1  # TODO: Récupérer l'user_id depuis la session
-        ))
-        
-        result = cursor.fetchone()
+        result = _insert_experiment(cursor, experiment)
         db.commit()
         
         return {
@@ -1335,22 +1452,68 @@ async def create_experiment(experiment: ExperimentCreate):
         db.close()
 
 
+@app.post("/ml/experiments/search")
+def create_search(experiment: SearchCreate):
+    """
+    Recherche d'hyperparamètres en un appel (voir ml.search)
+
+    Crée l'expérience parente et la met dans la file d'entraînement. Le worker
+    évalue les candidats en parallèle, enregistre chacun comme expérience
+    enfant et garde le meilleur comme modèle de l'expérience parente.
+    """
+    search_config = experiment.search.model_dump()
+    try:
+        # Plages et taille de la grille vérifiées avant la mise en file
+        candidates = generate_candidates(experiment.algorithm, experiment.hyperparameters,
+                                         search_config, experiment.random_seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    db = get_db_connection()
+    cursor = db.cursor()
+    
+    try:
+        result = _insert_experiment(cursor, experiment, search_config)
+        enqueue(cursor, result[0])
+        db.commit()
+        
+        if TRAINING_WORKER_EMBEDDED:
+            training_worker.wake()
+        
+        return {
+            'id': result[0],
+            'name': result[1],
+            'algorithm': result[2],
+            'status': 'pending',
+            'strategy': search_config['strategy'],
+            'candidates': len(candidates),
+            'created_at': result[4]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erreur création recherche: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        db.close()
+
+
 @app.post("/ml/experiments/{experiment_id}/train")
-async def train_experiment(experiment_id: int):
-    """Lancer l'entraînement d'une expérience"""
+def train_experiment(experiment_id: int):
+    """Mettre une expérience dans la file d'entraînement (voir ml.worker)"""
     db = get_db_connection()
     cursor = db.cursor()
     
     try:
-        # Récupérer l'expérience
+        # Récupérer l'expérience (verrouillée : deux /train simultanés ne la mettent qu'une fois en file)
         cursor.execute("""
-            SELECT e.id, e.dataset_id, e.project_id, e.algorithm, 
-                   e.hyperparameters, e.target_column, e.feature_columns,
-                   e.train_ratio, e.random_seed, e.status,
-                   d.file_path
-            FROM ml_experiments e
-            JOIN datasets d ON d.id = e.dataset_id
-            WHERE e.id = %s
+            SELECT id, status, queued_at
+            FROM ml_experiments
+            WHERE id = %s
+            FOR UPDATE
         """, (experiment_id,))
         
         exp_result = cursor.fetchone()
@@ -1359,53 +1522,32 @@ async def train_experiment(experiment_id: int):
             raise HTTPException(status_code=404, detail="Expérience non trouvée")
         
         # Vérifier le statut
-        if exp_result[9] == 'training':
+        if exp_result[1] == 'training':
             raise HTTPException(status_code=400, detail="Expérience déjà en cours")
         
-        if exp_result[9] == 'completed':
+        if exp_result[1] == 'completed':
             raise HTTPException(status_code=400, detail="Expérience déjà terminée")
         
-        # Mettre à jour le statut
-        cursor.execute("""
-            UPDATE ml_experiments 
-            SET status = 'training'
-            WHERE id = %s
-        """, (experiment_id,))
-        db.commit()
+        if exp_result[1] == 'pending' and exp_result[2] is not None:
+            raise HTTPException(status_code=400, detail="Expérience déjà en file d'attente")
         
-        # Préparer la config pour le trainer
-        config = {
-            'algorithm': exp_result[3],
-            'hyperparameters': exp_result[4] if isinstance(exp_result[4], dict) else json.loads(exp_result[4]) if exp_result[4] else {},
-            'target_column': exp_result[5],
-            'feature_columns': exp_result[6] if isinstance(exp_result[6], list) else json.loads(exp_result[6]),
-            'train_ratio': float(exp_result[7]),
-            'random_seed': int(exp_result[8])
-        }
+        # Persistée en base : la file survit aux redémarrages, un worker la prendra
+        enqueue(cursor, experiment_id)
+        db.commit()
         
-        dataset_path = exp_result[10]
-        project_id = exp_result[2]
-        
-        # Lancer l'entraînement en arrière-plan
-        loop = asyncio.get_event_loop()
-        loop.run_in_executor(
-            executor,
-            train_in_background,
-            experiment_id,
-            project_id,
-            dataset_path,
-            config
-        )
+        if TRAINING_WORKER_EMBEDDED:
+            training_worker.wake()
         
         return {
-            'message': 'Entraînement démarré',
+            'message': "Entraînement en file d'attente",
             'experiment_id': experiment_id,
-            'status': 'training'
+            'status': 'pending'
         }
         
     except HTTPException:
         raise
     except Exception as e:
+        db.rollback()
         logger.error(f"Erreur démarrage entraînement: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
@@ -1413,100 +1555,28 @@ async def train_experiment(experiment_id: int):
         db.close()
 
 
-def train_in_background(experiment_id: int, project_id: int, dataset_path: str, config: dict):
-    """Fonction qui s'exécute en arrière-plan pour l'entraînement"""
-    
-    db = get_db_connection()
-    cursor = db.cursor()
-    
+@app.get("/ml/queue")
+def training_queue():
+    """Queued and running trainings (all workers) and the embedded worker's jobs"""
     try:
-        # Créer le trainer
-        trainer = MLTrainer(dataset_path, config)
-        
-        # Exécuter l'entraînement
-        results = trainer.run(experiment_id, project_id)
-        
-        # ✅ FIX : Nettoyer les valeurs Infinity/NaN dans les résultats JSON
-        def clean_for_json(obj):
-            """Remplace Infinity et NaN par None pour le JSON"""
-            import math
-            if isinstance(obj, dict):
-                return {k: clean_for_json(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [clean_for_json(item) for item in obj]
-            elif isinstance(obj, float):
-                if math.isinf(obj) or math.isnan(obj):
-                    return None
-                return obj
-            return obj
-        
-        # Mettre à jour en base
-        if results['status'] == 'completed':
-            # Nettoyer les données avant insertion
-            metrics = clean_for_json(results['metrics'])
-            confusion_matrix = clean_for_json(results.get('confusion_matrix'))
-            roc_data = clean_for_json(results.get('roc_data'))
-            residuals = clean_for_json(results.get('residuals'))
-            predictions = clean_for_json(results.get('predictions'))
-            
-            cursor.execute("""
-                UPDATE ml_experiments
-                SET status = 'completed',
-                    metrics = %s,
-                    confusion_matrix = %s,
-                    roc_data = %s,
-                    residuals = %s,
-                    predictions = %s,
-                    training_time = %s,
-                    model_path = %s,
-                    transformations_path = %s,
-                    completed_at = NOW()
-                WHERE id = %s
-            """, (
-                json.dumps(metrics) if metrics else None,
-                json.dumps(confusion_matrix) if confusion_matrix else None,
-                json.dumps(roc_data) if roc_data else None,
-                json.dumps(residuals) if residuals else None,
-                json.dumps(predictions) if predictions else None,
-                results['training_time'],
-                results['model_path'],
-                results.get('transformations_path'),
-                experiment_id
-            ))
-        else:
-            cursor.execute("""
-                UPDATE ml_experiments
-                SET status = 'failed',
-                    error_message = %s
-                WHERE id = %s
-            """, (
-                results.get('error_message', 'Unknown error'),
-                experiment_id
-            ))
-        
-        db.commit()
-        logger.info(f"Expérience {experiment_id} terminée: {results['status']}")
-        
+        stats = queue_stats()
     except Exception as e:
-        logger.error(f"Erreur entraînement background: {str(e)}")
-        # Rollback en cas d'erreur
-        db.rollback()
-        try:
-            cursor.execute("""
-                UPDATE ml_experiments
-                SET status = 'failed', error_message = %s
-                WHERE id = %s
-            """, (str(e), experiment_id))
-            db.commit()
-        except Exception as update_error:
-            logger.error(f"Erreur mise à jour statut failed: {str(update_error)}")
-    finally:
-        cursor.close()
-        db.close()
+        raise HTTPException(status_code=500, detail=str(e))
+    if TRAINING_WORKER_EMBEDDED:
+        stats['embedded_worker'] = training_worker.stats()
+    return stats
+
 
 @app.get("/ml/experiments/{experiment_id}")
-async def get_experiment(experiment_id: int):
-    """Get experiment details"""
+def get_experiment(experiment_id: int, http_request: Request,
+                         format: Optional[ResponseFormat] = Query(None)):
+    """
+    Get experiment details
+    
+    With format=arrow (or an Arrow Accept header), predictions / residuals are
+    streamed as an Arrow table and the other fields go in its schema metadata.
+    """
+    response_format = negotiate_format(format, http_request.headers.get('accept'))
     db = get_db_connection()
     cursor = db.cursor()
     
@@ -1518,7 +1588,7 @@ async def get_experiment(experiment_id: int):
                 metrics, confusion_matrix, roc_data, residuals, predictions,
                 training_time, model_path, status, error_message,
                 created_at, completed_at, project_id, dataset_id,
-                transformations_path
+                transformations_path, parent_id, search_config
             FROM ml_experiments
             WHERE id = %s
         """, (experiment_id,))
@@ -1577,7 +1647,7 @@ async def get_experiment(experiment_id: int):
             else:
                 completed_at = str(completed_at)
         
-        return {
+        experiment = {
             'id': result[0],
             'name': result[1],
             'description': result[2],
@@ -1600,9 +1670,20 @@ async def get_experiment(experiment_id: int):
             'completed_at': completed_at,
             'project_id': result[20],
             'dataset_id': result[21],
-            'transformations_path': result[22] if len(result) > 22 else None  # ✅ NOUVEAU
+            'transformations_path': result[22] if len(result) > 22 else None,  # ✅ NOUVEAU
+            'parent_id': result[23],
+            'search_config': json.loads(result[24]) if isinstance(result[24], str) else result[24]
         }
         
+        if response_format == 'arrow':
+            # Prédictions et résidus (régression) : une ligne par exemple de test
+            series = {key: experiment.pop(key) for key in ('predictions', 'residuals')}
+            table = pd.DataFrame({key: pd.Series(values, dtype='float64') for key, values in series.items() if values})
+            return tabular_response(experiment, 'data', encode_table(table, 'arrow'), 'arrow')
+        
+        # Les prédictions / résidus sont déjà des tableaux par colonne en JSON
+        return experiment
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -1616,7 +1697,7 @@ async def get_experiment(experiment_id: int):
 
 
 @app.get("/ml/experiments/list/{dataset_id}")
-async def list_experiments(dataset_id: int):
+def list_experiments(dataset_id: int):
     """Lister toutes les expériences d'un dataset"""
     db = get_db_connection()
     cursor = db.cursor()
@@ -1625,7 +1706,7 @@ async def list_experiments(dataset_id: int):
         cursor.execute("""
             SELECT id, name, algorithm, status, metrics, training_time, created_at
             FROM ml_experiments
-            WHERE dataset_id = %s
+            WHERE dataset_id = %s AND parent_id IS NULL
             ORDER BY created_at DESC
         """, (dataset_id,))
         
@@ -1653,6 +1734,43 @@ async def list_experiments(dataset_id: int):
         db.close()
 
 
+@app.get("/ml/experiments/{experiment_id}/candidates")
+def list_candidates(experiment_id: int):
+    """Candidats d'une recherche d'hyperparamètres, du meilleur au moins bon"""
+    db = get_db_connection()
+    cursor = db.cursor()
+    
+    try:
+        cursor.execute("""
+            SELECT id, name, hyperparameters, status, error_message, metrics, training_time, search_config
+            FROM ml_experiments
+            WHERE parent_id = %s
+            ORDER BY (search_config->>'rank')::int NULLS LAST, id
+        """, (experiment_id,))
+        
+        candidates = []
+        for row in cursor.fetchall():
+            candidates.append({
+                'id': row[0],
+                'name': row[1],
+                'hyperparameters': row[2] if isinstance(row[2], dict) else json.loads(row[2]) if row[2] else {},
+                'status': row[3],
+                'error_message': row[4],
+                'metrics': row[5] if isinstance(row[5], dict) else json.loads(row[5]) if row[5] else None,
+                'training_time': row[6],
+                **(row[7] if isinstance(row[7], dict) else json.loads(row[7]) if row[7] else {})
+            })
+        
+        return {'experiment_id': experiment_id, 'candidates': candidates}
+        
+    except Exception as e:
+        logger.error(f"Erreur liste candidats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        cursor.close()
+        db.close()
+
+
 @app.get("/ml/algorithms")
 async def get_algorithms():
     """List available algorithms"""
@@ -1739,7 +1857,8 @@ async def get_algorithm_params(algorithm_name: str):
 
 
 @app.get("/ml/experiments/{experiment_id}/tree-visualization")
-async def visualize_tree(experiment_id: int):
+@offload('visualize')
+def visualize_tree(experiment_id: int):
     """Generate decision tree visualization"""
     db = get_db_connection()
     cursor = db.cursor()
@@ -1877,7 +1996,7 @@ async def visualize_tree(experiment_id: int):
 from fastapi.responses import FileResponse
 
 @app.get("/ml/experiments/{experiment_id}/download-model")
-async def download_model(experiment_id: int):
+def download_model(experiment_id: int):
     """Download trained model file"""
     db = get_db_connection()
     cursor = db.cursor()
@@ -1923,97 +2042,30 @@ async def download_model(experiment_id: int):
 @app.post("/ml/experiments/{experiment_id}/predict")
 async def predict_with_model(experiment_id: int, request: dict):
     """Make predictions with automatic preprocessing"""
-    db = get_db_connection()
-    cursor = db.cursor()
+    # Extraire les données d'entrée
+    input_data = request.get('data', [])
+    
+    if not input_data:
+        raise HTTPException(status_code=400, detail="No input data provided")
     
     try:
-        # Récupérer le modèle et sa config
-        cursor.execute("""
-            SELECT model_path, feature_columns, algorithm, transformations_path
-            FROM ml_experiments
-            WHERE id = %s AND status = 'completed'
-        """, (experiment_id,))
-        
-        result = cursor.fetchone()
-        
-        if not result:
-            raise HTTPException(status_code=404, detail="Experiment not found")
-        
-        model_path = result[0]
-        feature_columns = result[1] if isinstance(result[1], list) else json.loads(result[1])
-        algorithm = result[2]
-        transformations_path = result[3]
-        
-        if not model_path or not os.path.exists(model_path):
-            raise HTTPException(status_code=404, detail="Model file not found")
-        
-        # Charger le modèle
-        model = joblib.load(model_path)
-        logger.info(f"✅ Loaded model from {model_path}")
-        
-        # Extraire les données d'entrée
-        input_data = request.get('data', [])
-        
-        if not input_data:
-            raise HTTPException(status_code=400, detail="No input data provided")
-        
-        # Convertir en DataFrame
-        df = pd.DataFrame(input_data)
-        logger.info(f"📊 Received {len(df)} samples with columns: {df.columns.tolist()}")
-        
-        # ✅ NOUVEAU : Appliquer les transformations si disponibles
-        if transformations_path and os.path.exists(transformations_path):
-            logger.info("🔄 Applying saved transformations...")
-            try:
-                preprocessor = DataPreprocessor(transformations_path)
-                df_transformed = preprocessor.transform(df)
-                logger.info("✅ Transformations applied successfully")
-            except Exception as e:
-                logger.error(f"❌ Error applying transformations: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Transformation error: {str(e)}")
-        else:
-            logger.warning("⚠️  No transformations found. Using raw data.")
-            # Vérifier les colonnes
-            missing_cols = set(feature_columns) - set(df.columns)
-            if missing_cols:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Missing required columns: {missing_cols}"
-                )
-            df_transformed = df[feature_columns]
-        
-        # Convertir en numpy array
-        X = df_transformed.values
-        
-        # Gérer les valeurs manquantes
-        if np.isnan(X).any():
-            logger.warning("⚠️  Input contains NaN values. Filling with 0...")
-            X = np.nan_to_num(X, nan=0.0)
-        
-        # Prédictions
-        predictions = model.predict(X)
-        logger.info(f"✅ Predictions: {predictions}")
-        
-        # Probabilités (si disponible)
-        probabilities = None
-        if hasattr(model, 'predict_proba'):
-            probabilities = model.predict_proba(X).tolist()
-        
-        return {
-            'predictions': predictions.tolist(),
-            'probabilities': probabilities,
-            'algorithm': algorithm,
-            'n_samples': len(predictions),
-            'transformations_applied': transformations_path is not None
-        }
-        
-    except HTTPException:
+        input_data = as_records(input_data)
+        
+        if PREDICT_BATCHING:
+            # Regroupée avec les requêtes simultanées de la même expérience
+            return await asyncio.wrap_future(prediction_batcher.submit(experiment_id, input_data))
+        
+        result = (await scheduler.run('predict', predict_batch, experiment_id, [input_data]))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+        
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (HTTPException, SchedulerBusy):
         raise
     except Exception as e:
         logger.error(f"❌ Prediction error: {str(e)}")
-        import traceback
-        traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        db.close()
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""
+Native CHAID tree builder (NumPy)
+
+The CHAID library declares every feature nominal: on the standardized
+floats produced by MLTrainer.prepare_data each distinct value becomes a
+category, and fitting explodes. This builder bins every feature once:
+- a feature with at most CHAID_MAX_CATEGORIES distinct values stays nominal,
+  and its values are the categories;
+- any other feature is cut into CHAID_ORDINAL_BINS quantile bins, which
+  are treated as ordinal.
+Missing values form a floating category that can merge with any group.
+
+At each node, the category x class contingency table of a feature is a
+single bincount. Categories are merged while the least different pair
+has a p-value above alpha_merge: any pair for a nominal feature, adjacent
+groups for an ordinal one. All candidate pairs are tested at once. The
+node is split on the feature with the smallest Bonferroni-adjusted
+p-value. The features of a node can be evaluated in parallel threads
+(CHAID_SPLIT_WORKERS).
+"""
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.special import chdtrc
+
+logger = logging.getLogger(__name__)
+
+
+# Au-delà de ce nombre de valeurs distinctes, une feature est découpée en intervalles ordinaux
+CHAID_MAX_CATEGORIES = int(os.getenv('CHAID_MAX_CATEGORIES', '20'))
+CHAID_ORDINAL_BINS = int(os.getenv('CHAID_ORDINAL_BINS', '10'))
+# Threads évaluant les features d'un nœud en parallèle (1 = séquentiel)
+CHAID_SPLIT_WORKERS = int(os.getenv('CHAID_SPLIT_WORKERS', '1'))
+
+MISSING_LABEL = '<missing>'
+
+
+@dataclass
+class FeatureBins:
+    """Categories of a feature: exact values (nominal) or inner bin edges (ordinal)"""
+    ordinal: bool
+    values: np.ndarray
+
+    @property
+    def n_codes(self) -> int:
+        # + le code des valeurs manquantes (toujours le dernier)
+        return (len(self.values) + 1 if self.ordinal else len(self.values)) + 1
+
+    @property
+    def missing_code(self) -> int:
+        return self.n_codes - 1
+
+    def codes(self, column: np.ndarray) -> np.ndarray:
+        missing = np.isnan(column)
+        if self.ordinal:
+            codes = np.searchsorted(self.values, column, side='right')
+        else:
+            codes = np.minimum(np.searchsorted(self.values, column), max(len(self.values) - 1, 0))
+        codes[missing] = self.missing_code
+        return codes.astype(np.int64)
+
+    def describe(self, group: List[int]) -> str:
+        """Readable condition of a group of codes (values, or the interval they cover)"""
+        ranged = [code for code in group if code != self.missing_code]
+        if not ranged:
+            labels = []
+        elif self.ordinal:
+            low = f"{self.values[ranged[0] - 1]:.4g}" if ranged[0] > 0 else "-inf"
+            high = f"{self.values[ranged[-1]]:.4g}" if ranged[-1] < len(self.values) else "+inf"
+            labels = [f"[{low}, {high})"]
+        else:
+            labels = [f"{self.values[code]:g}" for code in ranged]
+        if len(ranged) < len(group):
+            labels.append(MISSING_LABEL)
+        return ' or '.join(labels) if self.ordinal else f"in [{', '.join(labels)}]"
+
+
+def bin_feature(column: np.ndarray, max_categories: int = CHAID_MAX_CATEGORIES,
+                ordinal_bins: int = CHAID_ORDINAL_BINS) -> FeatureBins:
+    finite = column[~np.isnan(column)]
+    values = np.unique(finite)
+    if len(values) <= max_categories:
+        return FeatureBins(ordinal=False, values=values)
+    quantiles = np.linspace(0, 1, ordinal_bins + 1)[1:-1]
+    # Quantiles confondus (valeurs très répétées) : un seul bord
+    edges = np.unique(np.quantile(finite, quantiles))
+    return FeatureBins(ordinal=True, values=edges)
+
+
+def chi_square(tables: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Chi-square statistic, degrees of freedom and p-value of a stack of (rows x classes) tables"""
+    rows = tables.sum(axis=2)
+    cols = tables.sum(axis=1)
+    total = np.maximum(rows.sum(axis=1), 1)
+    expected = rows[:, :, np.newaxis] * cols[:, np.newaxis, :] / total[:, np.newaxis, np.newaxis]
+    # Cellules d'espérance nulle (ligne ou classe vide) : exclues de la statistique
+    cells = np.divide(np.square(tables - expected), expected, out=np.zeros_like(expected), where=expected > 0)
+    statistic = cells.sum(axis=(1, 2))
+    dof = ((rows > 0).sum(axis=1) - 1) * ((cols > 0).sum(axis=1) - 1)
+    p_value = chdtrc(np.maximum(dof, 1), statistic)
+    p_value[dof <= 0] = 1.0
+    return statistic, dof, p_value
+
+
+def _stirling2(n: int, k: int) -> int:
+    """Partitions of n categories into k non-empty groups"""
+    return sum((-1) ** i * math.comb(k, i) * (k - i) ** n for i in range(k + 1)) // math.factorial(k)
+
+
+def _bonferroni(n_categories: int, n_groups: int, ordinal: bool, floating: bool) -> float:
+    """Kass multiplier: number of ways of reducing the categories to n_groups groups"""
+    if n_groups >= n_categories:
+        return 1.0
+    if not ordinal:
+        multiplier = _stirling2(n_categories, n_groups)
+    elif floating:
+        # La catégorie manquante peut rejoindre n'importe quel groupe
+        multiplier = math.comb(n_categories - 2, n_groups - 2) + n_groups * math.comb(n_categories - 2, n_groups - 1)
+    else:
+        multiplier = math.comb(n_categories - 1, n_groups - 1)
+    return float(min(multiplier, 10 ** 300))
+
+
+@dataclass
+class Split:
+    feature: int
+    groups: List[List[int]]
+    statistic: float
+    dof: int
+    p_value: float
+
+
+class _SplitSearch:
+    """Merging of the categories of one feature at one node"""
+
+    def __init__(self, bins: FeatureBins, alpha_merge: float, min_samples_leaf: int):
+        self.bins = bins
+        self.alpha_merge = alpha_merge
+        self.min_samples_leaf = min_samples_leaf
+
+    def _pairs(self, groups: List[List[int]]) -> np.ndarray:
+        """Groups allowed to merge, as (pairs x 2) indices"""
+        if not self.bins.ordinal:
+            return np.column_stack(np.triu_indices(len(groups), k=1))
+        missing = self.bins.missing_code
+        # Groupes ordinaux triés par leur premier code ; seuls les voisins fusionnent
+        ranged = [i for i, group in enumerate(groups) if any(code != missing for code in group)]
+        pairs = list(zip(ranged[:-1], ranged[1:]))
+        alone = [i for i, group in enumerate(groups) if group == [missing]]
+        pairs += [(alone[0], i) for i in ranged] if alone else []
+        return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+    @staticmethod
+    def _merge(groups: List[List[int]], tables: np.ndarray, a: int, b: int):
+        # Le groupe fusionné prend la place du premier : l'ordre des codes (et des intervalles) est gardé
+        a, b = min(a, b), max(a, b)
+        merged = tables[a] + tables[b]
+        tables = np.concatenate([tables[:b], tables[b + 1:]])
+        tables[a] = merged
+        groups = groups[:a] + [sorted(groups[a] + groups[b])] + groups[a + 1:b] + groups[b + 1:]
+        return groups, tables
+
+    def run(self, feature: int, table: np.ndarray) -> Optional[Split]:
+        present = np.flatnonzero(table.sum(axis=1) > 0)
+        if len(present) < 2:
+            return None
+        groups = [[int(code)] for code in present]
+        tables = table[present].astype(np.float64)
+
+        # Fusion des paires les moins différentes tant qu'elles ne sont pas significatives
+        while len(groups) > 1:
+            pairs = self._pairs(groups)
+            if not len(pairs):
+                break
+            # Tables 2 x classes de toutes les paires candidates en un seul calcul
+            _, _, p_values = chi_square(tables[pairs])
+            best = int(np.argmax(p_values))
+            if p_values[best] <= self.alpha_merge:
+                break
+            groups, tables = self._merge(groups, tables, *pairs[best])
+
+        # Groupes trop petits pour une feuille : fusionnés avec le groupe le plus proche
+        while len(groups) > 1:
+            sizes = tables.sum(axis=1)
+            smallest = int(np.argmin(sizes))
+            if sizes[smallest] >= self.min_samples_leaf:
+                break
+            pairs = self._pairs(groups)
+            pairs = pairs[(pairs == smallest).any(axis=1)]
+            if not len(pairs):
+                return None
+            _, _, p_values = chi_square(tables[pairs])
+            groups, tables = self._merge(groups, tables, *pairs[int(np.argmax(p_values))])
+
+        if len(groups) < 2:
+            return None
+
+        statistic, dof, p_value = chi_square(tables[np.newaxis])
+        floating = self.bins.missing_code in present
+        adjusted = min(1.0, float(p_value[0]) * _bonferroni(len(present), len(groups), self.bins.ordinal, floating))
+        return Split(feature, groups, float(statistic[0]), int(dof[0]), adjusted)
+
+
+class NativeCHAIDTree:
+    """CHAID tree built by build_tree: routing arrays (see CHAIDWrapper.apply) and a text description"""
+
+    def __init__(self, arrays: Dict, classes: np.ndarray, feature_names: List[str], descriptions: List[Dict]):
+        self.arrays = arrays
+        self.classes = classes
+        self.feature_names = feature_names
+        self.descriptions = descriptions
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.descriptions)
+
+    @property
+    def depth(self) -> int:
+        return max(node['depth'] for node in self.descriptions)
+
+    def __repr__(self) -> str:
+        lines = []
+        counts = self.arrays['counts']
+        for i, node in enumerate(self.descriptions):
+            members = {str(cls): int(count) for cls, count in zip(self.classes.tolist(), counts[i])}
+            line = '    ' * node['depth'] + (node['rule'] or 'root') + f" (n={int(counts[i].sum())}, {members})"
+            if node['split'] is not None:
+                split = node['split']
+                line += (f" -> split on {self.feature_names[split.feature]} "
+                         f"(chi2={split.statistic:.2f}, dof={split.dof}, p={split.p_value:.3g})")
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+def build_tree(X: np.ndarray, y: np.ndarray, feature_names: List[str], max_depth: int = 5,
+               min_samples_split: int = 30, min_samples_leaf: int = 10, alpha_merge: float = 0.05,
+               n_jobs: int = CHAID_SPLIT_WORKERS) -> NativeCHAIDTree:
+    """Grow a CHAID classification tree on a float feature matrix"""
+    X = np.asarray(X, dtype=np.float64)
+    classes, y_codes = np.unique(y, return_inverse=True)
+    n_classes = len(classes)
+
+    bins = [bin_feature(X[:, j]) for j in range(X.shape[1])]
+    codes = np.column_stack([b.codes(X[:, j]) for j, b in enumerate(bins)]) if bins else np.empty((len(X), 0), np.int64)
+    searches = [_SplitSearch(b, alpha_merge, min_samples_leaf) for b in bins]
+    logger.info(f"🌳 CHAID: {sum(b.ordinal for b in bins)} ordinal / {sum(not b.ordinal for b in bins)} nominal "
+                f"features, {len(X)} rows")
+
+    feature, ordinal, missing_child = [], [], []
+    keys: List[Optional[np.ndarray]] = []
+    children: List[Optional[np.ndarray]] = []
+    counts, descriptions = [], []
+
+    executor = ThreadPoolExecutor(max_workers=n_jobs, thread_name_prefix='chaid') if n_jobs > 1 else None
+
+    def evaluate(rows: np.ndarray, j: int) -> Optional[Split]:
+        table = np.bincount(codes[rows, j] * n_classes + y_codes[rows],
+                            minlength=bins[j].n_codes * n_classes).reshape(bins[j].n_codes, n_classes)
+        return searches[j].run(j, table)
+
+    def best_split(rows: np.ndarray) -> Optional[Split]:
+        if executor is not None:
+            candidates = list(executor.map(lambda j: evaluate(rows, j), range(len(bins))))
+        else:
+            candidates = [evaluate(rows, j) for j in range(len(bins))]
+        candidates = [split for split in candidates if split is not None]
+        if not candidates:
+            return None
+        best = min(candidates, key=lambda split: (split.p_value, -split.statistic))
+        return best if best.p_value < alpha_merge else None
+
+    def grow(rows: np.ndarray, depth: int, rule: Optional[str]) -> int:
+        node = len(descriptions)
+        node_counts = np.bincount(y_codes[rows], minlength=n_classes)
+        feature.append(-1)
+        ordinal.append(False)
+        missing_child.append(-1)
+        keys.append(None)
+        children.append(None)
+        counts.append(node_counts)
+        descriptions.append({'depth': depth, 'rule': rule, 'split': None})
+
+        if depth >= max_depth or len(rows) < min_samples_split or np.count_nonzero(node_counts) < 2:
+            return node
+        split = best_split(rows)
+        if split is None:
+            return node
+
+        j = split.feature
+        column_bins = bins[j]
+        descriptions[node]['split'] = split
+        feature[node] = j
+        ordinal[node] = column_bins.ordinal
+        row_codes = codes[rows, j]
+
+        values, ids, bounds = [], [], []
+        for group in split.groups:
+            child = grow(rows[np.isin(row_codes, group)], depth + 1,
+                         f"{feature_names[j]} {column_bins.describe(group)}")
+            if column_bins.missing_code in group:
+                missing_child[node] = child
+            ranged = [code for code in group if code != column_bins.missing_code]
+            if not ranged:
+                continue
+            if column_bins.ordinal:
+                # Intervalles contigus : seuil = bord inférieur du premier intervalle du groupe
+                bounds.append(column_bins.values[ranged[0] - 1] if ranged[0] > 0 else -np.inf)
+                ids.append(child)
+            else:
+                values.extend(column_bins.values[ranged])
+                ids.extend([child] * len(ranged))
+
+        if column_bins.ordinal:
+            # Le premier groupe reçoit aussi tout ce qui est sous son intervalle
+            keys[node] = np.asarray(bounds[1:], dtype=np.float64)
+            children[node] = np.asarray(ids, dtype=np.int64)
+        else:
+            order = np.argsort(values, kind='stable')
+            keys[node] = np.asarray(values, dtype=np.float64)[order]
+            children[node] = np.asarray(ids, dtype=np.int64)[order]
+        return node
+
+    try:
+        grow(np.arange(len(X)), 0, None)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    arrays = {
+        'feature': np.asarray(feature, dtype=np.int64),
+        'ordinal': np.asarray(ordinal, dtype=bool),
+        'keys': keys,
+        'children': children,
+        'missing_child': np.asarray(missing_child, dtype=np.int64),
+        'counts': np.asarray(counts, dtype=np.float64).reshape(len(counts), n_classes)
+    }
+    return NativeCHAIDTree(arrays, classes, list(feature_names), descriptions)
@@ -1,7 +1,10 @@
-from typing import Dict
+from typing import Any, Dict, List, Optional, Tuple
 import pandas as pd
 import numpy as np
 import logging
+import os
+
+from .chaid_builder import CHAID_SPLIT_WORKERS, NativeCHAIDTree, build_tree
 
 logger = logging.getLogger(__name__)
 
@@ -12,31 +15,57 @@ except ImportError:
     CHAID_AVAILABLE = False
     logger.warning("CHAID library not installed. Install with: pip install CHAID")
 
+# Catégorie des valeurs manquantes dans les nœuds de la librairie CHAID
+MISSING_CHOICE = '<missing>'
+# Construction de l'arbre : 'native' (chaid_builder, NumPy) ou 'library' (package CHAID)
+CHAID_BUILDER = os.getenv('CHAID_BUILDER', 'native')
+
 
 class CHAIDWrapper:
     """Wrapper pour CHAID qui imite l'API sklearn"""
     
-    def __init__(self, max_depth=5, min_samples_split=30, min_samples_leaf=10, alpha_merge=0.05):
+    def __init__(self, max_depth=5, min_samples_split=30, min_samples_leaf=10, alpha_merge=0.05,
+                 builder=CHAID_BUILDER, n_jobs=CHAID_SPLIT_WORKERS):
         self.max_depth = max_depth
         self.min_samples_split = min_samples_split
         self.min_samples_leaf = min_samples_leaf
         self.alpha_merge = alpha_merge
+        self.builder = builder
+        self.n_jobs = n_jobs
         self.tree = None
         self.feature_names = None
         self.classes_ = None
+        self.tree_arrays_ = None
         
     def fit(self, X, y):
         """Entraîner le modèle CHAID"""
-        if not CHAID_AVAILABLE:
-            raise ImportError("CHAID library not installed. Please run: pip install CHAID")
-        
-        # Convertir en DataFrame pour CHAID
         if not isinstance(X, pd.DataFrame):
             self.feature_names = [f'feature_{i}' for i in range(X.shape[1])]
-            X_df = pd.DataFrame(X, columns=self.feature_names)
         else:
-            X_df = X.copy()
             self.feature_names = X.columns.tolist()
+
+        if self.builder == 'native':
+            # Features continues découpées en intervalles, tables de contingence NumPy
+            self.tree = build_tree(
+                X.values if isinstance(X, pd.DataFrame) else X,
+                y,
+                self.feature_names,
+                max_depth=self.max_depth,
+                min_samples_split=self.min_samples_split,
+                min_samples_leaf=self.min_samples_leaf,
+                alpha_merge=self.alpha_merge,
+                n_jobs=self.n_jobs
+            )
+            self.classes_ = self.tree.classes
+            self.tree_arrays_ = self.tree.arrays
+            logger.info(f"CHAID tree created: {self.tree.n_nodes} nodes, depth {self.tree.depth}")
+            return self
+
+        if not CHAID_AVAILABLE:
+            raise ImportError("CHAID library not installed. Please run: pip install CHAID")
+        
+        # Convertir en DataFrame pour CHAID
+        X_df = pd.DataFrame(X, columns=self.feature_names) if not isinstance(X, pd.DataFrame) else X.copy()
         
         # Ajouter la target
         X_df['target'] = y
@@ -57,50 +86,136 @@ class CHAIDWrapper:
             min_child_node_size=self.min_samples_leaf,
             alpha_merge=self.alpha_merge
         )
+        self.tree_arrays_ = self._compile()
         
         logger.info(f"CHAID tree created with depth {self.max_depth}")
         return self
     
-    def predict(self, X):
-        """Prédire avec le modèle CHAID"""
+    def _compile(self) -> Dict[str, Any]:
+        """
+        Forme tableau de l'arbre ajusté pour router un lot de lignes avec NumPy
+
+        Par nœud : colonne de split (-1 pour une feuille), valeurs de catégories
+        triées et enfant associé, enfant des valeurs manquantes, effectifs par classe.
+        Les splits de la librairie sont tous nominaux (valeurs exactes).
+        """
+        nodes = self.tree.tree_store
+        position = {node.node_id: i for i, node in enumerate(nodes)}
+        class_index = {value: i for i, value in enumerate(self.classes_.tolist())}
+
+        feature = np.full(len(nodes), -1, dtype=np.int64)
+        missing_child = np.full(len(nodes), -1, dtype=np.int64)
+        counts = np.zeros((len(nodes), len(self.classes_)))
+        keys: List[Optional[np.ndarray]] = [None] * len(nodes)
+        children: List[Optional[np.ndarray]] = [None] * len(nodes)
+
+        groups: Dict[int, List] = {}
+        for i, node in enumerate(nodes):
+            for value, count in node.members.items():
+                if value in class_index:
+                    counts[i, class_index[value]] = count
+            if node.parent is not None:
+                groups.setdefault(position[node.parent], []).append((i, node.choices))
+
+        for parent, kids in groups.items():
+            values, ids = [], []
+            for child, choices in kids:
+                for choice in choices:
+                    if isinstance(choice, str) and choice == MISSING_CHOICE:
+                        missing_child[parent] = child
+                    else:
+                        values.append(choice)
+                        ids.append(child)
+            values = np.asarray(values)
+            order = np.argsort(values, kind='stable')
+            keys[parent] = values[order]
+            children[parent] = np.asarray(ids, dtype=np.int64)[order]
+            feature[parent] = nodes[parent].split.column_id
+
+        return {
+            'feature': feature,
+            'ordinal': np.zeros(len(nodes), dtype=bool),
+            'keys': keys,
+            'children': children,
+            'missing_child': missing_child,
+            'counts': counts
+        }
+
+    def _tree_arrays(self) -> Dict[str, Any]:
+        # Modèles (librairie) sauvegardés avant la compilation : compilés au premier appel
+        if getattr(self, 'tree_arrays_', None) is None:
+            self.tree_arrays_ = self._compile()
+        return self.tree_arrays_
+
+    def apply(self, X) -> np.ndarray:
+        """
+        Index du nœud atteint par chaque ligne (ordre de tree.tree_store pour
+        un arbre de la librairie, ordre de construction pour l'arbre natif)
+
+        Les lignes sont routées niveau par niveau, un appel NumPy par nœud
+        interne. Un split ordinal compare la valeur aux seuils des intervalles,
+        un split nominal cherche la valeur exacte : une catégorie inconnue de
+        l'arbre arrête la ligne au nœud courant.
+        """
         if self.tree is None:
             raise ValueError("Model not fitted yet")
-        
-        if not isinstance(X, pd.DataFrame):
-            X_df = pd.DataFrame(X, columns=self.feature_names)
-        else:
-            X_df = X.copy()
-        
-        predictions = []
-        for _, row in X_df.iterrows():
-            # Convertir la ligne en dictionnaire
-            row_dict = row.to_dict()
-            try:
-                pred = self.tree.node_predictions(row_dict)
-                predictions.append(pred)
-            except Exception as e:
-                logger.warning(f"Prediction error for row, using majority class: {e}")
-                # En cas d'erreur, utiliser la classe majoritaire
-                predictions.append(self.classes_[0])
-        
-        return np.array(predictions)
-    
+        arrays = self._tree_arrays()
+        feature, keys, children = arrays['feature'], arrays['keys'], arrays['children']
+        ordinal = arrays.get('ordinal')
+
+        X = X.values if isinstance(X, pd.DataFrame) else np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Expected {len(self.feature_names)} features, got {X.shape[-1]}")
+
+        nodes = np.zeros(len(X), dtype=np.int64)
+        active = np.arange(len(X)) if feature[0] >= 0 else np.empty(0, dtype=np.int64)
+        while active.size:
+            current = nodes[active]
+            moved = np.full(active.size, -1, dtype=np.int64)
+            for parent in np.unique(current):
+                selected = np.flatnonzero(current == parent)
+                values = X[active[selected], feature[parent]]
+                missing = pd.isna(values)
+                target = np.full(values.size, arrays['missing_child'][parent], dtype=np.int64)
+
+                present = np.flatnonzero(~missing)
+                node_keys = keys[parent]
+                if present.size and ordinal is not None and ordinal[parent]:
+                    target[present] = children[parent][np.searchsorted(node_keys, values[present], side='right')]
+                elif present.size and node_keys.size:
+                    pos = np.minimum(np.searchsorted(node_keys, values[present]), len(node_keys) - 1)
+                    target[present] = np.where(node_keys[pos] == values[present], children[parent][pos], -1)
+                elif present.size:
+                    target[present] = -1
+                moved[selected] = target
+
+            routed = moved >= 0
+            nodes[active[routed]] = moved[routed]
+            active = active[routed]
+            active = active[feature[nodes[active]] >= 0]
+
+        return nodes
+
+    def predict_with_proba(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Classes et probabilités en un seul routage des lignes
+
+        Les probabilités sont les fréquences des classes parmi les lignes
+        d'entraînement du nœud atteint. La classe prédite est la plus fréquente.
+        """
+        nodes = self.apply(X)
+        proba = self._tree_arrays()['counts'][nodes]
+        totals = proba.sum(axis=1, keepdims=True)
+        proba = np.divide(proba, totals, out=np.full_like(proba, 1.0 / len(self.classes_)), where=totals > 0)
+        return self.classes_[np.argmax(proba, axis=1)], proba
+
+    def predict(self, X):
+        """Prédire avec le modèle CHAID (classe majoritaire du nœud atteint)"""
+        return self.predict_with_proba(X)[0]
+
     def predict_proba(self, X):
-        """Prédire les probabilités"""
-        predictions = self.predict(X)
-        n_samples = len(predictions)
-        n_classes = len(self.classes_)
-        
-        proba = np.zeros((n_samples, n_classes))
-        for i, pred in enumerate(predictions):
-            class_idx = np.where(self.classes_ == pred)[0]
-            if len(class_idx) > 0:
-                proba[i, class_idx[0]] = 1.0
-            else:
-                # Si classe inconnue, probabilité uniforme
-                proba[i, :] = 1.0 / n_classes
-        
-        return proba
+        """Prédire les probabilités (fréquences des classes du nœud atteint)"""
+        return self.predict_with_proba(X)[1]
 
 
 class CHAIDAlgorithm:
@@ -110,7 +225,8 @@ class CHAIDAlgorithm:
     def create_model(hyperparameters: Dict):
         """Crée un modèle CHAID"""
         
-        if not CHAID_AVAILABLE:
+        # Le builder natif n'a besoin que de NumPy/SciPy ; le fallback ne concerne que la librairie
+        if CHAID_BUILDER == 'library' and not CHAID_AVAILABLE:
             from sklearn.tree import DecisionTreeClassifier
             logger.warning("CHAID library not available. Using Decision Tree approximation with Gini criterion")
             
@@ -0,0 +1,266 @@
+"""
+Prediction with the models of the registry, one request or a micro-batch
+
+`predict_batch` runs several prediction requests of one experiment in a
+single transform and predict/predict_proba call, then splits the results
+back per request.
+
+`PredictionBatcher` (opt-in, PREDICT_BATCHING) collects the /predict
+requests that arrive within a short window for the same experiment. Each
+collected batch runs as one job on the 'predict' lane of the scheduler, so
+concurrent single-row calls share the per-call pandas and scikit-learn
+overhead. Waiting requests do not hold a thread.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from ..scheduler import scheduler, SchedulerBusy
+from .registry import ModelBundle, model_registry
+
+logger = logging.getLogger(__name__)
+
+
+PREDICT_BATCHING = os.getenv('PREDICT_BATCHING', 'false').lower() == 'true'
+# Fenêtre de regroupement des requêtes d'une même expérience
+PREDICT_BATCH_WINDOW_MS = float(os.getenv('PREDICT_BATCH_WINDOW_MS', '5'))
+# Un lot est lancé sans attendre la fin de la fenêtre dès qu'il atteint ce nombre de lignes
+PREDICT_BATCH_MAX_ROWS = int(os.getenv('PREDICT_BATCH_MAX_ROWS', '1024'))
+
+
+def as_records(data) -> List[Dict]:
+    """Input rows of a /predict body: a list of records, or columns {name: [values]}"""
+    if isinstance(data, dict):
+        try:
+            return pd.DataFrame(data).to_dict('records')
+        except ValueError as e:
+            raise ValueError(f"Invalid input data: {e}")
+    if not isinstance(data, list) or not all(isinstance(record, dict) for record in data):
+        raise ValueError("Input data must be a list of records")
+    return data
+
+
+def _required_columns(bundle: ModelBundle) -> List[str]:
+    if bundle.preprocessor is not None:
+        return bundle.preprocessor.feature_columns
+    return bundle.feature_columns
+
+
+def _features(bundle: ModelBundle, records: List[Dict]) -> np.ndarray:
+    """Model input of rows (saved transformations, or raw feature columns)"""
+    if bundle.plan is not None:
+        # Plan compilé : ni DataFrame ni copie pandas
+        try:
+            X = bundle.plan.transform_records(records)
+        except (TypeError, ValueError) as e:
+            logger.error(f"❌ Error applying transformations: {str(e)}")
+            raise RuntimeError(f"Transformation error: {str(e)}")
+        if np.isnan(X).any():
+            logger.warning("⚠️  Input contains NaN values. Filling with 0...")
+            X = np.nan_to_num(X, nan=0.0)
+        return X
+
+    df = pd.DataFrame(records)
+    if bundle.preprocessor is not None:
+        try:
+            df_transformed = bundle.preprocessor.transform(df)
+        except Exception as e:
+            logger.error(f"❌ Error applying transformations: {str(e)}")
+            raise RuntimeError(f"Transformation error: {str(e)}")
+    else:
+        df_transformed = df[bundle.feature_columns]
+
+    X = df_transformed.values
+
+    # Gérer les valeurs manquantes
+    if np.isnan(X).any():
+        logger.warning("⚠️  Input contains NaN values. Filling with 0...")
+        X = np.nan_to_num(X, nan=0.0)
+    return X
+
+
+def _predict(bundle: ModelBundle, requests: List[List[Dict]]) -> List[Dict]:
+    sizes = [len(records) for records in requests]
+    # Une seule transformation pour tout le lot
+    X = _features(bundle, [record for records in requests for record in records])
+
+    if hasattr(bundle.model, 'predict_with_proba'):
+        predictions, probabilities = bundle.model.predict_with_proba(X)
+    else:
+        predictions = bundle.model.predict(X)
+        probabilities = bundle.model.predict_proba(X) if hasattr(bundle.model, 'predict_proba') else None
+
+    results = []
+    bounds = np.cumsum([0] + sizes)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        results.append({
+            'predictions': predictions[start:end].tolist(),
+            'probabilities': probabilities[start:end].tolist() if probabilities is not None else None,
+            'algorithm': bundle.algorithm,
+            'n_samples': int(end - start),
+            'transformations_applied': bundle.transformations_path is not None
+        })
+    return results
+
+
+def predict_batch(experiment_id: int, requests: List[List[Dict]]) -> List[Any]:
+    """
+    Predict several requests (lists of records) of one experiment at once
+
+    Returns one entry per request: the response dict, or the exception to
+    raise for it (LookupError: unknown model, ValueError: missing columns,
+    RuntimeError: transformation error). If the fused call fails, the
+    requests are run one by one so an error is only reported to its request.
+    """
+    try:
+        bundle = model_registry.get(experiment_id)
+    except Exception as e:
+        return [e] * len(requests)
+
+    results: List[Any] = [None] * len(requests)
+    required = _required_columns(bundle)
+    valid = []
+    for i, records in enumerate(requests):
+        missing = set(required) - set().union(*(record.keys() for record in records))
+        if missing:
+            results[i] = ValueError(f"Missing required columns: {missing}")
+        else:
+            valid.append(i)
+
+    if not valid:
+        return results
+
+    try:
+        for i, result in zip(valid, _predict(bundle, [requests[i] for i in valid])):
+            results[i] = result
+    except Exception as e:
+        if len(valid) == 1:
+            results[valid[0]] = e
+        else:
+            logger.warning(f"⚠️ Batched prediction failed ({e}), predicting the {len(valid)} requests one by one")
+            for i in valid:
+                try:
+                    results[i] = _predict(bundle, [requests[i]])[0]
+                except Exception as request_error:
+                    results[i] = request_error
+
+    logger.info(f"✅ {sum(len(requests[i]) for i in valid)} predictions for experiment {experiment_id} "
+                f"({len(requests)} requests)")
+    return results
+
+
+class _Batch:
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.requests: List[List[Dict]] = []
+        self.futures: List[Future] = []
+        self.rows = 0
+
+
+class PredictionBatcher:
+    """Collects concurrent /predict requests per experiment and runs them as one call"""
+
+    def __init__(self, window_ms: float = PREDICT_BATCH_WINDOW_MS, max_rows: int = PREDICT_BATCH_MAX_ROWS,
+                 lane: str = 'predict'):
+        self.window = window_ms / 1000
+        self.max_rows = max_rows
+        self.lane = lane
+        self._pending: Dict[int, _Batch] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stats = {'requests': 0, 'rows': 0, 'batches': 0, 'batched_requests': 0, 'rejected': 0}
+
+    def submit(self, experiment_id: int, records: List[Dict]) -> Future:
+        """Queue a request, the Future resolves to its response dict"""
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='predict-batcher', daemon=True)
+                self._thread.start()
+
+            batch = self._pending.get(experiment_id)
+            if batch is None:
+                batch = self._pending[experiment_id] = _Batch(time.monotonic() + self.window)
+            batch.requests.append(records)
+            batch.futures.append(future)
+            batch.rows += len(records)
+            self._stats['requests'] += 1
+            self._stats['rows'] += len(records)
+            self._cond.notify()
+        return future
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    due = [experiment_id for experiment_id, batch in self._pending.items()
+                           if batch.deadline <= now or batch.rows >= self.max_rows]
+                    if due:
+                        break
+                    timeout = min((batch.deadline for batch in self._pending.values()), default=None)
+                    self._cond.wait(None if timeout is None else timeout - now)
+                batches = [(experiment_id, self._pending.pop(experiment_id)) for experiment_id in due]
+                self._stats['batches'] += len(batches)
+                self._stats['batched_requests'] += sum(len(batch.futures) for _, batch in batches)
+
+            for experiment_id, batch in batches:
+                self._dispatch(experiment_id, batch)
+
+    def _dispatch(self, experiment_id: int, batch: _Batch) -> None:
+        try:
+            job = scheduler.submit(self.lane, predict_batch, experiment_id, batch.requests)
+        except SchedulerBusy as e:
+            with self._cond:
+                self._stats['rejected'] += len(batch.futures)
+            for future in batch.futures:
+                self._resolve(future, e)
+            return
+
+        def fan_out(done: Future):
+            if done.cancelled() or done.exception() is not None:
+                error = done.exception() if not done.cancelled() else RuntimeError("Prediction batch cancelled")
+                results = [error] * len(batch.futures)
+            else:
+                results = done.result()
+            for future, result in zip(batch.futures, results):
+                self._resolve(future, result)
+
+        job.add_done_callback(fan_out)
+
+    @staticmethod
+    def _resolve(future: Future, result) -> None:
+        """Set the response (or exception) of one request, unless its client gave up"""
+        try:
+            # Requête annulée (client déconnecté) : son Future ne peut plus recevoir de résultat
+            if not future.set_running_or_notify_cancel():
+                return
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        except Exception as e:
+            # Un Future en erreur ne doit pas priver les autres requêtes du lot de leur réponse
+            logger.warning(f"⚠️ Could not deliver a batched prediction: {e}")
+
+    def stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self._stats)
+            pending = sum(len(batch.futures) for batch in self._pending.values())
+        return {
+            'enabled': PREDICT_BATCHING,
+            'window_ms': self.window * 1000,
+            'max_rows': self.max_rows,
+            'pending': pending,
+            'avg_batch_requests': round(stats['batched_requests'] / stats['batches'], 2) if stats['batches'] else 0.0,
+            **stats
+        }
+
+
+prediction_batcher = PredictionBatcher()
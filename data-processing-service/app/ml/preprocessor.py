@@ -1,12 +1,97 @@
 import joblib
 import json
+import math
 import pandas as pd
 import numpy as np
 import logging
 import os
+from typing import Dict, List, Optional
+from sklearn.preprocessing import StandardScaler
 
 logger = logging.getLogger(__name__)
 
+# Valeur donnée aux catégories manquantes à l'entraînement (voir MLTrainer.prepare_data)
+MISSING_CATEGORY = '_MISSING_'
+
+
+def _category(value) -> str:
+    """Category key of a raw value, as pandas fillna('_MISSING_').astype(str) gives it"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return MISSING_CATEGORY
+    return str(value)
+
+
+class PreprocessingPlan:
+    """
+    Saved transformations compiled into flat NumPy operations for inference
+
+    Each categorical column gets a dict from category to code. Unknown
+    categories go to an explicit bucket: the first class, as
+    DataPreprocessor.transform does. The scaler becomes one fused
+    `x * scale + shift` over all features, with identity entries for the
+    categorical columns. A single row is transformed in microseconds,
+    without building a DataFrame.
+    """
+
+    def __init__(self, feature_columns: List[str], lookups: Dict[str, Dict[str, int]] = None,
+                 unknown_codes: Dict[str, int] = None, scale: np.ndarray = None, shift: np.ndarray = None):
+        self.feature_columns = list(feature_columns)
+        lookups = lookups or {}
+        unknown_codes = unknown_codes or {}
+        self._lookups: List[Optional[Dict[str, int]]] = [lookups.get(col) for col in self.feature_columns]
+        self._unknown = [unknown_codes.get(col, 0) for col in self.feature_columns]
+        n_features = len(self.feature_columns)
+        self.scale = np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+        self.shift = np.zeros(n_features) if shift is None else np.asarray(shift, dtype=np.float64)
+        self._affine = bool(np.any(self.scale != 1) or np.any(self.shift != 0))
+        self._categorical = any(lookup is not None for lookup in self._lookups)
+
+    @classmethod
+    def identity(cls, feature_columns: List[str]) -> 'PreprocessingPlan':
+        """Plan of a model trained without saved transformations (raw numerical features)"""
+        return cls(feature_columns)
+
+    def _column(self, j: int, values: list) -> np.ndarray:
+        lookup = self._lookups[j]
+        if lookup is None:
+            # None -> NaN, comme pandas
+            return np.array(values, dtype=np.float64)
+
+        codes = np.array([lookup.get(_category(value), -1) for value in values], dtype=np.float64)
+        unknown = codes < 0
+        if unknown.any():
+            logger.warning(f"⚠️  Column '{self.feature_columns[j]}' has {int(unknown.sum())} unknown values")
+            codes[unknown] = self._unknown[j]
+        return codes
+
+    def _finish(self, X: np.ndarray) -> np.ndarray:
+        if self._affine:
+            X *= self.scale
+            X += self.shift
+        return X
+
+    def transform_records(self, records: List[Dict]) -> np.ndarray:
+        """Transform rows given as dicts (missing keys count as missing values)"""
+        X = np.empty((len(records), len(self.feature_columns)), dtype=np.float64)
+        for j, col in enumerate(self.feature_columns):
+            X[:, j] = self._column(j, [record.get(col) for record in records])
+        return self._finish(X)
+
+    def transform_array(self, values: np.ndarray) -> np.ndarray:
+        """Transform a raw 2-D array whose columns are the features in order"""
+        values = np.asarray(values, dtype=object if self._categorical else np.float64)
+        if values.ndim == 1:
+            values = values.reshape(1, -1)
+        if values.shape[1] != len(self.feature_columns):
+            raise ValueError(f"Expected {len(self.feature_columns)} features, got {values.shape[1]}")
+        if not self._categorical:
+            return self._finish(values.astype(np.float64, copy=True))
+
+        X = np.empty(values.shape, dtype=np.float64)
+        for j in range(values.shape[1]):
+            X[:, j] = self._column(j, values[:, j].tolist())
+        return self._finish(X)
+
 class DataPreprocessor:
     """Apply saved transformations to new data"""
     
@@ -77,4 +162,37 @@ class DataPreprocessor:
             logger.info(f"  ✅ Normalized")
         
         logger.info(f"✅ Transformation completed")
-        return df
\ No newline at end of file
+        return df
+    
+    def compile(self) -> Optional[PreprocessingPlan]:
+        """
+        Compile the transformations into a PreprocessingPlan
+
+        Returns None when they cannot be expressed as lookups plus a fused
+        affine map (e.g. a scaler other than StandardScaler), in which case
+        `transform` must be used.
+        """
+        index = {col: j for j, col in enumerate(self.feature_columns)}
+        lookups, unknown_codes = {}, {}
+        for col in self.categorical_columns:
+            if col not in index:
+                continue
+            encoder = self.encoders.get(col)
+            if encoder is None:
+                # Colonne catégorielle sans encodeur : transform la laisse brute
+                return None
+            lookups[col] = {str(cls): code for code, cls in enumerate(encoder.classes_)}
+            unknown_codes[col] = 0
+
+        scale = np.ones(len(self.feature_columns))
+        shift = np.zeros(len(self.feature_columns))
+        if self.numerical_columns and self.scaler:
+            if type(self.scaler) is not StandardScaler or any(col not in index for col in self.numerical_columns):
+                return None
+            positions = [index[col] for col in self.numerical_columns]
+            mean = self.scaler.mean_ if self.scaler.with_mean else 0.0
+            std = self.scaler.scale_ if self.scaler.with_std else 1.0
+            scale[positions] = 1.0 / np.asarray(std, dtype=np.float64)
+            shift[positions] = -np.asarray(mean, dtype=np.float64) * scale[positions]
+
+        return PreprocessingPlan(self.feature_columns, lookups, unknown_codes, scale, shift)
@@ -0,0 +1,260 @@
+"""
+In-process registry of trained models for /predict
+
+Loading a model means one DB query, one unpickling (tens of MB for a KNN)
+and a DataPreprocessor that reads its JSON and re-loads the scaler and
+encoder pickles. The registry keeps the loaded bundle per experiment in an
+LRU within a memory budget, so a prediction only runs the model.
+
+A cached bundle is checked against the size and mtime of its files on
+every lookup. A rewritten model or transformation is reloaded. The
+experiment row is read again every MODEL_REGISTRY_REVALIDATE_SECONDS, so a
+deleted experiment stops being served.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+
+from ..db import get_db_connection
+from .preprocessor import DataPreprocessor, PreprocessingPlan
+
+logger = logging.getLogger(__name__)
+
+
+# Budget mémoire des modèles chargés (0 désactive le registre)
+MODEL_REGISTRY_MAX_MB = int(os.getenv('MODEL_REGISTRY_MAX_MB', '1024'))
+MODEL_REGISTRY_REVALIDATE_SECONDS = float(os.getenv('MODEL_REGISTRY_REVALIDATE_SECONDS', '60'))
+
+
+@dataclass
+class ModelBundle:
+    """Loaded model of an experiment and what is needed to feed it"""
+    experiment_id: int
+    algorithm: str
+    model_path: str
+    feature_columns: List[str]
+    transformations_path: Optional[str]
+    model: Any
+    preprocessor: Optional[DataPreprocessor]
+    # Transformations compilées (None : passer par preprocessor.transform)
+    plan: Optional[PreprocessingPlan] = None
+    # (chemin, taille, mtime_ns) du modèle et des fichiers de transformations
+    signature: Tuple = ()
+    # Taille mémoire estimée par celle des pickles
+    nbytes: int = 0
+    checked_at: float = field(default_factory=time.monotonic)
+
+
+def _file_signature(path: Optional[str]) -> Optional[Tuple]:
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return path, None, None
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+def _transformation_files(transformations_path: Optional[str]) -> List[str]:
+    """Transformation JSON and the scaler / encoders pickles it points to"""
+    if not transformations_path or not os.path.exists(transformations_path):
+        return []
+    with open(transformations_path, 'r') as f:
+        config = json.load(f)
+    return [transformations_path] + [config[key] for key in ('scaler_path', 'encoders_path') if config.get(key)]
+
+
+def _signature(model_path: str, files: List[str]) -> Tuple:
+    return tuple(_file_signature(path) for path in [model_path] + files)
+
+
+def _fetch_experiment(experiment_id: int) -> Dict:
+    db = get_db_connection()
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            SELECT model_path, feature_columns, algorithm, transformations_path
+            FROM ml_experiments
+            WHERE id = %s AND status = 'completed'
+        """, (experiment_id,))
+        result = cursor.fetchone()
+    finally:
+        cursor.close()
+        db.close()
+
+    if not result:
+        raise LookupError("Experiment not found")
+    return {
+        'model_path': result[0],
+        'feature_columns': result[1] if isinstance(result[1], list) else json.loads(result[1]),
+        'algorithm': result[2],
+        'transformations_path': result[3]
+    }
+
+
+class ModelRegistry:
+    """Process-wide LRU of loaded models, bounded by the size of their pickles"""
+
+    def __init__(self, max_bytes: int, revalidate_seconds: float = MODEL_REGISTRY_REVALIDATE_SECONDS):
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[int, ModelBundle]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Un verrou par expérience : un modèle demandé par N requêtes n'est chargé qu'une fois
+        self._load_locks: Dict[int, threading.Lock] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _fresh(self, bundle: ModelBundle) -> bool:
+        if time.monotonic() - bundle.checked_at > self.revalidate_seconds:
+            return False
+        return all(entry == _file_signature(entry[0]) for entry in bundle.signature)
+
+    def _cached(self, experiment_id: int) -> Optional[ModelBundle]:
+        with self._lock:
+            bundle = self._entries.get(experiment_id)
+        if bundle is not None and self._fresh(bundle):
+            with self._lock:
+                if experiment_id in self._entries:
+                    self._entries.move_to_end(experiment_id)
+                self.hits += 1
+            return bundle
+        return None
+
+    def get(self, experiment_id: int) -> ModelBundle:
+        """
+        Return the loaded model of a completed experiment
+
+        Raises LookupError if the experiment is not completed or its model
+        file is missing.
+        """
+        bundle = self._cached(experiment_id)
+        if bundle is not None:
+            return bundle
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(experiment_id, threading.Lock())
+
+        with load_lock:
+            # Chargé par une autre requête pendant l'attente du verrou
+            bundle = self._cached(experiment_id)
+            if bundle is not None:
+                return bundle
+
+            with self._lock:
+                self.misses += 1
+                previous = self._entries.get(experiment_id)
+
+            experiment = _fetch_experiment(experiment_id)
+            model_path = experiment['model_path']
+            if not model_path or not os.path.exists(model_path):
+                self.invalidate(experiment_id)
+                raise LookupError("Model file not found")
+
+            files = _transformation_files(experiment['transformations_path'])
+            signature = _signature(model_path, files)
+
+            # Ligne relue mais fichiers inchangés : pas de rechargement
+            if (previous is not None and previous.signature == signature
+                    and previous.feature_columns == experiment['feature_columns']):
+                previous.checked_at = time.monotonic()
+                return previous
+
+            bundle = self._load(experiment_id, experiment, signature)
+            if previous is not None:
+                self.reloads += 1
+            self._put(bundle)
+            return bundle
+
+    @staticmethod
+    def _load(experiment_id: int, experiment: Dict, signature: Tuple) -> ModelBundle:
+        started = time.perf_counter()
+        model = joblib.load(experiment['model_path'])
+
+        preprocessor = None
+        transformations_path = experiment['transformations_path']
+        if transformations_path and os.path.exists(transformations_path):
+            preprocessor = DataPreprocessor(transformations_path)
+            plan = preprocessor.compile()
+        else:
+            plan = PreprocessingPlan.identity(experiment['feature_columns'])
+
+        nbytes = sum(size for _, size, _ in signature if size)
+        logger.info(f"📇 Loaded model of experiment {experiment_id} ({nbytes / 1e6:.1f} MB) "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return ModelBundle(
+            experiment_id=experiment_id,
+            algorithm=experiment['algorithm'],
+            model_path=experiment['model_path'],
+            feature_columns=experiment['feature_columns'],
+            transformations_path=transformations_path,
+            model=model,
+            preprocessor=preprocessor,
+            plan=plan,
+            signature=signature,
+            nbytes=nbytes
+        )
+
+    def _put(self, bundle: ModelBundle) -> None:
+        if not self.enabled:
+            return
+        if bundle.nbytes > self.max_bytes:
+            logger.info(f"Model of experiment {bundle.experiment_id} ({bundle.nbytes / 1e6:.1f} MB) "
+                        f"exceeds the model registry budget")
+            return
+
+        with self._lock:
+            if bundle.experiment_id in self._entries:
+                self._discard(bundle.experiment_id)
+            self._entries[bundle.experiment_id] = bundle
+            self.current_bytes += bundle.nbytes
+
+            while self.current_bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, experiment_id: int) -> None:
+        bundle = self._entries.pop(experiment_id)
+        self.current_bytes -= bundle.nbytes
+
+    def invalidate(self, experiment_id: int) -> None:
+        with self._lock:
+            if experiment_id in self._entries:
+                self._discard(experiment_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'models': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+model_registry = ModelRegistry(MODEL_REGISTRY_MAX_MB * 1024 * 1024)
@@ -0,0 +1,358 @@
+"""
+Hyperparameter search over the ranges of an algorithm
+
+A search is one parent experiment (ml_experiments.search_config set) that
+goes through the training queue like any experiment. The worker that claims
+it runs `run_search`:
+- the dataset is loaded, encoded and split once; a validation split is
+  carved out of the training set to rank the candidates, the test split is
+  only used to evaluate the final model;
+- candidate hyperparameters come from the algorithm's get_param_ranges(),
+  optionally narrowed by the search config, and are chosen by grid,
+  random sampling, or successive halving;
+- candidates are trained and scored in parallel (joblib processes, the
+  arrays are shared, not copied per candidate);
+- the best candidate is refitted on the whole training set, evaluated on
+  the test split and saved as the model of the parent.
+Each candidate is recorded by the worker as a child row (parent_id) with
+its hyperparameters and metrics.
+
+Successive halving trains every candidate on a small part of the training
+set. It keeps the best 1/factor of them at each rung and gives them
+`factor` times more rows, until the last rung trains on the full set.
+"""
+import logging
+import math
+import os
+import time
+from itertools import product
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.model_selection import train_test_split
+
+from .algorithms import (
+    KNNAlgorithm, DecisionTreeAlgorithm, C45Algorithm, CHAIDAlgorithm,
+    NaiveBayesAlgorithm, NeuralNetworkAlgorithm
+)
+from .algorithms.linear_regression import LinearRegressionAlgorithm
+from .trainer import MLTrainer
+
+logger = logging.getLogger(__name__)
+
+
+# Processus évaluant les candidats (0 : les CPU partagés entre les entraînements
+# simultanés du worker, chaque recherche tournant déjà dans un de ses processus)
+SEARCH_WORKERS = (int(os.getenv('SEARCH_WORKERS', '0'))
+                  or max(1, (os.cpu_count() or 1) // max(1, int(os.getenv('TRAINING_WORKERS', '2')))))
+# Part de l'ensemble d'entraînement réservée au classement des candidats
+SEARCH_VALIDATION_SIZE = float(os.getenv('SEARCH_VALIDATION_SIZE', '0.2'))
+# Nombre maximal de candidats d'une recherche (une grille plus grande est refusée)
+SEARCH_MAX_CANDIDATES = int(os.getenv('SEARCH_MAX_CANDIDATES', '200'))
+# Lignes d'entraînement minimales d'un palier de successive halving
+SEARCH_HALVING_MIN_ROWS = int(os.getenv('SEARCH_HALVING_MIN_ROWS', '100'))
+
+ALGORITHMS = {
+    'knn': KNNAlgorithm,
+    'decision_tree': DecisionTreeAlgorithm,
+    'c45': C45Algorithm,
+    'chaid': CHAIDAlgorithm,
+    'naive_bayes': NaiveBayesAlgorithm,
+    'neural_network': NeuralNetworkAlgorithm,
+    'linear_regression': LinearRegressionAlgorithm
+}
+STRATEGIES = ('grid', 'random', 'halving')
+CLASSIFICATION_METRICS = {'accuracy', 'precision', 'recall', 'f1_score', 'auc'}
+REGRESSION_METRICS = {'mse', 'rmse', 'mae', 'r2_score'}
+# Métriques à minimiser (les autres sont maximisées)
+LOWER_IS_BETTER = {'mse', 'rmse', 'mae'}
+
+
+def _is_regression(algorithm: str) -> bool:
+    return algorithm in ['linear_regression']
+
+
+def search_space(algorithm: str, fixed: Dict, overrides: Dict) -> Dict[str, Dict]:
+    """
+    Searched parameters of an algorithm and their range
+
+    `overrides` narrows a parameter: a list of values, {min, max}, or one
+    value. Parameters given in the experiment's hyperparameters (`fixed`)
+    are not searched, nor are free-text ones (hidden_layers...) unless
+    values are listed for them.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unsupported algorithm: {algorithm}")
+    ranges = ALGORITHMS[algorithm].get_param_ranges()
+
+    unknown = set(overrides) - set(ranges)
+    if unknown:
+        raise ValueError(f"Unknown parameters for {algorithm}: {sorted(unknown)}")
+
+    space = {}
+    for name, spec in ranges.items():
+        override = overrides.get(name)
+        if isinstance(override, list):
+            if not override:
+                raise ValueError(f"No values given for parameter '{name}'")
+            space[name] = {'type': 'select', 'options': override}
+        elif isinstance(override, dict):
+            space[name] = {**spec, **override}
+        elif name in overrides:
+            space[name] = {'type': 'select', 'options': [override]}
+        elif name not in fixed and spec['type'] in ('int', 'float', 'select', 'boolean'):
+            space[name] = spec
+
+    for name, spec in space.items():
+        if spec['type'] in ('int', 'float') and spec['min'] > spec['max']:
+            raise ValueError(f"Invalid range for parameter '{name}': {spec['min']} > {spec['max']}")
+    return space
+
+
+def _log_scale(spec: Dict) -> bool:
+    # Plages sur plusieurs ordres de grandeur (alpha, var_smoothing...) : échelle log
+    return spec['min'] > 0 and spec['max'] / spec['min'] >= 100
+
+
+def _grid_values(spec: Dict, points: int) -> List[Any]:
+    kind = spec['type']
+    if kind == 'select':
+        return list(spec['options'])
+    if kind == 'boolean':
+        return [True, False]
+    if kind == 'int':
+        low, high = int(spec['min']), int(spec['max'])
+        if high - low + 1 <= points:
+            return list(range(low, high + 1))
+        return sorted({int(round(value)) for value in np.linspace(low, high, points)})
+    values = (np.geomspace if _log_scale(spec) else np.linspace)(spec['min'], spec['max'], points)
+    return [float(value) for value in values]
+
+
+def _sample_value(spec: Dict, rng: np.random.Generator) -> Any:
+    kind = spec['type']
+    if kind == 'select':
+        return spec['options'][int(rng.integers(len(spec['options'])))]
+    if kind == 'boolean':
+        return bool(rng.integers(2))
+    if kind == 'int':
+        return int(rng.integers(int(spec['min']), int(spec['max']) + 1))
+    if _log_scale(spec):
+        return float(np.exp(rng.uniform(np.log(spec['min']), np.log(spec['max']))))
+    return float(rng.uniform(spec['min'], spec['max']))
+
+
+def generate_candidates(algorithm: str, hyperparameters: Dict, search_config: Dict,
+                        random_seed: int = 42) -> List[Dict]:
+    """Hyperparameters of every candidate (the experiment's own hyperparameters are kept fixed)"""
+    strategy = search_config.get('strategy', 'random')
+    _score_metric(algorithm, search_config)
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown search strategy: {strategy} (expected one of {', '.join(STRATEGIES)})")
+    space = search_space(algorithm, hyperparameters, search_config.get('params') or {})
+    names = sorted(space)
+
+    if strategy == 'grid':
+        points = max(2, int(search_config.get('grid_points', 5)))
+        grid = [_grid_values(space[name], points) for name in names]
+        size = math.prod(len(values) for values in grid)
+        if size > SEARCH_MAX_CANDIDATES:
+            raise ValueError(f"Grid of {size} candidates exceeds the limit of {SEARCH_MAX_CANDIDATES}, "
+                             f"lower grid_points or list fewer values")
+        combinations = [dict(zip(names, values)) for values in product(*grid)]
+    else:
+        n_candidates = int(search_config.get('n_candidates', 20))
+        if not 1 <= n_candidates <= SEARCH_MAX_CANDIDATES:
+            raise ValueError(f"n_candidates must be between 1 and {SEARCH_MAX_CANDIDATES}")
+        rng = np.random.default_rng(random_seed)
+        combinations, seen = [], set()
+        # Tirages sans doublon (un espace discret peut être plus petit que n_candidates)
+        for _ in range(n_candidates * 20):
+            if len(combinations) == n_candidates:
+                break
+            candidate = {name: _sample_value(space[name], rng) for name in names}
+            key = tuple(repr(candidate[name]) for name in names)
+            if key not in seen:
+                seen.add(key)
+                combinations.append(candidate)
+
+    return [{**hyperparameters, **candidate} for candidate in combinations]
+
+
+def _score_metric(algorithm: str, search_config: Dict) -> Tuple[str, bool]:
+    metric = search_config.get('metric') or ('r2_score' if _is_regression(algorithm) else 'accuracy')
+    allowed = REGRESSION_METRICS if _is_regression(algorithm) else CLASSIFICATION_METRICS
+    if metric not in allowed:
+        raise ValueError(f"Unknown metric for {algorithm}: {metric} (expected one of {', '.join(sorted(allowed))})")
+    return metric, metric not in LOWER_IS_BETTER
+
+
+def _evaluate_candidate(algorithm: str, hyperparameters: Dict, X_train: np.ndarray, y_train: np.ndarray,
+                        X_test: np.ndarray, y_test: np.ndarray, n_rows: Optional[int] = None) -> Dict:
+    """Train one candidate (on the first n_rows training rows) and score it on the validation split"""
+    trainer = MLTrainer(None, {'algorithm': algorithm, 'hyperparameters': hyperparameters})
+    try:
+        trainer.create_model()
+        training_time = trainer.train(X_train[:n_rows], y_train[:n_rows])
+        if _is_regression(algorithm):
+            results = trainer.evaluate_regression(X_test, y_test)
+        else:
+            results = trainer.evaluate(X_test, y_test)
+    except Exception as e:
+        return {'status': 'failed', 'error_message': str(e)}
+    return {
+        'status': 'completed',
+        'metrics': results['metrics'],
+        'confusion_matrix': results.get('confusion_matrix'),
+        'roc_data': results.get('roc_data'),
+        'training_time': training_time
+    }
+
+
+class _Evaluator:
+    """Scores candidates in parallel on the shared fit/validation split"""
+
+    def __init__(self, algorithm: str, data: Tuple[np.ndarray, ...], metric: str, higher_is_better: bool,
+                 workers: int = SEARCH_WORKERS):
+        self.algorithm = algorithm
+        self.data = data
+        self.metric = metric
+        self.higher_is_better = higher_is_better
+        self.workers = workers
+
+    def score(self, result: Dict) -> Optional[float]:
+        value = (result.get('metrics') or {}).get(self.metric) if result['status'] == 'completed' else None
+        if value is None or not np.isfinite(value):
+            return None
+        return float(value) if self.higher_is_better else -float(value)
+
+    def __call__(self, candidates: List[Dict], n_rows: Optional[int] = None) -> List[Dict]:
+        jobs = (delayed(_evaluate_candidate)(self.algorithm, candidate, *self.data, n_rows)
+                for candidate in candidates)
+        # Processus loky : les tableaux volumineux sont partagés en mémoire mappée
+        results = Parallel(n_jobs=min(self.workers, len(candidates)))(jobs)
+        for result in results:
+            result['score'] = self.score(result)
+            result['train_rows'] = n_rows or len(self.data[0])
+        return results
+
+    def ranked(self, indices: List[int], results: List[Dict]) -> List[int]:
+        scored = [i for i in indices if results[i]['score'] is not None]
+        return sorted(scored, key=lambda i: results[i]['score'], reverse=True)
+
+
+def _successive_halving(evaluate: _Evaluator, candidates: List[Dict], factor: int) -> List[Dict]:
+    n_train = len(evaluate.data[0])
+    rungs = math.ceil(math.log(len(candidates), factor)) if len(candidates) > 1 else 0
+    min_rows = min(n_train, SEARCH_HALVING_MIN_ROWS)
+
+    results: List[Optional[Dict]] = [None] * len(candidates)
+    alive = list(range(len(candidates)))
+    for rung in range(rungs + 1):
+        n_rows = n_train if rung == rungs else max(min_rows, int(n_train * factor ** (rung - rungs)))
+        for i, result in zip(alive, evaluate([candidates[i] for i in alive], n_rows)):
+            result['rung'] = rung
+            results[i] = result
+        ranked = evaluate.ranked(alive, results)
+        logger.info(f"🔎 Rung {rung}: {len(alive)} candidates on {n_rows} rows, "
+                    f"best {evaluate.metric}={results[ranked[0]]['metrics'][evaluate.metric] if ranked else None}")
+        if rung == rungs or not ranked:
+            break
+        alive = ranked[:max(1, len(alive) // factor)]
+    return results
+
+
+def _validation_split(trainer: MLTrainer, X_train: np.ndarray, y_train: np.ndarray,
+                      regression: bool, random_seed: int) -> Tuple[np.ndarray, ...]:
+    """(X_fit, y_fit, X_val, y_val): the candidates never see the test split"""
+    stratify = None if regression or not trainer._can_stratify(y_train) else y_train
+    try:
+        X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=SEARCH_VALIDATION_SIZE,
+                                                      random_state=random_seed, stratify=stratify)
+    except ValueError as e:
+        logger.warning(f"Stratify échoué: {str(e)}. Split de validation non stratifié utilisé.")
+        X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=SEARCH_VALIDATION_SIZE,
+                                                      random_state=random_seed)
+    return X_fit, y_fit, X_val, y_val
+
+
+def run_search(dataset_path: str, config: Dict, search_config: Dict, experiment_id: int, project_id: int) -> Dict:
+    """Search of a parent experiment (module function: runs in the training process pool)"""
+    try:
+        started = time.perf_counter()
+        algorithm = config['algorithm']
+        candidates = generate_candidates(algorithm, config.get('hyperparameters') or {}, search_config,
+                                         config.get('random_seed', 42))
+        metric, higher_is_better = _score_metric(algorithm, search_config)
+
+        # Chargement, encodage et split une seule fois pour tous les candidats
+        trainer = MLTrainer(dataset_path, config)
+        X_train, X_test, y_train, y_test = trainer.prepare_data(trainer.load_data())
+
+        # Classement sur une validation tirée de l'entraînement : le score du test reste non biaisé
+        validation = _validation_split(trainer, X_train, y_train, _is_regression(algorithm),
+                                       config.get('random_seed', 42))
+        evaluate = _Evaluator(algorithm, validation, metric, higher_is_better)
+        strategy = search_config.get('strategy', 'random')
+        logger.info(f"🔎 {strategy} search of experiment {experiment_id}: {len(candidates)} candidates, "
+                    f"{evaluate.workers} processes, metric {metric}")
+        if strategy == 'halving':
+            results = _successive_halving(evaluate, candidates, max(2, int(search_config.get('halving_factor', 3))))
+        else:
+            results = evaluate(candidates)
+
+        # Candidats du dernier palier d'abord (successive halving), puis par score
+        ranked = sorted(evaluate.ranked(list(range(len(candidates))), results),
+                        key=lambda i: (results[i].get('rung', 0), results[i]['score']), reverse=True)
+        if not ranked:
+            errors = {result.get('error_message') for result in results if result.get('error_message')}
+            raise ValueError(f"No candidate could be evaluated: {'; '.join(sorted(errors)) or metric + ' unavailable'}")
+        best = ranked[0]
+
+        # Le meilleur candidat devient le modèle de l'expérience parente
+        trainer.config = {**config, 'hyperparameters': candidates[best]}
+        trainer.create_model()
+        training_time = trainer.train(X_train, y_train)
+        if _is_regression(algorithm):
+            final = trainer.evaluate_regression(X_test, y_test)
+        else:
+            final = trainer.evaluate(X_test, y_test)
+
+        for rank, i in enumerate(ranked, start=1):
+            results[i]['rank'] = rank
+        elapsed = time.perf_counter() - started
+        logger.info(f"✅ Search of experiment {experiment_id}: best {metric}={results[best]['metrics'][metric]} "
+                    f"with {candidates[best]} ({len(candidates)} candidates in {elapsed:.1f}s)")
+
+        return {
+            'status': 'completed',
+            'hyperparameters': candidates[best],
+            'metrics': final['metrics'],
+            'confusion_matrix': final.get('confusion_matrix'),
+            'roc_data': final.get('roc_data'),
+            'residuals': final.get('residuals'),
+            'predictions': final.get('predictions'),
+            'training_time': training_time,
+            'model_path': trainer.save_model(experiment_id, project_id),
+            'transformations_path': trainer.save_transformations(experiment_id, project_id),
+            'candidates': [{'hyperparameters': candidate, **result} for candidate, result in zip(candidates, results)],
+            'search': {
+                'strategy': strategy,
+                'metric': metric,
+                'candidates': len(candidates),
+                'failed': sum(result['status'] == 'failed' for result in results),
+                'best_score': results[best]['metrics'][metric],
+                'validation_rows': len(validation[2]),
+                'elapsed': elapsed
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Erreur recherche d'hyperparamètres: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {
+            'status': 'failed',
+            'error_message': str(e)
+        }
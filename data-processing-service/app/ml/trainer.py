@@ -12,6 +12,7 @@ import json
 from datetime import datetime
 from typing import Dict, Tuple
 import logging
+from ..processors import CSVProcessor, JSONProcessor, VersionProcessor
 
 logger = logging.getLogger(__name__)
 
@@ -35,11 +36,13 @@ class MLTrainer:
     def load_data(self) -> pd.DataFrame:
         """Charge le dataset"""
         try:
-            # Détecter le format
-            if self.dataset_path.endswith('.csv'):
-                df = pd.read_csv(self.dataset_path)
-            elif self.dataset_path.endswith('.json'):
-                df = pd.read_json(self.dataset_path)
+            # Détecter le format (lecture via le sidecar colonnaire des processors)
+            if VersionProcessor.is_version(self.dataset_path):
+                df = VersionProcessor.read(self.dataset_path)
+            elif self.dataset_path.endswith('.csv'):
+                df = CSVProcessor.read(self.dataset_path)
+            elif self.dataset_path.endswith(('.json', '.ndjson', '.jsonl')):
+                df = JSONProcessor.read(self.dataset_path)
             else:
                 raise ValueError(f"Format non supporté: {self.dataset_path}")
             
@@ -277,8 +280,12 @@ class MLTrainer:
     def evaluate(self, X_test: np.ndarray, y_test: np.ndarray) -> Dict:
         """Évalue le modèle de classification et calcule les métriques"""
         
-        # Prédictions
-        y_pred = self.model.predict(X_test)
+        # Prédictions (CHAID : classes et probabilités en un seul passage)
+        y_proba = None
+        if hasattr(self.model, 'predict_with_proba'):
+            y_pred, y_proba = self.model.predict_with_proba(X_test)
+        else:
+            y_pred = self.model.predict(X_test)
         
         # Accuracy
         accuracy = accuracy_score(y_test, y_pred)
@@ -302,7 +309,8 @@ class MLTrainer:
         roc_data = None
         if hasattr(self.model, 'predict_proba'):
             try:
-                y_proba = self.model.predict_proba(X_test)
+                if y_proba is None:
+                    y_proba = self.model.predict_proba(X_test)
                 unique_classes = np.unique(y_test)
                 
                 if len(unique_classes) == 2:
@@ -439,4 +447,9 @@ class MLTrainer:
             return {
                 'status': 'failed',
                 'error_message': str(e)
-            }
\ No newline at end of file
+            }
+
+
+def run_training(dataset_path: str, config: Dict, experiment_id: int, project_id: int) -> Dict:
+    """Entraînement complet d'une expérience (fonction de module : exécutée dans le pool de processus)"""
+    return MLTrainer(dataset_path, config).run(experiment_id, project_id)
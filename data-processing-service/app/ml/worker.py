@@ -0,0 +1,419 @@
+"""
+Durable training queue on the ml_experiments table
+
+/train only marks the experiment as queued (status 'pending' with a
+queued_at date), so a queued job survives restarts. Workers claim jobs with
+SELECT ... FOR UPDATE SKIP LOCKED and run them in their own process pool.
+A worker can be embedded in the API or run as a separate container
+(`python -m app.ml.worker`). Several workers, on one node or many, never
+claim the same job.
+
+A running job is kept alive by a heartbeat. A job whose worker died (no
+heartbeat for TRAINING_STALE_SECONDS) is queued again, up to
+TRAINING_MAX_ATTEMPTS attempts.
+
+An experiment with a search_config is a hyperparameter search (see
+ml.search). Its candidates are recorded as child rows when it completes.
+"""
+import json
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from ..db import get_db_connection
+from .search import run_search
+from .trainer import run_training
+
+logger = logging.getLogger(__name__)
+
+
+# Entraînements menés en parallèle par un worker (un processus chacun)
+TRAINING_WORKERS = int(os.getenv('TRAINING_WORKERS', '2'))
+TRAINING_POLL_SECONDS = float(os.getenv('TRAINING_POLL_SECONDS', '2'))
+TRAINING_HEARTBEAT_SECONDS = float(os.getenv('TRAINING_HEARTBEAT_SECONDS', '15'))
+TRAINING_STALE_SECONDS = float(os.getenv('TRAINING_STALE_SECONDS', '120'))
+TRAINING_MAX_ATTEMPTS = int(os.getenv('TRAINING_MAX_ATTEMPTS', '3'))
+# false quand les entraînements tournent dans un conteneur worker séparé
+TRAINING_WORKER_EMBEDDED = os.getenv('TRAINING_WORKER_EMBEDDED', 'true').lower() == 'true'
+
+
+def enqueue(cursor, experiment_id: int) -> None:
+    """Queue an experiment for training (committed by the caller)"""
+    cursor.execute("""
+        UPDATE ml_experiments
+        SET status = 'pending',
+            queued_at = NOW(),
+            started_at = NULL,
+            heartbeat_at = NULL,
+            worker_id = NULL,
+            attempts = 0,
+            error_message = NULL
+        WHERE id = %s
+    """, (experiment_id,))
+
+
+def queue_stats() -> Dict:
+    """Queued and running jobs, per worker"""
+    db = get_db_connection()
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            SELECT status, worker_id, COUNT(*), MIN(queued_at)
+            FROM ml_experiments
+            WHERE queued_at IS NOT NULL AND status IN ('pending', 'training')
+            GROUP BY status, worker_id
+        """)
+        stats = {'queued': 0, 'training': 0, 'oldest_queued_at': None, 'workers': {}}
+        for status, worker_id, count, oldest in cursor.fetchall():
+            if status == 'pending':
+                stats['queued'] += count
+                stats['oldest_queued_at'] = oldest
+            else:
+                stats['training'] += count
+                stats['workers'][worker_id] = count
+        return stats
+    finally:
+        cursor.close()
+        db.close()
+
+
+def _clean_for_json(obj):
+    """Remplace Infinity et NaN par None pour le JSON"""
+    if isinstance(obj, dict):
+        return {k: _clean_for_json(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_clean_for_json(item) for item in obj]
+    if isinstance(obj, float) and (math.isinf(obj) or math.isnan(obj)):
+        return None
+    return obj
+
+
+def _dumps(obj) -> Optional[str]:
+    obj = _clean_for_json(obj)
+    return json.dumps(obj) if obj else None
+
+
+class TrainingWorker:
+    """Claims queued experiments and trains them in a process pool"""
+
+    def __init__(self, workers: int = TRAINING_WORKERS, poll_seconds: float = TRAINING_POLL_SECONDS,
+                 worker_id: str = None):
+        self.workers = max(1, workers)
+        self.poll_seconds = poll_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._running: Dict[int, Future] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_heartbeat = 0.0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # 'spawn' : pas de fork d'un serveur qui a déjà des threads
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    # ---------- Boucle ----------
+
+    def start(self) -> None:
+        """Run the worker loop in a background thread (worker embedded in the API)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name='training-worker', daemon=True)
+            self._thread.start()
+
+    def wake(self) -> None:
+        """Look for queued jobs now instead of at the next poll"""
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        if self._pool is not None:
+            # Les jobs en cours sont abandonnés : sans heartbeat, ils seront repris
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def run_forever(self) -> None:
+        logger.info(f"⚙️ Training worker {self.worker_id} started ({self.workers} processes)")
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"❌ Training worker error: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def tick(self) -> None:
+        """One pass: record finished jobs, heartbeat, requeue stale jobs, claim new ones"""
+        for experiment_id, future in list(self._running.items()):
+            if future.done():
+                del self._running[experiment_id]
+                self._finish(experiment_id, future)
+
+        now = time.monotonic()
+        if now - self._last_heartbeat >= TRAINING_HEARTBEAT_SECONDS:
+            self._heartbeat()
+            self._requeue_stale()
+            self._last_heartbeat = now
+
+        free = self.workers - len(self._running)
+        if free > 0 and not self._stop.is_set():
+            for job in self._claim(free):
+                self._submit(job)
+
+    def stats(self) -> Dict:
+        return {
+            'worker_id': self.worker_id,
+            'processes': self.workers,
+            'running': sorted(self._running.copy())
+        }
+
+    # ---------- Base de données ----------
+
+    def _claim(self, limit: int) -> List[Dict]:
+        db = get_db_connection()
+        cursor = db.cursor()
+        try:
+            cursor.execute("""
+                UPDATE ml_experiments e
+                SET status = 'training',
+                    started_at = NOW(),
+                    heartbeat_at = NOW(),
+                    worker_id = %s,
+                    attempts = e.attempts + 1
+                FROM (
+                    SELECT id FROM ml_experiments
+                    WHERE status = 'pending' AND queued_at IS NOT NULL
+                    ORDER BY queued_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) next_job
+                WHERE e.id = next_job.id
+                RETURNING e.id, e.project_id, e.algorithm, e.hyperparameters, e.target_column,
+                          e.feature_columns, e.train_ratio, e.random_seed,
+                          (SELECT file_path FROM datasets d WHERE d.id = e.dataset_id),
+                          e.search_config
+            """, (self.worker_id, limit))
+            rows = cursor.fetchall()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            cursor.close()
+            db.close()
+
+        jobs = []
+        for row in rows:
+            jobs.append({
+                'experiment_id': row[0],
+                'project_id': row[1],
+                'dataset_path': row[8],
+                'search_config': row[9] if isinstance(row[9], dict) or row[9] is None else json.loads(row[9]),
+                'config': {
+                    'algorithm': row[2],
+                    'hyperparameters': row[3] if isinstance(row[3], dict) else json.loads(row[3]) if row[3] else {},
+                    'target_column': row[4],
+                    'feature_columns': row[5] if isinstance(row[5], list) else json.loads(row[5]),
+                    'train_ratio': float(row[6]),
+                    'random_seed': int(row[7])
+                }
+            })
+        return jobs
+
+    def _submit(self, job: Dict) -> None:
+        experiment_id = job['experiment_id']
+        logger.info(f"⚙️ Training experiment {experiment_id} on worker {self.worker_id}")
+        try:
+            if job.get('search_config'):
+                future = self._get_pool().submit(run_search, job['dataset_path'], job['config'],
+                                                 job['search_config'], experiment_id, job['project_id'])
+            else:
+                future = self._get_pool().submit(run_training, job['dataset_path'], job['config'],
+                                                 experiment_id, job['project_id'])
+        except BrokenProcessPool as e:
+            self._pool = None
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda _: self._wake.set())
+        self._running[experiment_id] = future
+
+    def _heartbeat(self) -> None:
+        if not self._running:
+            return
+        db = get_db_connection()
+        cursor = db.cursor()
+        try:
+            cursor.execute("""
+                UPDATE ml_experiments SET heartbeat_at = NOW()
+                WHERE id = ANY(%s) AND worker_id = %s AND status = 'training'
+            """, (list(self._running), self.worker_id))
+            db.commit()
+        finally:
+            cursor.close()
+            db.close()
+
+    def _requeue_stale(self) -> None:
+        """Queue again the jobs of dead workers, fail those out of attempts"""
+        db = get_db_connection()
+        cursor = db.cursor()
+        try:
+            cursor.execute("""
+                UPDATE ml_experiments
+                SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                    error_message = CASE WHEN attempts >= %s
+                                         THEN 'Training worker lost after ' || attempts || ' attempts'
+                                         ELSE error_message END,
+                    worker_id = NULL
+                WHERE status = 'training' AND queued_at IS NOT NULL
+                  AND heartbeat_at < NOW() - make_interval(secs => %s)
+                RETURNING id, status
+            """, (TRAINING_MAX_ATTEMPTS, TRAINING_MAX_ATTEMPTS, TRAINING_STALE_SECONDS))
+            for experiment_id, status in cursor.fetchall():
+                logger.warning(f"⚠️ Experiment {experiment_id} had no heartbeat, now {status}")
+            db.commit()
+        finally:
+            cursor.close()
+            db.close()
+
+    def _finish(self, experiment_id: int, future: Future) -> None:
+        """Write the result of a finished job"""
+        try:
+            results = future.result()
+        except BrokenProcessPool as e:
+            # Processus tué (mémoire...) : pool recréé, le job repart s'il lui reste des essais
+            logger.error(f"❌ Training process died on experiment {experiment_id}: {e}")
+            self._pool = None
+            results = {'status': 'retry', 'error_message': str(e)}
+        except Exception as e:
+            results = {'status': 'failed', 'error_message': str(e)}
+
+        db = get_db_connection()
+        cursor = db.cursor()
+        try:
+            if results['status'] == 'completed':
+                cursor.execute("""
+                    UPDATE ml_experiments
+                    SET status = 'completed',
+                        metrics = %s,
+                        confusion_matrix = %s,
+                        roc_data = %s,
+                        residuals = %s,
+                        predictions = %s,
+                        training_time = %s,
+                        model_path = %s,
+                        transformations_path = %s,
+                        hyperparameters = COALESCE(%s, hyperparameters),
+                        completed_at = NOW()
+                    WHERE id = %s AND worker_id = %s
+                """, (
+                    _dumps(results['metrics']),
+                    _dumps(results.get('confusion_matrix')),
+                    _dumps(results.get('roc_data')),
+                    _dumps(results.get('residuals')),
+                    _dumps(results.get('predictions')),
+                    results['training_time'],
+                    results['model_path'],
+                    results.get('transformations_path'),
+                    # Recherche : hyperparamètres du meilleur candidat
+                    _dumps(results.get('hyperparameters')),
+                    experiment_id,
+                    self.worker_id
+                ))
+                if cursor.rowcount and 'candidates' in results:
+                    self._record_candidates(cursor, experiment_id, results)
+            elif results['status'] == 'retry':
+                cursor.execute("""
+                    UPDATE ml_experiments
+                    SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                        error_message = %s,
+                        worker_id = NULL
+                    WHERE id = %s AND worker_id = %s
+                """, (TRAINING_MAX_ATTEMPTS, results['error_message'], experiment_id, self.worker_id))
+            else:
+                cursor.execute("""
+                    UPDATE ml_experiments
+                    SET status = 'failed',
+                        error_message = %s
+                    WHERE id = %s AND worker_id = %s
+                """, (results.get('error_message', 'Unknown error'), experiment_id, self.worker_id))
+            db.commit()
+            logger.info(f"Expérience {experiment_id} terminée: {results['status']}")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ Could not record result of experiment {experiment_id}: {e}")
+        finally:
+            cursor.close()
+            db.close()
+
+    @staticmethod
+    def _record_candidates(cursor, experiment_id: int, results: Dict) -> None:
+        """Candidates of a search as child rows of the parent experiment"""
+        # Relance d'une recherche : les candidats précédents sont remplacés
+        cursor.execute("DELETE FROM ml_experiments WHERE parent_id = %s", (experiment_id,))
+        for index, candidate in enumerate(results['candidates'], start=1):
+            cursor.execute("""
+                INSERT INTO ml_experiments (
+                    name, project_id, dataset_id, algorithm, hyperparameters,
+                    target_column, feature_columns, train_ratio, random_seed,
+                    status, error_message, metrics, confusion_matrix, roc_data, training_time,
+                    parent_id, search_config, created_by, completed_at
+                )
+                SELECT name || ' #' || %s, project_id, dataset_id, algorithm, %s,
+                       target_column, feature_columns, train_ratio, random_seed,
+                       %s, %s, %s, %s, %s, %s,
+                       id, %s, created_by, NOW()
+                FROM ml_experiments
+                WHERE id = %s
+            """, (
+                index,
+                _dumps(candidate['hyperparameters']) or '{}',
+                candidate['status'],
+                candidate.get('error_message'),
+                _dumps(candidate.get('metrics')),
+                _dumps(candidate.get('confusion_matrix')),
+                _dumps(candidate.get('roc_data')),
+                candidate.get('training_time'),
+                # Place du candidat dans la recherche
+                _dumps({key: candidate.get(key) for key in ('rank', 'score', 'rung', 'train_rows')}),
+                experiment_id
+            ))
+        cursor.execute("""
+            UPDATE ml_experiments SET search_config = search_config || %s::jsonb WHERE id = %s
+        """, (_dumps({'result': results['search']}), experiment_id))
+        logger.info(f"📇 Recorded {len(results['candidates'])} candidates of search {experiment_id}")
+
+
+training_worker = TrainingWorker()
+
+
+def main() -> None:
+    """Standalone worker (separate container): python -m app.ml.worker"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    signal.signal(signal.SIGTERM, lambda *_: training_worker.stop())
+    try:
+        training_worker.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        training_worker.stop()
+
+
+if __name__ == '__main__':
+    main()
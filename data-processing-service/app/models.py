@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Literal
 from enum import Enum
 from datetime import datetime
 
@@ -7,7 +7,13 @@ from datetime import datetime
 class FileFormat(str, Enum):
     CSV = "csv"
     JSON = "json"
+    NDJSON = "ndjson"
     ARFF = "arff"
+    VERSION = "version"  # version stockée en chunks de colonnes (storage.chunks)
+
+
+# Format des données tabulaires des réponses (voir utils.negotiate_format)
+ResponseFormat = Literal['records', 'columns', 'arrow']
 
 
 class DataType(str, Enum):
@@ -69,6 +75,10 @@ class ColumnInfo(BaseModel):
     
     # For categorical columns
     top_values: Optional[Dict[str, int]] = None
+    
+    # Grands datasets : quantiles / distincts estimés par sketch
+    approximate: bool = False
+    error_bounds: Optional[Dict[str, float]] = None
 
 
 class ProcessRequest(BaseModel):
@@ -76,6 +86,8 @@ class ProcessRequest(BaseModel):
     file_path: str
     file_format: FileFormat
     sample_size: Optional[int] = 100
+    # Format de preview_data (à défaut : en-tête Accept, puis 'records')
+    format: Optional[ResponseFormat] = None
 
 
 class ProcessResponse(BaseModel):
@@ -87,6 +99,7 @@ class ProcessResponse(BaseModel):
     preview_data: List[Dict[str, Any]]
     memory_usage: float
     processing_time: float
+    approximate: bool = False
     errors: Optional[List[str]] = None
 
 
@@ -95,6 +108,8 @@ class DataPreviewRequest(BaseModel):
     file_format: FileFormat
     limit: int = 100
     offset: int = 0
+    # Format de data (à défaut : en-tête Accept, puis 'records')
+    format: Optional[ResponseFormat] = None
 
 
 class DataPreviewResponse(BaseModel):
@@ -130,6 +145,18 @@ class ExperimentCreate(BaseModel):
     train_ratio: float = 0.8
     random_seed: int = 42
 
+class SearchConfig(BaseModel):
+    """Hyperparameter search of an experiment (see app/ml/search.py)"""
+    strategy: Literal['grid', 'random', 'halving'] = 'random'
+    n_candidates: int = 20          # random / halving
+    grid_points: int = 5            # valeurs par paramètre numérique (grid)
+    params: Dict[str, Any] = {}     # par paramètre : liste de valeurs, {min, max} ou valeur fixe
+    metric: Optional[str] = None    # accuracy (classification) / r2_score (régression) par défaut
+    halving_factor: int = 3
+
+class SearchCreate(ExperimentCreate):
+    search: SearchConfig = SearchConfig()
+
 class ExperimentResponse(BaseModel):
     id: int
     name: str
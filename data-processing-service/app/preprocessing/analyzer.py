@@ -0,0 +1,506 @@
+"""
+Single-pass streaming dataset profiler
+
+A dataset is fed chunk by chunk into one mergeable accumulator per column
+(counts, moments, min/max, frequency table, quantile sketch). Each chunk is
+visited once and then dropped, so profiling a file only needs memory for one
+chunk plus the accumulators, and the result is the same List[ColumnInfo]
+that CSVProcessor.analyze_dataframe used to build from a full DataFrame.
+"""
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..models import ColumnInfo, DataType
+from .sketches import APPROX_STATS_ROW_THRESHOLD, HyperLogLog, KLLSketch, hash_values
+from .stats import moments
+
+logger = logging.getLogger(__name__)
+
+
+PROFILE_CHUNK_ROWS = int(os.getenv('PROFILE_CHUNK_ROWS', '100000'))
+# Au-delà de cette taille, /process et /statistics profilent le fichier en streaming
+PROFILE_STREAMING_THRESHOLD_MB = float(os.getenv('PROFILE_STREAMING_THRESHOLD_MB', '200'))
+
+# Au-delà, la table de fréquences est remplacée par un ensemble de hash
+# (une colonne aussi variée n'est ni booléenne ni catégorielle)
+FREQUENCY_TABLE_LIMIT = 1000
+SAMPLE_VALUES_COUNT = 5
+DATETIME_PROBE_SIZE = 100
+BOOLEAN_VALUES = {0, 1, True, False, 'True', 'False', 'true', 'false'}
+
+
+def should_stream(file_path: str) -> bool:
+    """True if the file is large enough to be profiled chunk by chunk"""
+    try:
+        return os.path.getsize(file_path) >= PROFILE_STREAMING_THRESHOLD_MB * 1024 * 1024
+    except OSError:
+        return False
+
+
+def _combine_dtypes(current, new):
+    """dtype of the concatenation of two chunks of the same column"""
+    if current is None or current == new:
+        return new
+    if pd.api.types.is_bool_dtype(current) or pd.api.types.is_bool_dtype(new):
+        return np.dtype(object)
+    if pd.api.types.is_numeric_dtype(current) and pd.api.types.is_numeric_dtype(new):
+        try:
+            return np.result_type(current, new)
+        except TypeError:
+            pass
+    return np.dtype(object)
+
+
+def _number_text(value):
+    """Text a number was most likely parsed from (1.0 -> '1', True -> 'True')"""
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _is_number_dtype(dtype) -> bool:
+    return dtype is not None and pd.api.types.is_numeric_dtype(dtype)
+
+
+class _DistinctHashes:
+    """Exact distinct counter over value hashes, compacted lazily"""
+
+    def __init__(self):
+        self._compacted = np.empty(0, dtype=np.uint64)
+        self._pending: List[np.ndarray] = []
+        self._pending_size = 0
+
+    def add(self, hashes: np.ndarray) -> None:
+        self._pending.append(hashes)
+        self._pending_size += len(hashes)
+        # Compactage amorti : seulement quand l'attente dépasse la partie compactée
+        if self._pending_size > max(len(self._compacted), 1 << 16):
+            self._compact()
+
+    def merge(self, other: '_DistinctHashes') -> None:
+        self.add(other._compacted)
+        for hashes in other._pending:
+            self.add(hashes)
+
+    def count(self) -> int:
+        self._compact()
+        return len(self._compacted)
+
+    def to_hyperloglog(self) -> HyperLogLog:
+        """HyperLogLog of the same values (the hashes are kept, so nothing is lost)"""
+        hll = HyperLogLog()
+        hll.add(self._compacted)
+        for hashes in self._pending:
+            hll.add(hashes)
+        return hll
+
+    def _compact(self) -> None:
+        if self._pending:
+            self._compacted = np.unique(np.concatenate([self._compacted] + self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+
+class ColumnProfile:
+    """Mergeable single-pass accumulator for one column"""
+
+    def __init__(self, name: str, approx_threshold: Optional[int] = APPROX_STATS_ROW_THRESHOLD):
+        self.name = name
+        self.approx_threshold = approx_threshold
+        self.total_count = 0
+        self.missing_count = 0
+        self.dtype = None
+
+        # Table de fréquences (ordre de première apparition) puis hash au-delà de la limite
+        self.frequencies: Optional[Dict] = {}
+        # Ensemble exact de hash, puis HyperLogLog au-delà du seuil d'approximation
+        self._distinct = None
+
+        self.sample_values: List = []
+        self._datetime_probe: List[pd.Series] = []
+        self._probe_size = 0
+
+        # Moments (Welford / Chan), extrêmes et quantiles des colonnes numériques
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = KLLSketch(exact_limit=approx_threshold)
+
+    @property
+    def non_null_count(self) -> int:
+        return self.total_count - self.missing_count
+
+    @property
+    def unique_count(self) -> int:
+        if self.frequencies is not None:
+            return len(self.frequencies)
+        return self._distinct.count()
+
+    @property
+    def unique_approximate(self) -> bool:
+        return isinstance(self._distinct, HyperLogLog)
+
+    def update(self, series: pd.Series) -> None:
+        """Accumulate one chunk of the column"""
+        self.total_count += len(series)
+        self._set_dtype(_combine_dtypes(self.dtype, series.dtype))
+
+        missing = series.isna()
+        missing_count = int(missing.sum())
+        self.missing_count += missing_count
+
+        non_null = series[~missing] if missing_count else series
+        if len(non_null) == 0:
+            return
+
+        if self.dtype == object and _is_number_dtype(series.dtype):
+            # Bloc lu en nombres dans une colonne qui contient aussi du texte :
+            # une lecture complète aurait gardé les chaînes
+            non_null = non_null.map(_number_text)
+
+        self._update_frequencies(non_null)
+        self._check_distinct_mode()
+        self._update_samples(non_null)
+
+        if self._probe_size < DATETIME_PROBE_SIZE:
+            probe = non_null.iloc[:DATETIME_PROBE_SIZE - self._probe_size]
+            self._datetime_probe.append(probe)
+            self._probe_size += len(probe)
+
+        if _is_number_dtype(self.dtype):
+            values = non_null.to_numpy(dtype=np.float64)
+            self._merge_moments(*moments(values))
+            self.sketch.update(values)
+
+    def add_missing(self, count: int) -> None:
+        """Account for rows where the column is absent (read as NaN)"""
+        if count:
+            self.total_count += count
+            self.missing_count += count
+            self._set_dtype(_combine_dtypes(self.dtype, np.dtype(np.float64)))
+
+    def merge(self, other: 'ColumnProfile') -> None:
+        """Merge the profile of a later chunk range of the same column"""
+        self.total_count += other.total_count
+        self.missing_count += other.missing_count
+        if other.dtype is not None:
+            self._set_dtype(_combine_dtypes(self.dtype, other.dtype))
+            if self.dtype == object:
+                other._set_dtype(self.dtype)
+
+        if other.frequencies is not None:
+            self._add_counts(list(other.frequencies.keys()), list(other.frequencies.values()))
+        else:
+            self._switch_to_hashes()
+            other_distinct = other._distinct
+            if self.unique_approximate or other.unique_approximate:
+                if not self.unique_approximate:
+                    self._distinct = self._distinct.to_hyperloglog()
+                if not other.unique_approximate:
+                    other_distinct = other_distinct.to_hyperloglog()
+            self._distinct.merge(other_distinct)
+        self._check_distinct_mode()
+
+        for value in other.sample_values:
+            if len(self.sample_values) >= SAMPLE_VALUES_COUNT:
+                break
+            if value not in self.sample_values:
+                self.sample_values.append(value)
+
+        for probe in other._datetime_probe:
+            if self._probe_size >= DATETIME_PROBE_SIZE:
+                break
+            probe = probe.iloc[:DATETIME_PROBE_SIZE - self._probe_size]
+            self._datetime_probe.append(probe)
+            self._probe_size += len(probe)
+
+        if other.count:
+            self._merge_moments(other.count, other.mean, other.m2, other.min, other.max)
+            self.sketch.merge(other.sketch)
+
+    def _set_dtype(self, dtype) -> None:
+        """Change the column dtype, turning numbers seen so far into text if it becomes object"""
+        if dtype == object and _is_number_dtype(self.dtype):
+            if self.frequencies is not None:
+                frequencies = {}
+                for value, count in self.frequencies.items():
+                    key = _number_text(value)
+                    frequencies[key] = frequencies.get(key, 0) + count
+                self.frequencies = frequencies
+
+            samples = []
+            for value in map(_number_text, self.sample_values):
+                if value not in samples:
+                    samples.append(value)
+            self.sample_values = samples
+
+            self._datetime_probe = [
+                probe.map(_number_text) if _is_number_dtype(probe.dtype) else probe
+                for probe in self._datetime_probe
+            ]
+        self.dtype = dtype
+
+    def _update_frequencies(self, non_null: pd.Series) -> None:
+        if self.frequencies is None:
+            self._distinct.add(hash_values(non_null))
+            return
+
+        counts = non_null.value_counts(sort=False)
+        if len(counts) > FREQUENCY_TABLE_LIMIT:
+            self._switch_to_hashes()
+            self._distinct.add(hash_values(counts.index.to_series()))
+            return
+
+        self._add_counts(counts.index.tolist(), counts.tolist())
+
+    def _add_counts(self, values: List, counts: List[int]) -> None:
+        if self.frequencies is None:
+            self._distinct.add(hash_values(values))
+            return
+
+        frequencies = self.frequencies
+        for value, count in zip(values, counts):
+            frequencies[value] = frequencies.get(value, 0) + count
+
+        if len(frequencies) > FREQUENCY_TABLE_LIMIT:
+            self._switch_to_hashes()
+
+    def _switch_to_hashes(self) -> None:
+        if self.frequencies is None:
+            return
+        self._distinct = _DistinctHashes()
+        if self.frequencies:
+            self._distinct.add(hash_values(list(self.frequencies.keys())))
+        self.frequencies = None
+
+    def _check_distinct_mode(self) -> None:
+        """Replace the exact hash set by a HyperLogLog once the column passes the threshold"""
+        if (isinstance(self._distinct, _DistinctHashes) and self.approx_threshold is not None
+                and self.non_null_count > self.approx_threshold):
+            self._distinct = self._distinct.to_hyperloglog()
+
+    def _update_samples(self, non_null: pd.Series) -> None:
+        if len(self.sample_values) >= SAMPLE_VALUES_COUNT:
+            return
+        # Au plus len(sample_values) doublons parmi les premières valeurs uniques du bloc
+        candidates = non_null.unique()[:SAMPLE_VALUES_COUNT + len(self.sample_values)].tolist()
+        for value in candidates:
+            if len(self.sample_values) >= SAMPLE_VALUES_COUNT:
+                break
+            if value not in self.sample_values:
+                self.sample_values.append(value)
+
+    def _merge_moments(self, count: int, mean: float, m2: float, min_value: float, max_value: float) -> None:
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min_value if self.min is None else min(self.min, min_value)
+        self.max = max_value if self.max is None else max(self.max, max_value)
+
+    def infer_data_type(self) -> DataType:
+        """Same rules as CSVProcessor.infer_data_type, on the accumulated state"""
+        if self.non_null_count == 0:
+            return DataType.TEXT
+
+        if self.dtype == 'bool' or (self.frequencies is not None and set(self.frequencies).issubset(BOOLEAN_VALUES)):
+            return DataType.BOOLEAN
+
+        if pd.api.types.is_numeric_dtype(self.dtype):
+            return DataType.NUMERICAL
+
+        try:
+            pd.to_datetime(pd.concat(self._datetime_probe))
+            return DataType.DATETIME
+        except:
+            pass
+
+        unique_count = self.unique_count
+        unique_ratio = unique_count / self.non_null_count
+        if unique_ratio < 0.5 and unique_count < 100:
+            return DataType.CATEGORICAL
+
+        return DataType.TEXT
+
+    def to_column_info(self) -> ColumnInfo:
+        total_count = self.total_count
+        missing_percentage = (self.missing_count / total_count * 100) if total_count > 0 else 0
+
+        sample_values = self.sample_values
+        if self.dtype is not None and self.dtype.kind == 'f':
+            # Colonne entière lue en float (valeurs manquantes dans un autre bloc)
+            sample_values = [float(v) for v in sample_values]
+
+        data_type = self.infer_data_type()
+
+        column_info = ColumnInfo(
+            name=self.name,
+            data_type=data_type,
+            missing_count=int(self.missing_count),
+            missing_percentage=round(float(missing_percentage), 2),
+            unique_count=int(self.unique_count),
+            sample_values=sample_values
+        )
+
+        error_bounds = {}
+        if self.unique_approximate:
+            error_bounds['unique_count_relative_error'] = round(self._distinct.relative_error, 4)
+
+        if data_type == DataType.NUMERICAL and self.count > 0:
+            if not self.sketch.exact:
+                error_bounds['quantile_rank_error'] = round(self.sketch.rank_error, 4)
+            try:
+                std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float('nan')
+                q25, median, q75 = self.sketch.quantiles([0.25, 0.5, 0.75])
+                column_info.mean = round(float(self.mean), 4)
+                column_info.std = round(float(std), 4)
+                column_info.min = round(float(self.min), 4)
+                column_info.max = round(float(self.max), 4)
+                column_info.median = round(float(median), 4)
+                column_info.q25 = round(float(q25), 4)
+                column_info.q75 = round(float(q75), 4)
+            except Exception as e:
+                logger.warning(f"Could not compute statistics for {self.name}: {e}")
+
+        elif data_type == DataType.CATEGORICAL and self.frequencies:
+            # Top 10 (à égalité : ordre de première apparition)
+            top = sorted(self.frequencies.items(), key=lambda item: -item[1])[:10]
+            column_info.top_values = {str(k): int(v) for k, v in top}
+
+        if error_bounds:
+            column_info.approximate = True
+            column_info.error_bounds = error_bounds
+
+        return column_info
+
+
+class DatasetProfiler:
+    """
+    Streaming profile of a whole dataset
+
+    Usage:
+        profiler = DatasetProfiler()
+        for chunk in chunks:
+            profiler.update(chunk)
+        columns_info = profiler.columns_info()
+    """
+
+    def __init__(self, approx_threshold: Optional[int] = APPROX_STATS_ROW_THRESHOLD,
+                 head_rows: int = 0, track_memory: bool = False):
+        self.approx_threshold = approx_threshold
+        self.head_rows = head_rows
+        self.track_memory = track_memory
+
+        self.columns: List = []
+        self.profiles: List[ColumnProfile] = []
+        self.failed: set = set()
+        self.rows_count = 0
+        self.memory_usage = 0
+        self.head: Optional[pd.DataFrame] = None
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[pd.DataFrame], **kwargs) -> 'DatasetProfiler':
+        profiler = cls(**kwargs)
+        for chunk in chunks:
+            profiler.update(chunk)
+        return profiler
+
+    def update(self, chunk: pd.DataFrame) -> 'DatasetProfiler':
+        """Accumulate one chunk of rows"""
+        if list(chunk.columns) != self.columns:
+            chunk = self._align(chunk)
+
+        self.rows_count += len(chunk)
+        if self.track_memory:
+            self.memory_usage += int(chunk.memory_usage(deep=True).sum())
+
+        if self.head_rows and (self.head is None or len(self.head) < self.head_rows):
+            missing_rows = self.head_rows - (0 if self.head is None else len(self.head))
+            head = chunk.head(missing_rows)
+            self.head = head if self.head is None else pd.concat([self.head, head])
+
+        # Accès par position : robuste aux noms de colonnes dupliqués
+        for position, profile in enumerate(self.profiles):
+            if position in self.failed:
+                continue
+            try:
+                profile.update(chunk.iloc[:, position])
+            except Exception as e:
+                logger.error(f"Error analyzing column {profile.name}: {e}")
+                self.failed.add(position)
+
+        return self
+
+    def _add_columns(self, columns: List) -> None:
+        """Start profiles for new columns, missing from every row seen so far"""
+        for column in columns:
+            profile = ColumnProfile(str(column), self.approx_threshold)
+            profile.add_missing(self.rows_count)
+            self.columns.append(column)
+            self.profiles.append(profile)
+
+    def _align(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Reorder a chunk on the known columns (records of a JSON file may differ in keys)"""
+        known = set(self.columns)
+        self._add_columns([c for c in chunk.columns if c not in known])
+        if chunk.columns.has_duplicates:
+            return chunk
+        return chunk.reindex(columns=self.columns)
+
+    def merge(self, other: 'DatasetProfiler') -> 'DatasetProfiler':
+        """Merge the profile of the rows that follow this profiler's rows"""
+        if not other.profiles:
+            return self
+
+        known = set(self.columns)
+        self._add_columns([c for c in other.columns if c not in known])
+        other_positions = {column: position for position, column in enumerate(other.columns)}
+
+        self.rows_count += other.rows_count
+        self.memory_usage += other.memory_usage
+
+        if self.head_rows and other.head is not None and (self.head is None or len(self.head) < self.head_rows):
+            missing_rows = self.head_rows - (0 if self.head is None else len(self.head))
+            head = other.head.head(missing_rows)
+            self.head = head if self.head is None else pd.concat([self.head, head])
+
+        for position, (column, profile) in enumerate(zip(self.columns, self.profiles)):
+            other_position = other_positions.get(column)
+            if other_position is None:
+                profile.add_missing(other.rows_count)
+            elif other_position in other.failed:
+                self.failed.add(position)
+            elif position not in self.failed:
+                profile.merge(other.profiles[other_position])
+
+        return self
+
+    def columns_info(self) -> List[ColumnInfo]:
+        """Build the ColumnInfo of every column"""
+        columns_info = []
+
+        for position, profile in enumerate(self.profiles):
+            try:
+                if position in self.failed:
+                    raise ValueError("column analysis failed on a previous chunk")
+                columns_info.append(profile.to_column_info())
+            except Exception as e:
+                logger.error(f"Error analyzing column {profile.name}: {e}")
+                # Add basic info even if analysis fails
+                columns_info.append(ColumnInfo(
+                    name=profile.name,
+                    data_type=DataType.TEXT,
+                    missing_count=0,
+                    missing_percentage=0.0,
+                    unique_count=0,
+                    sample_values=[]
+                ))
+
+        return columns_info
@@ -0,0 +1,203 @@
+import pandas as pd
+import numpy as np
+from typing import List, Optional, Tuple
+from .stats import describe
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+FILL_ACTIONS = ('fill_mean', 'fill_median', 'fill_mode', 'fill_forward', 'remove_rows')
+OUTLIER_ACTIONS = ('remove_outliers', 'replace_outliers')
+ACTIONS = FILL_ACTIONS + OUTLIER_ACTIONS
+# Actions qui suppriment des lignes
+ROW_ACTIONS = ('remove_rows', 'remove_outliers')
+NUMERIC_ACTIONS = ('fill_mean', 'fill_median') + OUTLIER_ACTIONS
+
+
+class DataCleaner:
+    """Missing value and outlier actions on one column (used by /preprocess and /preprocess/batch)"""
+
+    @staticmethod
+    def validate(df: pd.DataFrame, column: str, action: str, method: Optional[str] = 'iqr',
+                 min_value: float = None, max_value: float = None) -> Optional[str]:
+        """Return why a step cannot apply to `df`, or None if it can"""
+        if action not in ACTIONS:
+            return f"Unknown action: {action}"
+        if column not in df.columns:
+            return f"Column '{column}' not found in dataset"
+        if action in NUMERIC_ACTIONS and not pd.api.types.is_numeric_dtype(df[column]):
+            return f"{action} only works with numerical columns"
+        if action in OUTLIER_ACTIONS:
+            if method not in ('iqr', 'zscore', 'range'):
+                return f"Unknown outlier method: {method}"
+            if method == 'range' and min_value is None and max_value is None:
+                return "Range method needs min_value and/or max_value"
+        return None
+
+    @staticmethod
+    def apply(df: pd.DataFrame, column: str, action: str,
+              custom_missing_values: List[str] = None,
+              method: Optional[str] = 'iqr',
+              min_value: float = None,
+              max_value: float = None,
+              replacement_strategy: Optional[str] = 'mean') -> Tuple[pd.DataFrame, str, int]:
+        """
+        Apply one action to a column
+
+        Returns (DataFrame, result message, number of values replaced).
+        Raises ValueError if the action does not apply to the column.
+        """
+        values_replaced = 0
+
+        # Detect custom missing values if provided
+        if custom_missing_values and action in FILL_ACTIONS:
+            from ..processors.csv_processor import CSVProcessor
+            custom_missing_mask = CSVProcessor.detect_custom_missing_values(df[column], custom_missing_values)
+            df.loc[custom_missing_mask, column] = pd.NA
+
+        if action == 'fill_mean':
+            if not pd.api.types.is_numeric_dtype(df[column]):
+                raise ValueError("Mean fill only works with numerical columns")
+            mean_value = df[column].mean()
+            filled_count = df[column].isna().sum()
+            df[column] = df[column].fillna(mean_value)
+            result_message = f"Filled {filled_count} missing values with mean: {mean_value:.2f}"
+
+        elif action == 'fill_median':
+            if not pd.api.types.is_numeric_dtype(df[column]):
+                raise ValueError("Median fill only works with numerical columns")
+            median_value = df[column].median()
+            filled_count = df[column].isna().sum()
+            df[column] = df[column].fillna(median_value)
+            result_message = f"Filled {filled_count} missing values with median: {median_value:.2f}"
+
+        elif action == 'fill_mode':
+            mode_value = df[column].mode()
+            if len(mode_value) > 0:
+                filled_count = df[column].isna().sum()
+                df[column] = df[column].fillna(mode_value[0])
+                result_message = f"Filled {filled_count} missing values with mode: {mode_value[0]}"
+            else:
+                result_message = "No mode found"
+
+        elif action == 'fill_forward':
+            filled_count = df[column].isna().sum()
+            df[column] = df[column].ffill()
+            result_message = f"Forward filled {filled_count} missing values"
+
+        elif action == 'remove_rows':
+            before = len(df)
+            df = df.dropna(subset=[column])
+            result_message = f"Removed {before - len(df)} rows with missing values"
+
+        elif action == 'replace_outliers':
+            df, result_message, values_replaced = DataCleaner._replace_outliers(
+                df, column, method, min_value, max_value, replacement_strategy
+            )
+
+        elif action == 'remove_outliers':
+            df, result_message = DataCleaner._remove_outliers(df, column, method, min_value, max_value)
+
+        else:
+            raise ValueError(f"Unknown action: {action}")
+
+        return df, result_message, values_replaced
+
+    @staticmethod
+    def _replace_outliers(df: pd.DataFrame, column: str, method: str, min_value: float, max_value: float,
+                          replacement_strategy: str) -> Tuple[pd.DataFrame, str, int]:
+        outlier_mask = pd.Series([False] * len(df), index=df.index)
+
+        if method == 'range':
+            if min_value is not None:
+                outlier_mask |= df[column] < min_value
+            if max_value is not None:
+                outlier_mask |= df[column] > max_value
+
+        elif method == 'iqr':
+            stats = describe(df[column])
+            Q1, Q3 = stats.q25, stats.q75
+            IQR = Q3 - Q1
+            lower = Q1 - 1.5 * IQR
+            upper = Q3 + 1.5 * IQR
+            outlier_mask = (df[column] < lower) | (df[column] > upper)
+
+        elif method == 'zscore':
+            stats = describe(df[column])
+            mean, std = stats.mean, stats.std
+            if std > 0:
+                z_scores = np.abs((df[column] - mean) / std)
+                outlier_mask = z_scores > 3
+
+        outlier_count = int(outlier_mask.sum())
+        if outlier_count == 0:
+            return df, "No outliers detected", 0
+
+        clean_values = df.loc[~outlier_mask, column]
+
+        if replacement_strategy == 'mean':
+            replacement_value = clean_values.mean()
+            result_message = f"Replaced {outlier_count} outliers with mean: {replacement_value:.2f}"
+        elif replacement_strategy == 'median':
+            replacement_value = clean_values.median()
+            result_message = f"Replaced {outlier_count} outliers with median: {replacement_value:.2f}"
+        elif replacement_strategy == 'mode':
+            mode_values = clean_values.mode()
+            if len(mode_values) > 0:
+                replacement_value = mode_values[0]
+                result_message = f"Replaced {outlier_count} outliers with mode: {replacement_value}"
+            else:
+                replacement_value = clean_values.median()
+                result_message = f"Replaced {outlier_count} outliers with median (no mode found): {replacement_value:.2f}"
+        elif replacement_strategy == 'min':
+            replacement_value = clean_values.min()
+            result_message = f"Replaced {outlier_count} outliers with min: {replacement_value:.2f}"
+        elif replacement_strategy == 'max':
+            replacement_value = clean_values.max()
+            result_message = f"Replaced {outlier_count} outliers with max: {replacement_value:.2f}"
+        else:
+            raise ValueError(f"Unknown replacement strategy: {replacement_strategy}")
+
+        original_dtype = df[column].dtype
+
+        if pd.api.types.is_integer_dtype(original_dtype):
+            replacement_value_int = int(round(replacement_value))
+            df.loc[outlier_mask, column] = replacement_value_int
+            logger.info(f"Replaced {outlier_count} int values with {replacement_value_int}")
+        else:
+            df[column] = df[column].astype(float)
+            df.loc[outlier_mask, column] = float(replacement_value)
+            logger.info(f"Replaced {outlier_count} float values with {replacement_value}")
+
+        return df, result_message, outlier_count
+
+    @staticmethod
+    def _remove_outliers(df: pd.DataFrame, column: str, method: str, min_value: float,
+                         max_value: float) -> Tuple[pd.DataFrame, str]:
+        before = len(df)
+
+        if method == 'range':
+            if min_value is not None:
+                df = df[df[column] >= min_value]
+            if max_value is not None:
+                df = df[df[column] <= max_value]
+            return df, f"Removed {before - len(df)} rows with outliers outside range [{min_value}, {max_value}]"
+
+        if method == 'iqr':
+            stats = describe(df[column])
+            Q1, Q3 = stats.q25, stats.q75
+            IQR = Q3 - Q1
+            lower = Q1 - 1.5 * IQR
+            upper = Q3 + 1.5 * IQR
+            df = df[(df[column] >= lower) & (df[column] <= upper)]
+            return df, f"Removed {before - len(df)} rows with outliers using IQR method"
+
+        if method == 'zscore':
+            stats = describe(df[column])
+            mean, std = stats.mean, stats.std
+            z_scores = np.abs((df[column] - mean) / std)
+            df = df[z_scores < 3]
+            return df, f"Removed {before - len(df)} rows with outliers using Z-score method"
+
+        raise ValueError(f"Unknown outlier method: {method}")
@@ -0,0 +1,97 @@
+"""
+Column-parallel execution on a shared process pool
+
+Per-column analyses are pure pandas/NumPy work that holds the GIL, so wide
+datasets are split into groups of columns and analysed in worker processes.
+A work-size heuristic keeps narrow or small frames serial, where sending
+the data to the workers would cost more than it saves.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# 0 : un worker par CPU
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '0')) or os.cpu_count() or 1
+ANALYSIS_PARALLEL_MIN_COLUMNS = int(os.getenv('ANALYSIS_PARALLEL_MIN_COLUMNS', '16'))
+ANALYSIS_PARALLEL_MIN_CELLS = int(os.getenv('ANALYSIS_PARALLEL_MIN_CELLS', '2000000'))
+# Groupes par worker : assez pour équilibrer la charge, peu pour limiter la sérialisation
+GROUPS_PER_WORKER = 4
+
+
+def should_parallelize(n_rows: int, n_columns: int, workers: int = ANALYSIS_WORKERS) -> bool:
+    """True if a frame is wide and large enough to be worth analysing in parallel"""
+    return (
+        workers > 1
+        and n_columns >= ANALYSIS_PARALLEL_MIN_COLUMNS
+        and n_rows * n_columns >= ANALYSIS_PARALLEL_MIN_CELLS
+    )
+
+
+def get_process_pool(workers: int = ANALYSIS_WORKERS) -> ProcessPoolExecutor:
+    """Return the process pool shared by the service, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 'spawn' : pas de fork d'un serveur qui a déjà des threads
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            logger.info(f"⚡ Analysis process pool started with {workers} workers")
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def map_column_groups(func: Callable[[pd.DataFrame, List[Any]], List[Any]], df: pd.DataFrame,
+                      column_args: List[Any], workers: Optional[int] = None) -> List[Any]:
+    """
+    Apply `func(group_frame, group_args)` to groups of consecutive columns of
+    `df` (one entry of `column_args` per column) and concatenate the results
+    in column order
+
+    `func` must be a module-level function (it is pickled to the workers)
+    returning one result per column of its group. The call is serial when
+    `should_parallelize` says the frame is too small.
+    """
+    workers = workers or ANALYSIS_WORKERS
+    n_columns = df.shape[1]
+    if not should_parallelize(len(df), n_columns, workers):
+        return func(df, column_args)
+
+    n_groups = min(n_columns, workers * GROUPS_PER_WORKER)
+    bounds = np.linspace(0, n_columns, n_groups + 1).astype(int)
+
+    try:
+        pool = get_process_pool(workers)
+        futures = [
+            pool.submit(func, df.iloc[:, a:b], column_args[a:b])
+            for a, b in zip(bounds[:-1], bounds[1:]) if b > a
+        ]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    except BrokenProcessPool as e:
+        # Worker tué (mémoire...) : le pool est recréé au prochain appel, on finit en série
+        logger.warning(f"⚠️ Analysis process pool broken, falling back to serial analysis: {e}")
+        _reset_pool()
+        return func(df, column_args)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
@@ -0,0 +1,132 @@
+"""
+Lazy transformation pipelines for dataset versions
+
+A lazy version is a base file plus the ordered log of the normalizations
+and encodings applied since. Recording an operation only reads the base
+columns the log touches, to check the step and report its statistics: when
+a reader needs the whole version, the log is optimized (superseded scalings
+dropped, compatible steps fused) and replayed in memory in a single pass
+over the base, whatever the number of chained edits.
+"""
+import logging
+from typing import Dict, List, Set, Tuple
+
+import pandas as pd
+
+from .transformers import DataTransformer
+
+logger = logging.getLogger(__name__)
+
+
+def normalization_op(columns: List[str], method: str, feature_range: Tuple[float, float] = (0, 1)) -> Dict:
+    """Log entry of a normalization (see DataTransformer.normalize_columns)"""
+    operation = {'type': 'normalization', 'method': method, 'columns': list(columns)}
+    if method == 'minmax':
+        operation['feature_range'] = [float(feature_range[0]), float(feature_range[1])]
+    return operation
+
+
+def encoding_op(columns: List[str], method: str, drop_first: bool = False) -> Dict:
+    """Log entry of an encoding (see DataTransformer.encode_columns)"""
+    return {'type': 'encoding', 'method': method, 'columns': list(columns), 'drop_first': bool(drop_first)}
+
+
+def _is_onehot(operation: Dict) -> bool:
+    method = operation['method'].lower().replace('-', '_').replace(' ', '_')
+    return operation['type'] == 'encoding' and method in ('onehot', 'one_hot', 'onehot_encoding', 'one_hot_encoding')
+
+
+def _is_positive_affine(operation: Dict) -> bool:
+    """True for scalings x -> a*x + b with a > 0 (every supported one, unless a reversed range)"""
+    if operation['method'] == 'minmax':
+        low, high = operation.get('feature_range', (0, 1))
+        return high > low
+    return operation['method'] in ('zscore', 'robust')
+
+
+def _merge_key(operation: Dict) -> Tuple:
+    return tuple(sorted((key, str(value)) for key, value in operation.items() if key != 'columns'))
+
+
+def optimize(operations: List[Dict]) -> List[Dict]:
+    """
+    Rewrite an operation log into an equivalent, cheaper one
+
+    - A scaling of a column followed later by another scaling of the same
+      column, with nothing else touching it in between, is dropped: z-score,
+      min-max and robust scaling are all positive affine maps fitted on the
+      data, so the last one gives the same result on the scaled or the
+      original values.
+    - Consecutive steps of the same kind with the same parameters are fused
+      into one step over the union of their columns.
+    """
+    operations = [dict(operation, columns=list(operation['columns'])) for operation in operations]
+
+    # Parcours à rebours : colonnes dont la valeur finale vient d'une normalisation ultérieure
+    rescaled: Set[str] = set()
+    for operation in reversed(operations):
+        if operation['type'] == 'normalization' and _is_positive_affine(operation):
+            kept = [column for column in operation['columns'] if column not in rescaled]
+            rescaled.update(operation['columns'])
+            operation['columns'] = kept
+        else:
+            rescaled.difference_update(operation['columns'])
+
+    fused = []
+    for operation in operations:
+        if not operation['columns']:
+            continue
+        previous = fused[-1] if fused else None
+        if (previous is not None and _merge_key(previous) == _merge_key(operation)
+                and not set(previous['columns']) & set(operation['columns'])):
+            previous['columns'] = previous['columns'] + operation['columns']
+        else:
+            fused.append(operation)
+
+    return fused
+
+
+def apply_operations(df: pd.DataFrame, operations: List[Dict]) -> Tuple[pd.DataFrame, List[Dict]]:
+    """Replay a log on a DataFrame, returns (result, transformation info of each step)"""
+    transformer = DataTransformer(df)
+    infos = []
+    for operation in operations:
+        if operation['type'] == 'normalization':
+            _, info = transformer.normalize_columns(
+                operation['columns'],
+                operation['method'],
+                tuple(operation.get('feature_range', (0, 1)))
+            )
+        elif operation['type'] == 'encoding':
+            _, info = transformer.encode_columns(operation['columns'], operation['method'],
+                                                 operation.get('drop_first', False))
+        else:
+            raise ValueError(f"Unknown operation type: {operation['type']}")
+        infos.append(info)
+    return transformer.get_dataframe(), infos
+
+
+def changed_columns(operations: List[Dict]) -> Set[str]:
+    """Columns rewritten by a log (the others keep the values of the base)"""
+    columns = set()
+    for operation in operations:
+        columns.update(operation['columns'])
+    return columns
+
+
+def validate(df: pd.DataFrame, operations: List[Dict], other_columns: int = 0) -> List[Dict]:
+    """
+    Replay a log on the base columns it touches (`df`, every row) and return
+    the transformation info of each step, the same as an eager transform
+    would give; raise ValueError if a step cannot apply (missing or non
+    numerical column, unknown method...).
+
+    `other_columns` base columns were left out of `df`: they are added back
+    to the shapes reported by encodings.
+    """
+    _, infos = apply_operations(df, operations)
+    for info in infos:
+        if info['type'] == 'encoding':
+            info['original_shape'] = (info['original_shape'][0], info['original_shape'][1] + other_columns)
+            info['new_shape'] = (info['new_shape'][0], info['new_shape'][1] + other_columns)
+    return infos
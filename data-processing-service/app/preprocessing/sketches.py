@@ -0,0 +1,217 @@
+"""
+Mergeable streaming sketches used by the dataset profiler
+
+Below `APPROX_STATS_ROW_THRESHOLD` values per column every statistic is
+exact. Above it, quantiles come from a KLL sketch and distinct counts from
+a HyperLogLog, both with a fixed memory footprint and a known error bound.
+"""
+import math
+import os
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .stats import quantiles as exact_quantiles
+
+
+# Au-delà de ce nombre de valeurs par colonne, quantiles et distincts sont approchés
+APPROX_STATS_ROW_THRESHOLD = int(os.getenv('APPROX_STATS_ROW_THRESHOLD', '200000'))
+HLL_PRECISION = int(os.getenv('HLL_PRECISION', '14'))
+# Taille de l'échantillon servant au type et aux fréquences des colonnes approchées
+APPROX_SAMPLE_ROWS = int(os.getenv('APPROX_SAMPLE_ROWS', '100000'))
+
+
+def hash_values(values) -> np.ndarray:
+    """64-bit hashes of non-null values, equal numbers hash equally (1 == 1.0 == True)"""
+    series = values if isinstance(values, pd.Series) else pd.Series(list(values))
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        # + 0.0 : -0.0 et 0.0 sont une seule valeur pour unique()
+        return pd.util.hash_array(series.to_numpy(dtype=np.float64) + 0.0)
+    return pd.util.hash_array(series.to_numpy(dtype=object), categorize=False)
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch over float values
+
+    Values are kept exactly until `exact_limit` of them have been seen, so
+    small columns get the same quantiles as `pandas.Series.quantile`. Past
+    that point the sketch keeps a fixed number of weighted items (about 3*k)
+    and answers with a rank error of roughly 1.7 / k.
+    """
+
+    def __init__(self, k: int = 1024, exact_limit: Optional[int] = APPROX_STATS_ROW_THRESHOLD, seed: int = 0):
+        self.k = k
+        self.exact_limit = exact_limit
+        self.count = 0
+        self.exact = True
+        self._exact_values: List[np.ndarray] = []
+        self._levels: List[np.ndarray] = []
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def rank_error(self) -> float:
+        """Normalized rank error of the answered quantiles (0 while exact)"""
+        return 0.0 if self.exact else 1.7 / self.k
+
+    def update(self, values: np.ndarray) -> 'KLLSketch':
+        """Add a batch of (non-null) float values"""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return self
+
+        self.count += len(values)
+
+        if self.exact:
+            self._exact_values.append(values)
+            if self.exact_limit is not None and self.count > self.exact_limit:
+                self._leave_exact_mode()
+            return self
+
+        self._add_to_level(0, values)
+        self._compress()
+        return self
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """Merge another sketch into this one"""
+        if other.count == 0:
+            return self
+
+        if other.exact:
+            # Valeurs exactes de l'autre sketch : simple ajout
+            for values in other._exact_values:
+                self.update(values)
+            return self
+
+        if self.exact:
+            self._leave_exact_mode()
+
+        self.count += other.count
+        for level, items in enumerate(other._levels):
+            self._add_to_level(level, items)
+        self._compress()
+        return self
+
+    def quantiles(self, qs: List[float]) -> List[float]:
+        """Return the values at the given quantiles (nan for an empty sketch)"""
+        if self.count == 0:
+            return [float('nan')] * len(qs)
+
+        if self.exact:
+            return exact_quantiles(np.concatenate(self._exact_values), qs)
+
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([
+            np.full(len(level), 1 << height, dtype=np.int64)
+            for height, level in enumerate(self._levels)
+        ])
+        order = np.argsort(items, kind='mergesort')
+        items = items[order]
+        cumulative = np.cumsum(weights[order])
+        total = cumulative[-1]
+
+        # Même convention que la quantile linéaire : rang q * (n - 1) sur 0..n-1
+        results = []
+        for q in qs:
+            rank = q * (total - 1)
+            position = int(np.searchsorted(cumulative, rank, side='right'))
+            results.append(float(items[min(position, len(items) - 1)]))
+        return results
+
+    def _leave_exact_mode(self) -> None:
+        values = np.concatenate(self._exact_values) if self._exact_values else np.empty(0)
+        self._exact_values = []
+        self.exact = False
+        self._add_to_level(0, values)
+        self._compress()
+
+    def _add_to_level(self, level: int, items: np.ndarray) -> None:
+        while len(self._levels) <= level:
+            self._levels.append(np.empty(0, dtype=np.float64))
+        self._levels[level] = np.concatenate([self._levels[level], items])
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._levels) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if len(items) > self._capacity(level):
+                items = np.sort(items)
+                # Un élément reste au niveau courant si le nombre est impair
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                pairs = items[:len(items) - len(keep)]
+                promoted = pairs[self._rng.integers(2)::2]
+                self._levels[level] = keep
+                self._add_to_level(level + 1, promoted)
+            level += 1
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter over 64-bit value hashes
+
+    Uses 2**precision one-byte registers (16 KB by default) whatever the
+    number of values, with a relative standard error of 1.04 / sqrt(2**precision).
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, hashes: np.ndarray) -> 'HyperLogLog':
+        """Add a batch of uint64 hashes"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return self
+
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes << np.uint64(p)
+
+        # Rang = zéros de tête + 1 ; les 53 bits de poids fort se convertissent
+        # exactement en float64, dont l'exposant donne la longueur en bits
+        _, exponent = np.frexp((rest >> np.uint64(11)).astype(np.float64))
+        rank = np.where(rest >> np.uint64(11) == 0, 64 - p + 1, 54 - exponent).astype(np.uint8)
+
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Petites cardinalités : comptage linéaire
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+
+def approx_distinct(values, precision: int = HLL_PRECISION, chunk_size: int = 1 << 20) -> HyperLogLog:
+    """HyperLogLog of the non-null values of a Series, hashed chunk by chunk"""
+    hll = HyperLogLog(precision)
+    for start in range(0, len(values), chunk_size):
+        hll.add(hash_values(values.iloc[start:start + chunk_size]))
+    return hll
+
+
+def sample_values(values: pd.Series, size: int = APPROX_SAMPLE_ROWS, seed: int = 0) -> pd.Series:
+    """Uniform sample (without replacement, original order kept) of at most `size` values"""
+    if len(values) <= size:
+        return values
+    positions = np.sort(np.random.default_rng(seed).choice(len(values), size, replace=False))
+    return values.iloc[positions]
@@ -0,0 +1,129 @@
+"""
+Fused descriptive statistics kernel for numerical columns
+
+`describe` computes count, mean, std, min, max and the quartiles of a column
+in one vectorized pass: one conversion to float64, one sum for the moments
+and a single `np.partition` for every order statistic. The profiler, the
+outlier detectors and the normalization share it instead of calling
+pandas' mean/std/min/max/median/quantile one after another.
+
+Past an optional row threshold the quartiles come from a KLL sketch fed
+chunk by chunk instead of the partition, and are flagged as approximate.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+SKETCH_CHUNK_SIZE = 1 << 16
+
+
+@dataclass
+class NumericStats:
+    """Descriptive statistics of the non-null values of a numerical column"""
+    count: int
+    mean: float
+    std: float
+    min: float
+    max: float
+    q25: float
+    median: float
+    q75: float
+    m2: float = 0.0
+    approximate: bool = False
+    rank_error: float = 0.0
+
+    @property
+    def iqr(self) -> float:
+        return self.q75 - self.q25
+
+    def summary(self, decimals: int = None) -> Dict[str, float]:
+        """mean / std / min / max / median / q25 / q75 as plain floats"""
+        values = {
+            'mean': self.mean,
+            'std': self.std,
+            'min': self.min,
+            'max': self.max,
+            'median': self.median,
+            'q25': self.q25,
+            'q75': self.q75
+        }
+        if decimals is not None:
+            return {key: round(float(value), decimals) for key, value in values.items()}
+        return {key: float(value) for key, value in values.items()}
+
+
+def to_float_array(values) -> np.ndarray:
+    """Non-null values of a Series / array as a float64 array"""
+    if isinstance(values, pd.Series):
+        array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        array = np.asarray(values, dtype=np.float64)
+    return array[~np.isnan(array)]
+
+
+def quantiles(values: np.ndarray, qs: Iterable[float]) -> List[float]:
+    """
+    Linear-interpolation quantiles (same convention as pandas / NumPy) of a
+    float array without NaN, with one partition for all of them
+    """
+    qs = list(qs)
+    n = len(values)
+    if n == 0:
+        return [float('nan')] * len(qs)
+
+    positions = np.asarray(qs, dtype=np.float64) * (n - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, n - 1)
+    partitioned = np.partition(values, np.unique(np.concatenate([lower, upper])))
+
+    low_values = partitioned[lower]
+    high_values = partitioned[upper]
+    fraction = positions - lower
+    return [float(v) for v in low_values + (high_values - low_values) * fraction]
+
+
+def moments(values: np.ndarray):
+    """(count, mean, sum of squared deviations, min, max) of a float array without NaN"""
+    n = len(values)
+    if n == 0:
+        return 0, float('nan'), 0.0, float('nan'), float('nan')
+    mean = float(values.mean())
+    m2 = float(np.square(values - mean).sum())
+    return n, mean, m2, float(values.min()), float(values.max())
+
+
+def describe(values, approx_threshold: Optional[int] = None) -> NumericStats:
+    """
+    All descriptive statistics of a column with one sum and one partition
+
+    With `approx_threshold`, columns with more non-null values than the
+    threshold get their quartiles from a KLL sketch instead.
+    """
+    array = to_float_array(values)
+    n = len(array)
+    if n == 0:
+        nan = float('nan')
+        return NumericStats(0, nan, nan, nan, nan, nan, nan, nan)
+
+    mean = float(array.mean())
+    m2 = float(np.square(array - mean).sum())
+    std = float(np.sqrt(m2 / (n - 1))) if n > 1 else float('nan')
+
+    if approx_threshold is not None and n > approx_threshold:
+        from .sketches import KLLSketch
+
+        sketch = KLLSketch(exact_limit=approx_threshold)
+        for start in range(0, n, SKETCH_CHUNK_SIZE):
+            sketch.update(array[start:start + SKETCH_CHUNK_SIZE])
+        q25, median, q75 = sketch.quantiles(DEFAULT_QUANTILES)
+        return NumericStats(n, mean, std, float(array.min()), float(array.max()), q25, median, q75, m2,
+                            approximate=True, rank_error=sketch.rank_error)
+
+    # Min et max font partie des statistiques d'ordre du même partitionnement
+    q0, q25, median, q75, q100 = quantiles(array, (0.0,) + DEFAULT_QUANTILES + (1.0,))
+
+    return NumericStats(n, mean, std, q0, q100, q25, median, q75, m2)
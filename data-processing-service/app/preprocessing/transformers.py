@@ -7,6 +7,7 @@ from sklearn.preprocessing import (
     LabelEncoder
 )
 from typing import List, Dict, Any, Tuple
+from .stats import describe
 
 class DataTransformer:
     """Handle data transformations using scikit-learn"""
@@ -56,29 +57,13 @@ class DataTransformer:
             raise ValueError(f"Unknown normalization method: {method}")
         
         # Store original stats
-        original_stats = {}
-        for col in columns:
-            original_stats[col] = {
-                'mean': float(self.df[col].mean()),
-                'std': float(self.df[col].std()),
-                'min': float(self.df[col].min()),
-                'max': float(self.df[col].max()),
-                'median': float(self.df[col].median())
-            }
+        original_stats = {col: self._summary_stats(self.df[col]) for col in columns}
         
         # Apply transformation
         self.df[columns] = scaler.fit_transform(self.df[columns])
         
         # Store new stats
-        new_stats = {}
-        for col in columns:
-            new_stats[col] = {
-                'mean': float(self.df[col].mean()),
-                'std': float(self.df[col].std()),
-                'min': float(self.df[col].min()),
-                'max': float(self.df[col].max()),
-                'median': float(self.df[col].median())
-            }
+        new_stats = {col: self._summary_stats(self.df[col]) for col in columns}
         
         # Create transformation info
         transform_info = {
@@ -97,6 +82,18 @@ class DataTransformer:
         
         return self.df, transform_info
     
+    @staticmethod
+    def _summary_stats(series: pd.Series) -> Dict[str, float]:
+        """mean / std / min / max / median of a column, from the fused stats kernel"""
+        stats = describe(series)
+        return {
+            'mean': stats.mean,
+            'std': stats.std,
+            'min': stats.min,
+            'max': stats.max,
+            'median': stats.median
+        }
+    
     def encode_columns(self, columns: List[str], method: str = 'label_encoding', drop_first: bool = False):
         """
         Apply encoding to specified categorical columns
@@ -1,5 +1,6 @@
 from .csv_processor import CSVProcessor
 from .json_processor import JSONProcessor
 from .arff_processor import ARFFProcessor
+from .version_processor import VersionProcessor
 
-__all__ = ['CSVProcessor', 'JSONProcessor', 'ARFFProcessor']
\ No newline at end of file
+__all__ = ['CSVProcessor', 'JSONProcessor', 'ARFFProcessor', 'VersionProcessor']
\ No newline at end of file
@@ -1,10 +1,108 @@
+import io
+import re
+from contextlib import nullcontext
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, Iterator, List, Tuple
 import logging
+from ..preprocessing.analyzer import DatasetProfiler, PROFILE_CHUNK_ROWS
+from .cache import read_cached
+from .row_index import RowIndex
+from ..utils import frame_to_records
 
 logger = logging.getLogger(__name__)
 
+
+DATA_BLOCK_SIZE = 1024 * 1024
+EXTRA_COLUMN = '__arff_extra__'
+
+# Lignes de commentaire ou ne contenant que des espaces (ignorées par l'ancien parseur)
+SKIPPED_LINE_PATTERN = re.compile(rb'(?:^|\n)[ \t]*%|(?:^|\n)[ \t]+\r?(?:\n|$)')
+# Espaces en fin de valeur ou autour d'un guillemet : il faudra strip() les valeurs
+STRIP_MARKERS = (b' ,', b' \n', b' \r', b"' ", b" '", b'" ', b' "', b'\t')
+
+
+class _DataSectionStream(io.RawIOBase):
+    """
+    Raw stream over the @DATA section of an ARFF file, fed to pandas' C parser
+
+    Comment and whitespace-only lines are removed block by block, and
+    `needs_strip` records whether any value still carries spaces or quotes
+    that the C tokenizer leaves in place. The flag is set before the parser
+    sees the corresponding bytes, so chunks can rely on it.
+    
+    The old line parser opened and closed a quoted value on either quote
+    character; the C parser takes a single quotechar. The less frequent
+    quote is therefore rewritten to the quotechar, so a row such as
+    `2,'z',"foo, bar"` keeps its comma inside the value.
+    """
+    
+    def __init__(self, f, start: int, quotechar: str = None):
+        self._f = f
+        self._f.seek(start)
+        self._carry = b''
+        self._block = memoryview(b'')
+        self._eof = False
+        self.needs_strip = False
+        
+        # Le guillemet le plus fréquent sert de quotechar, l'autre est retiré au strip()
+        if quotechar is None:
+            sample = f.read(DATA_BLOCK_SIZE)
+            self._f.seek(start)
+            quotechar = '"' if sample.count(b'"') > sample.count(b"'") else "'"
+        self.quotechar = quotechar
+        self._quote = quotechar.encode()
+        self._other_quote = b"'" if self.quotechar == '"' else b'"'
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        while not len(self._block):
+            block = self._next_block()
+            if block is None:
+                return 0
+            self._block = memoryview(block)
+        
+        size = min(len(buffer), len(self._block))
+        buffer[:size] = self._block[:size]
+        self._block = self._block[size:]
+        return size
+    
+    def _next_block(self):
+        if self._eof:
+            return None
+        
+        raw = self._f.read(DATA_BLOCK_SIZE)
+        if raw:
+            # Couper sur le dernier saut de ligne, le reste passe au bloc suivant
+            data = self._carry + raw
+            cut = data.rfind(b'\n') + 1
+            block, self._carry = data[:cut], data[cut:]
+        else:
+            self._eof = True
+            block, self._carry = self._carry, b''
+        
+        # Recherches de sous-chaînes (rapides) avant toute expression régulière
+        if not self.needs_strip and (
+            self._other_quote in block or block.endswith(b' ')
+            or any(marker in block for marker in STRIP_MARKERS)
+        ):
+            self.needs_strip = True
+        
+        # Guillemet minoritaire : même rôle que le quotechar, comme dans l'ancien parseur
+        if self._other_quote in block:
+            block = block.replace(self._other_quote, self._quote)
+        
+        may_skip = b'%' in block or b'\n ' in block or b'\n\t' in block or block[:1] in (b' ', b'\t')
+        if may_skip and SKIPPED_LINE_PATTERN.search(block):
+            block = b''.join(
+                line for line in block.splitlines(keepends=True)
+                if line.strip() and not line.lstrip().startswith(b'%')
+            )
+        
+        return block
+
 class ARFFProcessor:
     """Process ARFF files"""
     
@@ -15,7 +113,7 @@ class ARFFProcessor:
         """
         try:
             logger.info(f"Reading ARFF file: {file_path}")
-            return ARFFProcessor._read_permissive(file_path)
+            return read_cached(file_path, ARFFProcessor._read_permissive, variant='arff')
             
         except Exception as e:
             logger.error(f"Error reading ARFF file: {e}")
@@ -24,120 +122,26 @@ class ARFFProcessor:
     @staticmethod
     def _read_permissive(file_path: str) -> pd.DataFrame:
         """
-        Read ARFF file line by line - keeps ALL values exactly as they are
+        Read ARFF file - keeps ALL values exactly as they are
         No automatic conversion to NaN
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            # Trouver @DATA et extraire les attributs
-            data_start = None
-            attributes = []
-            
-            for i, line in enumerate(lines):
-                line = line.strip()
-                
-                # Ignorer commentaires et lignes vides
-                if line.startswith('%') or not line:
-                    continue
-                
-                # Extraire les attributs
-                if line.upper().startswith('@ATTRIBUTE'):
-                    parts = line.split(None, 2)
-                    if len(parts) >= 3:
-                        attr_name = parts[1].strip("'\"")
-                        attr_type = parts[2].strip()
-                        attributes.append({
-                            'name': attr_name,
-                            'type': attr_type
-                        })
-                
-                # Marquer le début des données
-                elif line.upper() == '@DATA':
-                    data_start = i + 1
-                    break
-            
-            if data_start is None:
-                raise ValueError("No @DATA section found")
-            
-            if not attributes:
-                raise ValueError("No @ATTRIBUTE declarations found")
+            attributes, data_offset = ARFFProcessor._read_header(file_path)
             
             column_names = [attr['name'] for attr in attributes]
             logger.info(f"Found {len(attributes)} attributes: {column_names}")
             
-            # Lire les données
-            data_lines = []
-            for line in lines[data_start:]:
-                line = line.strip()
-                if line and not line.startswith('%'):
-                    data_lines.append(line)
+            # Section @DATA : tokenizer C de pandas, tout en chaînes
+            with open(file_path, 'rb') as f:
+                stream = _DataSectionStream(f, data_offset)
+                df = ARFFProcessor._parse_data(stream, column_names,
+                                                numeric_names=ARFFProcessor._numeric_attributes(attributes))
             
-            logger.info(f"Found {len(data_lines)} data lines")
-            
-            # Parser les données
-            rows = []
-            for line_num, line in enumerate(data_lines, start=data_start + 1):
-                try:
-                    # Parser en gérant les guillemets
-                    values = []
-                    current_value = ""
-                    in_quotes = False
-                    
-                    for char in line:
-                        if char == "'" or char == '"':
-                            in_quotes = not in_quotes
-                        elif char == ',' and not in_quotes:
-                            values.append(current_value.strip().strip("'\""))
-                            current_value = ""
-                        else:
-                            current_value += char
-                    
-                    # Dernière valeur
-                    if current_value:
-                        values.append(current_value.strip().strip("'\""))
-                    
-                    # ✅ IMPORTANT : Garder TOUTES les valeurs telles quelles
-                    # Ne PAS convertir ?, ??, !!, etc. en NaN
-                    # L'utilisateur les marquera comme missing manuellement
-                    
-                    rows.append(values)
-                    
-                except Exception as e:
-                    logger.warning(f"Error parsing line {line_num}: {e}")
-                    continue
-            
-            # Créer le DataFrame
-            df = pd.DataFrame(rows, columns=column_names)
+            df = ARFFProcessor._clean_values(df, stream.needs_strip)
+            logger.info(f"Found {len(df)} data lines")
             
             # Inférer les types SANS remplacer les valeurs
-            for i, attr in enumerate(attributes):
-                col_name = attr['name']
-                attr_type = attr['type'].lower()
-                
-                try:
-                    if 'numeric' in attr_type or 'real' in attr_type or 'integer' in attr_type:
-                        # ✅ Convertir en numérique MAIS garder les non-numériques comme NaN
-                        # errors='coerce' : les valeurs non numériques deviennent NaN
-                        # MAIS on veut garder les strings !
-                        
-                        # Solution : créer une copie pour tester
-                        test_col = pd.to_numeric(df[col_name], errors='coerce')
-                        
-                        # Si TOUTES les valeurs sont convertibles, c'est numérique pur
-                        # Sinon, garder comme string pour que l'utilisateur voie les "!!"
-                        if test_col.notna().sum() > len(df) * 0.9:  # 90% sont numériques
-                            df[col_name] = test_col
-                        # Sinon on garde comme string
-                        
-                    elif 'date' in attr_type:
-                        df[col_name] = pd.to_datetime(df[col_name], errors='coerce')
-                    
-                    # Nominal values = garder comme string
-                    
-                except Exception as e:
-                    logger.warning(f"Could not convert {col_name}: {e}")
+            df = ARFFProcessor._convert_types(df, attributes)
             
             logger.info(f"✅ Read ARFF: {len(df)} rows, {len(df.columns)} columns")
             
@@ -154,6 +158,216 @@ class ARFFProcessor:
             traceback.print_exc()
             raise
     
+    @staticmethod
+    def iter_chunks(file_path: str, chunksize: int = PROFILE_CHUNK_ROWS, columns: List[str] = None) -> Iterator[pd.DataFrame]:
+        """Read the @DATA section as successive DataFrames of at most `chunksize` rows"""
+        attributes, data_offset = ARFFProcessor._read_header(file_path)
+        column_names = [attr['name'] for attr in attributes]
+        
+        # La règle des 90% porte sur tout le fichier : décision prise une fois,
+        # mémorisée dans les métadonnées de l'index
+        numeric_columns = ARFFProcessor.ensure_row_index(file_path).meta['numeric_columns']
+        
+        with open(file_path, 'rb') as f:
+            stream = _DataSectionStream(f, data_offset)
+            with ARFFProcessor._parse_data(stream, column_names, chunksize=chunksize,
+                                           numeric_names=numeric_columns) as reader:
+                for chunk in reader:
+                    chunk = ARFFProcessor._clean_values(chunk, stream.needs_strip)
+                    chunk = ARFFProcessor._convert_types(chunk, attributes, numeric_columns)
+                    yield chunk[columns] if columns else chunk
+    
+    @staticmethod
+    def profile(file_path: str, columns: List[str] = None, **profiler_kwargs) -> DatasetProfiler:
+        """Profile the ARFF file in a single streaming pass, memory bounded by the chunk size"""
+        return DatasetProfiler.from_chunks(
+            ARFFProcessor.iter_chunks(file_path, columns=columns),
+            **profiler_kwargs
+        )
+    
+    @staticmethod
+    def _parse_data(stream, column_names: List[str], chunksize: int = None, numeric_names: List[str] = ()):
+        """
+        Tokenize @DATA rows with the C parser
+        
+        Values are kept as strings, except for `numeric_names` whose type is
+        inferred by the parser: a clean numeric column comes back as numbers,
+        one holding "?" or "!!" comes back as strings for _convert_types.
+        low_memory=False makes the inference cover the whole read (or chunk),
+        never a mix of numbers and strings in one column.
+        """
+        dtype = {name: str for name in column_names + [EXTRA_COLUMN] if name not in numeric_names}
+        
+        # Colonne supplémentaire : absorbe la virgule finale que l'ancien parseur ignorait
+        try:
+            return pd.read_csv(
+                io.BufferedReader(stream, buffer_size=DATA_BLOCK_SIZE),
+                header=None,
+                names=column_names + [EXTRA_COLUMN],
+                index_col=False,
+                dtype=dtype,
+                na_filter=False,
+                keep_default_na=False,
+                quotechar=stream.quotechar,
+                skipinitialspace=True,
+                skip_blank_lines=True,
+                on_bad_lines='warn',
+                encoding='utf-8',
+                engine='c',
+                low_memory=False,
+                chunksize=chunksize
+            )
+        except pd.errors.EmptyDataError:
+            # Section @DATA vide (ou page au-delà de la fin)
+            empty = pd.DataFrame(columns=column_names + [EXTRA_COLUMN], dtype=str)
+            return empty if chunksize is None else nullcontext(iter([]))
+    
+    @staticmethod
+    def _clean_values(df: pd.DataFrame, needs_strip: bool) -> pd.DataFrame:
+        """Strip spaces / quotes like the old line parser (rows with extra values are kept)"""
+        extra = df.pop(EXTRA_COLUMN)
+        too_long = extra.notna() & (extra != '')
+        if too_long.any():
+            # Ligne conservée : seules les valeurs au-delà des attributs déclarés sont ignorées
+            logger.warning(f"⚠️ Ignoring extra values on {int(too_long.sum())} data lines")
+        
+        # Seulement si la section contient des espaces ou guillemets à retirer
+        if needs_strip:
+            for col in df.columns:
+                if df[col].dtype == object:
+                    df[col] = df[col].str.strip().str.strip("'\"")
+        
+        return df
+    
+    @staticmethod
+    def _convert_types(df: pd.DataFrame, attributes: List[Dict[str, str]],
+                       numeric_columns: List[str] = None) -> pd.DataFrame:
+        """
+        Convert numeric and date attributes
+        
+        A numeric attribute is converted only if more than 90% of its values are
+        numbers, otherwise the strings are kept so the user sees the "!!".
+        `numeric_columns` forces the decision (taken on the whole file) for chunks.
+        """
+        for attr in attributes:
+            col_name = attr['name']
+            attr_type = attr['type'].lower()
+            
+            try:
+                if 'numeric' in attr_type or 'real' in attr_type or 'integer' in attr_type:
+                    # errors='coerce' : les valeurs non numériques deviennent NaN
+                    # MAIS on veut garder les strings ! -> tester sur une copie
+                    test_col = pd.to_numeric(df[col_name], errors='coerce')
+                    
+                    if numeric_columns is not None:
+                        if col_name in numeric_columns:
+                            df[col_name] = test_col
+                    elif test_col.notna().sum() > len(df) * 0.9:  # 90% sont numériques
+                        df[col_name] = test_col
+                    # Sinon on garde comme string
+                    
+                elif 'date' in attr_type:
+                    df[col_name] = pd.to_datetime(df[col_name], errors='coerce')
+                
+                # Nominal values = garder comme string
+                
+            except Exception as e:
+                logger.warning(f"Could not convert {col_name}: {e}")
+        
+        return df
+    
+    @staticmethod
+    def _numeric_attributes(attributes: List[Dict[str, str]]) -> List[str]:
+        """Names of the attributes declared NUMERIC / REAL / INTEGER"""
+        return [
+            attr['name'] for attr in attributes
+            if any(t in attr['type'].lower() for t in ('numeric', 'real', 'integer'))
+        ]
+    
+    @staticmethod
+    def _read_header(file_path: str) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Parse the ARFF header - returns the attributes and the byte offset
+        of the first line after @DATA
+        """
+        attributes = []
+        offset = 0
+        
+        with open(file_path, 'rb') as f:
+            for raw_line in f:
+                offset += len(raw_line)
+                line = raw_line.decode('utf-8').strip()
+                
+                # Ignorer commentaires et lignes vides
+                if line.startswith('%') or not line:
+                    continue
+                
+                # Extraire les attributs
+                if line.upper().startswith('@ATTRIBUTE'):
+                    parts = line.split(None, 2)
+                    if len(parts) >= 3:
+                        attr_name = parts[1].strip("'\"")
+                        attr_type = parts[2].strip()
+                        attributes.append({
+                            'name': attr_name,
+                            'type': attr_type
+                        })
+                
+                # Marquer le début des données
+                elif line.upper() == '@DATA':
+                    if not attributes:
+                        raise ValueError("No @ATTRIBUTE declarations found")
+                    return attributes, offset
+        
+        raise ValueError("No @DATA section found")
+    
+    @staticmethod
+    def ensure_row_index(file_path: str) -> RowIndex:
+        """Load (or build on first access) the byte-offset row index of the @DATA section"""
+        _, data_offset = ARFFProcessor._read_header(file_path)
+        return RowIndex.load_or_build(
+            file_path,
+            variant='rowindex-arff',
+            meta_factory=lambda: ARFFProcessor._describe_types(file_path),
+            data_start=data_offset,
+            quote=None,
+            comment='%'
+        )
+    
+    @staticmethod
+    def _describe_types(file_path: str) -> Dict[str, Any]:
+        """Column names and the type conversions applied by a full read"""
+        # La règle des 90% numériques dépend de tout le fichier : on la fige
+        # à la construction de l'index pour que chaque page et chaque bloc la respecte.
+        # Un passage en streaming sur les valeurs brutes suffit à compter.
+        attributes, data_offset = ARFFProcessor._read_header(file_path)
+        column_names = [attr['name'] for attr in attributes]
+        numeric_attributes = ARFFProcessor._numeric_attributes(attributes)
+        
+        rows = 0
+        numeric_counts = {name: 0 for name in numeric_attributes}
+        
+        with open(file_path, 'rb') as f:
+            stream = _DataSectionStream(f, data_offset)
+            quotechar = stream.quotechar
+            with ARFFProcessor._parse_data(stream, column_names, chunksize=PROFILE_CHUNK_ROWS,
+                                           numeric_names=numeric_attributes) as reader:
+                for chunk in reader:
+                    chunk = ARFFProcessor._clean_values(chunk, stream.needs_strip)
+                    rows += len(chunk)
+                    for name in numeric_attributes:
+                        numeric_counts[name] += int(pd.to_numeric(chunk[name], errors='coerce').notna().sum())
+        
+        return {
+            'columns': column_names,
+            'numeric_columns': [name for name, count in numeric_counts.items() if count > rows * 0.9],
+            'date_columns': [
+                attr['name'] for attr in attributes
+                if 'date' in attr['type'].lower() and attr['name'] not in numeric_counts
+            ],
+            'quotechar': quotechar
+        }
+    
     @staticmethod
     def write(df: pd.DataFrame, file_path: str) -> None:
         """Write DataFrame to file"""
@@ -168,17 +382,25 @@ class ARFFProcessor:
     @staticmethod
     def get_preview(file_path: str, limit: int = 100, offset: int = 0) -> Tuple[List[Dict], int, List[str]]:
         """Get preview of data"""
+        preview_df, total_rows, columns = ARFFProcessor.get_preview_frame(file_path, limit, offset)
+        return frame_to_records(preview_df), total_rows, columns
+    
+    @staticmethod
+    def get_preview_frame(file_path: str, limit: int = 100, offset: int = 0) -> Tuple[pd.DataFrame, int, List[str]]:
+        """Get a preview page as a DataFrame (total rows and columns included)"""
         try:
-            df = ARFFProcessor.read(file_path)
-            total_rows = len(df)
-            
-            preview_df = df.iloc[offset:offset + limit]
-            records = preview_df.to_dict('records')
+            # Ne lire que les lignes de la page via l'index d'offsets
+            index = ARFFProcessor.ensure_row_index(file_path)
+            columns = index.meta['columns']
             
-            from app.utils import clean_records_for_json
-            clean_data = clean_records_for_json(records)
+            attributes, _ = ARFFProcessor._read_header(file_path)
+            stream = _DataSectionStream(io.BytesIO(index.read_rows(offset, limit)), 0, index.meta.get('quotechar'))
+            preview_df = ARFFProcessor._parse_data(stream, columns,
+                                                    numeric_names=index.meta.get('numeric_columns', []))
+            preview_df = ARFFProcessor._clean_values(preview_df, stream.needs_strip)
+            preview_df = ARFFProcessor._convert_types(preview_df, attributes, index.meta.get('numeric_columns', []))
             
-            return clean_data, total_rows, df.columns.tolist()
+            return preview_df, index.total_rows, columns
             
         except Exception as e:
             logger.error(f"Error getting preview: {e}")
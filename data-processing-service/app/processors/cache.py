@@ -0,0 +1,285 @@
+"""
+Columnar sidecar cache for dataset files
+
+Every parsed dataset is written once to a Feather (Arrow IPC) file keyed on
+the source path, size and mtime. Later reads of the same, unchanged file load
+the sidecar instead of re-parsing the text, and a changed file simply gets a
+new key, so stale sidecars are never served.
+
+In front of the sidecars, a process-wide LRU keeps recently parsed
+DataFrames in memory within a byte budget, so back-to-back requests on the
+same dataset skip the read entirely.
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.warning("pyarrow not installed. Columnar cache disabled. Install with: pip install pyarrow")
+
+
+CACHE_DIR = os.getenv('COLUMNAR_CACHE_DIR', '/app/cache/columnar')
+CACHE_ENABLED = os.getenv('COLUMNAR_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# 'uncompressed' permet un memory-map sans copie ; 'lz4' / 'zstd' réduisent la taille disque
+CACHE_COMPRESSION = os.getenv('COLUMNAR_CACHE_COMPRESSION', 'uncompressed')
+# Budget mémoire du cache de DataFrames (0 le désactive)
+FRAME_CACHE_MAX_MB = int(os.getenv('FRAME_CACHE_MAX_MB', '512'))
+
+SIDECAR_SUFFIX = '.feather'
+SKIP_SUFFIX = '.skip'
+
+
+def file_signature(file_path: str) -> Tuple[str, int, int]:
+    """Return (absolute path, size, mtime_ns) - raises FileNotFoundError if missing"""
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+
+def sidecar_key(file_path: str, variant: str = 'default') -> str:
+    """Stable key for a source file read with a given reader variant"""
+    abs_path = os.path.abspath(file_path)
+    return hashlib.sha1(f"{abs_path}|{variant}".encode('utf-8')).hexdigest()[:20]
+
+
+def sidecar_path(file_path: str, variant: str = 'default', suffix: str = SIDECAR_SUFFIX) -> str:
+    """Path of the sidecar for the current version of the source file"""
+    _, size, mtime_ns = file_signature(file_path)
+    key = sidecar_key(file_path, variant)
+    return os.path.join(CACHE_DIR, f"{key}_{size}_{mtime_ns}{suffix}")
+
+
+def purge_stale_sidecars(file_path: str, variant: str, keep: str) -> None:
+    """Remove sidecars left over from previous versions of the source file"""
+    prefix = sidecar_key(file_path, variant) + '_'
+    try:
+        for name in os.listdir(CACHE_DIR):
+            path = os.path.join(CACHE_DIR, name)
+            if name.startswith(prefix) and path != keep and not name.endswith('.tmp'):
+                os.remove(path)
+    except OSError as e:
+        logger.debug(f"Could not purge stale sidecars for {file_path}: {e}")
+
+
+def write_sidecar(file_path: str, df: pd.DataFrame, variant: str = 'default', path: str = None) -> bool:
+    """Write the columnar sidecar of a parsed file, returns True on success"""
+    if not (CACHE_ENABLED and PYARROW_AVAILABLE):
+        return False
+
+    # Le chemin peut être calculé avant la lecture pour ne pas associer
+    # le contenu lu à une version plus récente du fichier
+    path = path or sidecar_path(file_path, variant)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        feather.write_feather(df, tmp_path, compression=CACHE_COMPRESSION)
+        os.replace(tmp_path, path)
+        purge_stale_sidecars(file_path, variant, keep=path)
+        logger.info(f"💾 Columnar sidecar written for {file_path}")
+        return True
+
+    except Exception as e:
+        # Colonnes à types mixtes, index non standard, disque plein...
+        # On retient l'échec pour ne pas retenter à chaque lecture
+        logger.warning(f"⚠️ Could not write columnar sidecar for {file_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            skip_path = path[:-len(SIDECAR_SUFFIX)] + SKIP_SUFFIX
+            open(skip_path, 'w').close()
+            purge_stale_sidecars(file_path, variant, keep=skip_path)
+        except OSError:
+            pass
+        return False
+
+
+def read_sidecar(file_path: str, variant: str = 'default'):
+    """Load the sidecar of the current file version, or None if there is none"""
+    if not (CACHE_ENABLED and PYARROW_AVAILABLE):
+        return None
+
+    path = sidecar_path(file_path, variant)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        table = feather.read_table(path, memory_map=True)
+        return table.to_pandas()
+    except Exception as e:
+        logger.warning(f"⚠️ Corrupted sidecar {path}, rebuilding: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+
+def read_sidecar_slice(file_path: str, variant: str, offset: int, limit: int):
+    """
+    Read rows [offset, offset + limit) from the sidecar of the current file version
+
+    Returns (page DataFrame, total rows) or None if there is no sidecar. The
+    file is memory-mapped, so only the requested page is converted to pandas.
+    """
+    if not (CACHE_ENABLED and PYARROW_AVAILABLE):
+        return None
+
+    path = sidecar_path(file_path, variant)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        table = feather.read_table(path, memory_map=True)
+        return table.slice(offset, max(limit, 0)).to_pandas(), table.num_rows
+    except Exception as e:
+        logger.warning(f"⚠️ Could not slice sidecar {path}: {e}")
+        return None
+
+
+class FrameCache:
+    """
+    Process-wide LRU cache of parsed DataFrames with a memory budget
+
+    Entries are keyed on (absolute path, size, mtime_ns, reader variant), so a
+    modified file is never served from memory. Callers always get their own
+    copy: a lazy one when pandas copy-on-write mode is enabled, a deep one
+    otherwise, so mutating a returned frame never corrupts the cached one.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[Tuple, Tuple[pd.DataFrame, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(file_path: str, variant: str = 'default') -> Tuple:
+        abs_path, size, mtime_ns = file_signature(file_path)
+        return abs_path, size, mtime_ns, variant
+
+    @staticmethod
+    def _handout(df: pd.DataFrame) -> pd.DataFrame:
+        return df.copy(deep=not pd.options.mode.copy_on_write)
+
+    def get(self, file_path: str, variant: str = 'default') -> Optional[pd.DataFrame]:
+        """Return a copy of the cached frame of the current file version, or None"""
+        if not self.enabled:
+            return None
+
+        key = self.key(file_path, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        return self._handout(entry[0])
+
+    def put(self, file_path: str, variant: str, df: pd.DataFrame, key: Tuple = None) -> pd.DataFrame:
+        """
+        Cache a parsed frame and return the caller's copy of it
+
+        `key` can be computed before the read, so the frame is never associated
+        with a version of the file written while it was being parsed.
+        """
+        if not self.enabled:
+            return df
+
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            logger.info(f"DataFrame of {file_path} ({nbytes / 1e6:.1f} MB) exceeds the frame cache budget")
+            return df
+
+        key = key or self.key(file_path, variant)
+        with self._lock:
+            # Les versions précédentes du même fichier ne seront plus jamais lues
+            for stale in [k for k in self._entries if k[0] == key[0] and k[3] == variant and k != key]:
+                self._discard(stale)
+
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (df, nbytes)
+            self.current_bytes += nbytes
+
+            while self.current_bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+        return self._handout(df)
+
+    def _discard(self, key: Tuple) -> None:
+        _, nbytes = self._entries.pop(key)
+        self.current_bytes -= nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+frame_cache = FrameCache(FRAME_CACHE_MAX_MB * 1024 * 1024)
+
+
+def read_cached(file_path: str, loader: Callable[[str], pd.DataFrame], variant: str = 'default') -> pd.DataFrame:
+    """
+    Read a dataset through the in-memory frame cache and its columnar sidecar
+
+    Falls back to `loader(file_path)` when there is no valid sidecar for the
+    current version of the file, then writes one for the next read.
+    """
+    df = frame_cache.get(file_path, variant)
+    if df is not None:
+        logger.info(f"⚡ Loaded {file_path} from frame cache")
+        return df
+
+    key = frame_cache.key(file_path, variant)
+
+    if not (CACHE_ENABLED and PYARROW_AVAILABLE):
+        return frame_cache.put(file_path, variant, loader(file_path), key=key)
+
+    df = read_sidecar(file_path, variant)
+    if df is not None:
+        logger.info(f"⚡ Loaded {file_path} from columnar sidecar")
+        return frame_cache.put(file_path, variant, df, key=key)
+
+    path = sidecar_path(file_path, variant)
+    df = loader(file_path)
+
+    if not os.path.exists(path[:-len(SIDECAR_SUFFIX)] + SKIP_SUFFIX):
+        write_sidecar(file_path, df, variant, path=path)
+
+    return frame_cache.put(file_path, variant, df, key=key)
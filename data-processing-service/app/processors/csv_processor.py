@@ -1,9 +1,17 @@
+import io
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Tuple
+from typing import Dict, Iterator, List, Any, Tuple
 from ..models import DataType
 import logging
-from ..utils import clean_records_for_json
+from ..utils import frame_to_records
+from ..preprocessing.analyzer import DatasetProfiler, PROFILE_CHUNK_ROWS
+from ..preprocessing.parallel import map_column_groups
+from ..preprocessing.stats import NumericStats, describe
+from ..preprocessing.sketches import APPROX_STATS_ROW_THRESHOLD, approx_distinct, sample_values
+from .cache import read_cached
+from .row_index import RowIndex
+from .dialect import fallback_dialect, get_dialect, read_csv_kwargs
 logger = logging.getLogger(__name__)
 
 
@@ -14,43 +22,70 @@ class CSVProcessor:
     def read(file_path: str, sample_size: int = None) -> pd.DataFrame:
         """Read CSV file and return DataFrame"""
         try:
-            # Try to read with different encodings
-            encodings = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
+            if sample_size:
+                return CSVProcessor._read_csv(file_path, nrows=sample_size)
             
-            for encoding in encodings:
-                try:
-                    if sample_size:
-                        df = pd.read_csv(file_path, encoding=encoding, nrows=sample_size)
-                    else:
-                        df = pd.read_csv(file_path, encoding=encoding)
-                    logger.info(f"Successfully read CSV with encoding: {encoding}")
-                    return df
-                except UnicodeDecodeError:
-                    continue
-            
-            # If all encodings fail, try with error handling
-            df = pd.read_csv(file_path, encoding='utf-8', errors='replace')
-            return df
+            # Lecture complète : passer par le sidecar colonnaire
+            return read_cached(file_path, CSVProcessor._read_csv, variant='csv')
             
         except Exception as e:
             logger.error(f"Error reading CSV file: {e}")
             raise
     
+    @staticmethod
+    def _read_csv(file_path: str, nrows: int = None) -> pd.DataFrame:
+        """Parse the CSV text with its detected encoding and dialect"""
+        dialect = get_dialect(file_path)
+        
+        try:
+            return pd.read_csv(file_path, nrows=nrows, **read_csv_kwargs(dialect))
+        except UnicodeDecodeError:
+            # Octets invalides après l'échantillon de détection : une seule relecture
+            dialect = fallback_dialect(file_path, dialect)
+            return pd.read_csv(file_path, nrows=nrows, **read_csv_kwargs(dialect))
+    
     @staticmethod
     def get_preview(file_path: str, limit: int = 100, offset: int = 0) -> Tuple[List[Dict], int, List[str]]:
         """Get preview data from CSV"""
-        df = CSVProcessor.read(file_path)
-        total_rows = len(df)
+        preview_df, total_rows, columns = CSVProcessor.get_preview_frame(file_path, limit, offset)
         
-        # Apply pagination
-        preview_df = df.iloc[offset:offset + limit]
+        # Conversion JSON colonne par colonne
+        return frame_to_records(preview_df), total_rows, columns
+    
+    @staticmethod
+    def get_preview_frame(file_path: str, limit: int = 100, offset: int = 0) -> Tuple[pd.DataFrame, int, List[str]]:
+        """Get a preview page as a DataFrame (total rows and columns included)"""
+        # L'index d'offsets permet de ne lire que les octets de la page demandée
+        index = CSVProcessor.ensure_row_index(file_path)
+        columns = index.meta['columns']
         
-        # Convert to dict and clean for JSON
-        records = preview_df.to_dict('records')
-        cleaned_records = clean_records_for_json(records)
-        columns = df.columns.tolist()
+        page = index.read_rows(offset, limit)
+        preview_df = CSVProcessor._parse_rows(page, columns, get_dialect(file_path))
         
-        return cleaned_records, total_rows, columns
+        return preview_df, index.total_rows, columns
+    
+    @staticmethod
+    def ensure_row_index(file_path: str) -> RowIndex:
+        """Load (or build on first access) the byte-offset row index of a CSV file"""
+        dialect = get_dialect(file_path)
+        return RowIndex.load_or_build(
+            file_path,
+            variant='rowindex-csv',
+            meta_factory=lambda: {'columns': CSVProcessor._read_csv(file_path, nrows=0).columns.tolist()},
+            header_rows=1 if dialect['header'] else 0,
+            quote=dialect['quotechar']
+        )
+    
+    @staticmethod
+    def _parse_rows(data: bytes, columns: List[str], dialect: Dict) -> pd.DataFrame:
+        """Parse raw CSV rows (without header) read through the row index"""
+        if not data:
+            return pd.DataFrame(columns=columns)
+        
+        kwargs = read_csv_kwargs(dialect, with_header=False)
+        # La page peut contenir des octets au-delà de l'échantillon de détection
+        kwargs['encoding_errors'] = 'replace'
+        return pd.read_csv(io.BytesIO(data), header=None, names=columns, index_col=False, **kwargs)
 
     
     @staticmethod
@@ -115,13 +150,8 @@ class CSVProcessor:
         # Add statistics based on data type
         if data_type == DataType.NUMERICAL and len(non_null) > 0:
             try:
-                column_info.mean = round(float(non_null.mean()), 4)
-                column_info.std = round(float(non_null.std()), 4)
-                column_info.min = round(float(non_null.min()), 4)
-                column_info.max = round(float(non_null.max()), 4)
-                column_info.median = round(float(non_null.median()), 4)
-                column_info.q25 = round(float(non_null.quantile(0.25)), 4)
-                column_info.q75 = round(float(non_null.quantile(0.75)), 4)
+                for key, value in describe(non_null).summary(decimals=4).items():
+                    setattr(column_info, key, value)
             except Exception as e:
                 logger.warning(f"Could not compute statistics for {column_name}: {e}")
         
@@ -134,27 +164,41 @@ class CSVProcessor:
     
     @staticmethod
     def analyze_dataframe(df: pd.DataFrame) -> List:
-        """Analyze entire DataFrame and return column information (méthode originale)"""
-        columns_info = []
+        """Analyze entire DataFrame and return column information (one pass per column)"""
+        # Statistiques exactes jusqu'au seuil d'approximation, sketches au-delà
+        profiler = DatasetProfiler()
+        profiler.update(df)
+        return profiler.columns_info()
+    
+    @staticmethod
+    def iter_chunks(file_path: str, chunksize: int = PROFILE_CHUNK_ROWS, columns: List[str] = None,
+                    dialect: Dict = None) -> Iterator[pd.DataFrame]:
+        """Read the CSV file as successive DataFrames of at most `chunksize` rows"""
+        dialect = dialect or get_dialect(file_path)
+        with pd.read_csv(file_path, chunksize=chunksize, usecols=columns, **read_csv_kwargs(dialect)) as reader:
+            for chunk in reader:
+                yield chunk
+    
+    @staticmethod
+    def profile(file_path: str, columns: List[str] = None, **profiler_kwargs) -> DatasetProfiler:
+        """Profile the CSV file in a single streaming pass, memory bounded by the chunk size"""
+        dialect = get_dialect(file_path)
         
-        for column in df.columns:
-            try:
-                col_info = CSVProcessor.analyze_column(df[column], column)
-                columns_info.append(col_info)
-            except Exception as e:
-                logger.error(f"Error analyzing column {column}: {e}")
-                from ..models import ColumnInfo
-                # Add basic info even if analysis fails
-                columns_info.append(ColumnInfo(
-                    name=column,
-                    data_type=DataType.TEXT,
-                    missing_count=0,
-                    missing_percentage=0.0,
-                    unique_count=0,
-                    sample_values=[]
-                ))
-        
-        return columns_info
+        try:
+            profiler = DatasetProfiler.from_chunks(
+                CSVProcessor.iter_chunks(file_path, columns=columns, dialect=dialect),
+                **profiler_kwargs
+            )
+        except UnicodeDecodeError:
+            # L'erreur peut survenir après plusieurs blocs : on recommence une seule fois
+            dialect = fallback_dialect(file_path, dialect)
+            profiler = DatasetProfiler.from_chunks(
+                CSVProcessor.iter_chunks(file_path, columns=columns, dialect=dialect),
+                **profiler_kwargs
+            )
+        
+        logger.info(f"Profiled CSV in streaming with encoding: {dialect['encoding']} ({profiler.rows_count} rows)")
+        return profiler
     
     # ========== NOUVELLES MÉTHODES POUR PREPROCESSING AVANCÉ ==========
     
@@ -181,21 +225,22 @@ class CSVProcessor:
         return is_missing
     
     @staticmethod
-    def detect_outliers_iqr(series: pd.Series, multiplier: float = 1.5) -> Dict[str, Any]:
+    def detect_outliers_iqr(series: pd.Series, multiplier: float = 1.5,
+                            stats: NumericStats = None) -> Dict[str, Any]:
         """
-        Detect outliers using IQR method
+        Detect outliers using IQR method (`stats`: precomputed statistics of the series)
         """
         # Only for numerical columns
         if not pd.api.types.is_numeric_dtype(series):
             return {'method': 'iqr', 'outliers_count': 0, 'outliers_indices': []}
         
-        non_null = series.dropna()
-        if len(non_null) == 0:
+        stats = stats or describe(series)
+        if stats.count == 0:
             return {'method': 'iqr', 'outliers_count': 0, 'outliers_indices': []}
         
-        Q1 = non_null.quantile(0.25)
-        Q3 = non_null.quantile(0.75)
-        IQR = Q3 - Q1
+        Q1 = stats.q25
+        Q3 = stats.q75
+        IQR = stats.iqr
         
         lower_bound = Q1 - multiplier * IQR
         upper_bound = Q3 + multiplier * IQR
@@ -216,19 +261,20 @@ class CSVProcessor:
         }
     
     @staticmethod
-    def detect_outliers_zscore(series: pd.Series, threshold: float = 3.0) -> Dict[str, Any]:
+    def detect_outliers_zscore(series: pd.Series, threshold: float = 3.0,
+                               stats: NumericStats = None) -> Dict[str, Any]:
         """
-        Detect outliers using Z-score method
+        Detect outliers using Z-score method (`stats`: precomputed statistics of the series)
         """
         if not pd.api.types.is_numeric_dtype(series):
             return {'method': 'zscore', 'outliers_count': 0, 'outliers_indices': []}
         
-        non_null = series.dropna()
-        if len(non_null) == 0:
+        stats = stats or describe(series)
+        if stats.count == 0:
             return {'method': 'zscore', 'outliers_count': 0, 'outliers_indices': []}
         
-        mean = non_null.mean()
-        std = non_null.std()
+        mean = stats.mean
+        std = stats.std
         
         if std == 0:
             return {'method': 'zscore', 'outliers_count': 0, 'outliers_indices': []}
@@ -282,9 +328,15 @@ class CSVProcessor:
     @staticmethod
     def analyze_column_advanced(series: pd.Series, column_name: str, 
                                custom_missing: List[str] = None,
-                               detect_outliers: bool = True) -> Dict[str, Any]:
+                               detect_outliers: bool = True,
+                               approx_threshold: int = APPROX_STATS_ROW_THRESHOLD) -> Dict[str, Any]:
         """
         Advanced column analysis with custom missing values and outlier detection
+        
+        Above `approx_threshold` valid values, the distinct count comes from a
+        HyperLogLog and the quartiles from a KLL sketch (flagged as approximate).
+        The data type and the value frequencies then come from a uniform sample,
+        so no value-count table of the whole column is built.
         """
         total_count = len(series)
         
@@ -307,10 +359,30 @@ class CSVProcessor:
         # Non-null values (excluding both standard and custom missing)
         valid_mask = ~(series.isna() | custom_missing_mask)
         non_null = series[valid_mask]
-        unique_count = len(non_null.unique())
         
-        # Infer data type
-        data_type = CSVProcessor.infer_data_type(non_null)
+        approximate = approx_threshold is not None and len(non_null) > approx_threshold
+        error_bounds = {}
+        if approximate:
+            distinct = approx_distinct(non_null)
+            unique_count = distinct.count()
+            error_bounds['unique_count_relative_error'] = round(distinct.relative_error, 4)
+            
+            # Type et fréquences sur un échantillon, les comptes ramenés à la colonne entière
+            sample = sample_values(series)
+            data_type = CSVProcessor.infer_data_type(sample_values(non_null))
+            if data_type in (DataType.BOOLEAN, DataType.CATEGORICAL) and unique_count >= 100:
+                # Valeurs rares absentes de l'échantillon : le HyperLogLog fait foi
+                data_type = DataType.TEXT
+            scale = len(series) / len(sample)
+            value_frequencies = {
+                value: int(round(count * scale))
+                for value, count in CSVProcessor.get_value_frequencies(sample).items()
+            }
+            error_bounds['value_frequencies_sample_rows'] = len(sample)
+        else:
+            unique_count = len(non_null.unique())
+            data_type = CSVProcessor.infer_data_type(non_null)
+            value_frequencies = CSVProcessor.get_value_frequencies(series)
         
         result = {
             'name': column_name,
@@ -322,34 +394,84 @@ class CSVProcessor:
             'missing_percentage': round(float(missing_percentage), 2),
             'unique_count': int(unique_count),
             'suspicious_values': [str(v) for v in suspicious_values],
-            'value_frequencies': CSVProcessor.get_value_frequencies(series)
+            'value_frequencies': value_frequencies
         }
         
+        # Statistiques calculées une seule fois, partagées par les détecteurs d'outliers
+        stats = None
+        if data_type == DataType.NUMERICAL and len(non_null) > 0:
+            try:
+                stats = describe(non_null, approx_threshold)
+                if stats.approximate:
+                    error_bounds['quantile_rank_error'] = round(stats.rank_error, 4)
+            except (TypeError, ValueError):
+                pass
+        
         # Outlier detection for numerical columns
         if detect_outliers and data_type == DataType.NUMERICAL and len(non_null) > 0:
             result['outliers'] = {
-                'iqr': CSVProcessor.detect_outliers_iqr(non_null),
-                'zscore': CSVProcessor.detect_outliers_zscore(non_null)
+                'iqr': CSVProcessor.detect_outliers_iqr(non_null, stats=stats),
+                'zscore': CSVProcessor.detect_outliers_zscore(non_null, stats=stats)
             }
         
         # Statistics for numerical columns
-        if data_type == DataType.NUMERICAL and len(non_null) > 0:
-            try:
-                result['statistics'] = {
-                    'mean': round(float(non_null.mean()), 4),
-                    'std': round(float(non_null.std()), 4),
-                    'min': round(float(non_null.min()), 4),
-                    'max': round(float(non_null.max()), 4),
-                    'median': round(float(non_null.median()), 4),
-                    'q25': round(float(non_null.quantile(0.25)), 4),
-                    'q75': round(float(non_null.quantile(0.75)), 4)
-                }
-            except:
-                pass
+        if stats is not None:
+            result['statistics'] = stats.summary(decimals=4)
         
         # Top values for categorical
         if data_type == DataType.CATEGORICAL and len(non_null) > 0:
             value_counts = non_null.value_counts().head(10)
             result['top_values'] = {str(k): int(v) for k, v in value_counts.items()}
         
-        return result
\ No newline at end of file
+        result['approximate'] = bool(error_bounds)
+        if error_bounds:
+            result['error_bounds'] = error_bounds
+        
+        return result
+    
+    @staticmethod
+    def analyze_column_configured(series: pd.Series, column_name: str, custom_missing: List[str],
+                                  detect_outliers: bool, valid_range: Tuple = None) -> Dict[str, Any]:
+        """
+        Advanced analysis of one column, plus range validation when a
+        (min, max) valid range is configured
+        """
+        analysis = CSVProcessor.analyze_column_advanced(series, column_name, custom_missing, detect_outliers)
+        
+        if valid_range is not None:
+            min_val, max_val = valid_range
+            range_info = CSVProcessor.detect_outliers_range(series, min_val=min_val, max_val=max_val)
+            
+            if 'outliers' not in analysis:
+                analysis['outliers'] = {}
+            analysis['outliers']['range'] = range_info
+            
+            # Add configured range to response
+            analysis['configured_range'] = {'min': min_val, 'max': max_val}
+        
+        return analysis
+    
+    @staticmethod
+    def _analyze_column_group(df: pd.DataFrame, column_options: List[Tuple]) -> List[Dict[str, Any]]:
+        """Analyze a group of columns (run in a worker process for wide datasets)"""
+        return [
+            CSVProcessor.analyze_column_configured(df.iloc[:, i], column, *options)
+            for i, (column, options) in enumerate(zip(df.columns, column_options))
+        ]
+    
+    @staticmethod
+    def analyze_columns_advanced(df: pd.DataFrame, column_options: List[Tuple],
+                                 workers: int = None) -> List[Dict[str, Any]]:
+        """
+        Advanced analysis of every column of `df`
+        
+        `column_options` holds one (custom_missing, detect_outliers, valid_range)
+        tuple per column. Wide and large frames are analysed column-parallel on
+        the shared process pool, the others serially.
+        """
+        return map_column_groups(
+            CSVProcessor._analyze_column_group,
+            df,
+            column_options,
+            workers=workers
+        )
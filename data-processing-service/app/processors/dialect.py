@@ -0,0 +1,325 @@
+"""
+One-shot encoding and dialect detection for CSV files
+
+The encoding, delimiter, quote char, header and decimal separator of a CSV
+file are detected once from a sample of its first bytes. The result is
+stored in `datasets.metadata['csv_dialect']` (and in process memory) with
+the size and mtime of the file, so every later read parses the file once
+with the right settings instead of retrying candidate encodings.
+"""
+import codecs
+import csv
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+from ..db import get_db_connection
+from .cache import file_signature
+
+logger = logging.getLogger(__name__)
+
+
+DIALECT_SAMPLE_BYTES = int(os.getenv('CSV_DIALECT_SAMPLE_KB', '1024')) * 1024
+DIALECT_PERSIST = os.getenv('CSV_DIALECT_PERSIST', 'true').lower() in ('1', 'true', 'yes')
+
+DELIMITERS = [',', ';', '\t', '|']
+# Encodage de repli : latin1 décode n'importe quelle suite d'octets
+FALLBACK_ENCODING = 'latin1'
+MAX_SAMPLE_ROWS = 500
+# Version de la détection : un dialecte enregistré par une version antérieure est redétecté
+DIALECT_VERSION = 2
+# Après un échec de connexion, la base n'est plus sollicitée pendant ce délai
+DB_RETRY_DELAY = 60
+
+NUMBER_PATTERN = re.compile(r'^[+-]?(\d+([.,]\d*)?|[.,]\d+)([eE][+-]?\d+)?$')
+COMMA_DECIMAL_PATTERN = re.compile(r'^[+-]?\d*,\d+$')
+DOT_DECIMAL_PATTERN = re.compile(r'^[+-]?\d*\.\d+$')
+
+
+def _detect_encoding(sample: bytes, complete: bool) -> str:
+    """utf-8 if the sample decodes as such, else cp1252 or latin1"""
+    try:
+        # Un échantillon tronqué peut couper un caractère multi-octets à la fin
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=complete)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    # Octets 0x80-0x9F : caractères Windows (€, guillemets...) plutôt que contrôles latin1
+    if re.search(rb'[\x80-\x9f]', sample):
+        try:
+            sample.decode('cp1252')
+            return 'cp1252'
+        except UnicodeDecodeError:
+            pass
+
+    return FALLBACK_ENCODING
+
+
+def _sample_rows(text: str, delimiter: str, quotechar: str) -> List[List[str]]:
+    reader = csv.reader(io.StringIO(text), delimiter=delimiter, quotechar=quotechar)
+    rows = []
+    try:
+        for row in reader:
+            if row:
+                rows.append(row)
+            if len(rows) >= MAX_SAMPLE_ROWS:
+                break
+    except csv.Error:
+        pass
+    return rows
+
+
+def _score_delimiter(rows: List[List[str]]):
+    """(consistency, field count) of the most frequent row width"""
+    if not rows:
+        return 0.0, 0
+    width, frequency = Counter(len(row) for row in rows).most_common(1)[0]
+    return frequency / len(rows), width
+
+
+def _is_number(value: str) -> bool:
+    return bool(NUMBER_PATTERN.match(value.strip()))
+
+
+def _value_kind(value: str) -> str:
+    value = value.strip()
+    return 'decimal' if re.search(r'[.,eE]', value) else 'integer'
+
+
+def _has_header(rows: List[List[str]]) -> bool:
+    """
+    Whether the first row is a header (csv.Sniffer.has_header-style check)
+
+    A first row that is not all numeric is a header. An all-numeric first row
+    (years, codes...) is still a header unless it looks like the rows below:
+    in every column where the later values share a kind (integer or decimal),
+    the first value has that kind and, for integers, a digit count within the
+    range of the later values. Without later rows the header is kept.
+    """
+    if len(rows) < 2 or not rows[0] or not all(_is_number(value) for value in rows[0]):
+        return True
+
+    first, later = rows[0], [row for row in rows[1:] if len(row) == len(rows[0])]
+    if not later:
+        return True
+
+    for col, value in enumerate(first):
+        column = [row[col] for row in later]
+        if not all(_is_number(other) for other in column):
+            # Colonne non numérique plus bas : la première ligne n'en fait pas partie
+            return True
+        kinds = {_value_kind(other) for other in column}
+        if len(kinds) > 1:
+            continue
+        kind = kinds.pop()
+        if _value_kind(value) != kind:
+            return True
+        if kind == 'integer':
+            lengths = [len(other.strip().lstrip('+-')) for other in column]
+            if not min(lengths) <= len(value.strip().lstrip('+-')) <= max(lengths):
+                return True
+    return False
+
+
+def detect_dialect(file_path: str, sample_bytes: int = DIALECT_SAMPLE_BYTES) -> Dict:
+    """Detect encoding, delimiter, quote char, header and decimal separator from a sample"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_bytes + 1)
+    complete = len(sample) <= sample_bytes
+    sample = sample[:sample_bytes]
+
+    encoding = _detect_encoding(sample, complete)
+    text = sample.decode(encoding, errors='replace')
+    if text.startswith('\ufeff'):
+        text = text[1:]
+    if not complete and '\n' in text:
+        # Ignorer la dernière ligne, probablement tronquée
+        text = text[:text.rindex('\n') + 1]
+
+    # Guillemet : celui deviné par le Sniffer, '"' par défaut
+    quotechar = '"'
+    try:
+        sniffed = csv.Sniffer().sniff(text[:64 * 1024], delimiters=''.join(DELIMITERS))
+        if sniffed.quotechar in ('"', "'") and text.count(sniffed.quotechar) > text.count('"'):
+            quotechar = sniffed.quotechar
+    except csv.Error:
+        pass
+
+    # Délimiteur : la largeur de ligne la plus régulière sur l'échantillon (',' à égalité)
+    delimiter = ','
+    best_score = None
+    for candidate in DELIMITERS:
+        consistency, width = _score_delimiter(_sample_rows(text, candidate, quotechar))
+        if width < 2 or consistency < 0.9:
+            continue
+        score = (consistency, width)
+        if best_score is None or score > best_score:
+            delimiter, best_score = candidate, score
+
+    rows = _sample_rows(text, delimiter, quotechar)
+
+    # Séparateur décimal : ',' seulement si le délimiteur le permet et qu'il domine
+    decimal = '.'
+    if delimiter != ',':
+        fields = [value.strip() for row in rows[1:] for value in row]
+        comma_count = sum(1 for value in fields if COMMA_DECIMAL_PATTERN.match(value))
+        dot_count = sum(1 for value in fields if DOT_DECIMAL_PATTERN.match(value))
+        if comma_count > dot_count:
+            decimal = ','
+
+    # En-tête : présent par défaut, absent seulement si la première ligne ressemble aux suivantes
+    header = _has_header(rows)
+    names = None if header else [f"column_{i + 1}" for i in range(len(rows[0]))]
+
+    _, size, mtime_ns = file_signature(file_path)
+    dialect = {
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'quotechar': quotechar,
+        'header': header,
+        'names': names,
+        'decimal': decimal,
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'version': DIALECT_VERSION
+    }
+    logger.info(f"🔎 CSV dialect detected for {file_path}: encoding={encoding}, "
+                f"delimiter={delimiter!r}, quotechar={quotechar!r}, header={header}, decimal={decimal!r}")
+    return dialect
+
+
+def _is_current(dialect: Optional[Dict], size: int, mtime_ns: int) -> bool:
+    return (bool(dialect) and dialect.get('size') == size and dialect.get('mtime_ns') == mtime_ns
+            and dialect.get('version') == DIALECT_VERSION)
+
+
+def _db_available() -> bool:
+    return DIALECT_PERSIST and time.monotonic() >= _db_retry_at
+
+
+def _db_failed(action: str, file_path: str, error: Exception) -> None:
+    global _db_retry_at
+    _db_retry_at = time.monotonic() + DB_RETRY_DELAY
+    logger.warning(f"⚠️ Could not {action} CSV dialect of {file_path}: {error}")
+
+
+def _load_persisted(file_path: str) -> Optional[Dict]:
+    if not _db_available():
+        return None
+    db = None
+    try:
+        db = get_db_connection()
+        cursor = db.cursor()
+        cursor.execute(
+            "SELECT metadata->'csv_dialect' FROM datasets WHERE file_path = %s AND metadata ? 'csv_dialect' LIMIT 1",
+            (file_path,)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] if row else None
+    except Exception as e:
+        _db_failed('load', file_path, e)
+        return None
+    finally:
+        if db is not None:
+            db.close()
+
+
+def save_dialect(file_path: str, dialect: Dict) -> None:
+    """Store the dialect in memory and in the metadata of the dataset(s) using the file"""
+    _, size, mtime_ns = file_signature(file_path)
+    _remember(file_path, size, mtime_ns, dialect)
+
+    if not _db_available():
+        return
+    db = None
+    try:
+        db = get_db_connection()
+        cursor = db.cursor()
+        cursor.execute(
+            """
+            UPDATE datasets
+            SET metadata = COALESCE(metadata, '{}'::jsonb) || jsonb_build_object('csv_dialect', %s::jsonb)
+            WHERE file_path = %s
+            """,
+            (json.dumps(dialect), file_path)
+        )
+        db.commit()
+        cursor.close()
+    except Exception as e:
+        # Le dialecte reste en mémoire : seule la réutilisation entre processus est perdue
+        _db_failed('persist', file_path, e)
+    finally:
+        if db is not None:
+            db.close()
+
+
+def get_dialect(file_path: str) -> Dict:
+    """Return the dialect of the current file version: memory, then database, then detection"""
+    abs_path, size, mtime_ns = file_signature(file_path)
+
+    with _known_dialects_lock:
+        dialect = _known_dialects.get(abs_path)
+        if _is_current(dialect, size, mtime_ns):
+            _known_dialects.move_to_end(abs_path)
+            return dialect
+
+    dialect = _load_persisted(file_path)
+    if _is_current(dialect, size, mtime_ns):
+        _remember(file_path, size, mtime_ns, dialect)
+        return dialect
+
+    dialect = detect_dialect(file_path)
+    save_dialect(file_path, dialect)
+    return dialect
+
+
+def fallback_dialect(file_path: str, dialect: Dict) -> Dict:
+    """
+    Switch a dialect to the fallback encoding after a decode error past the sample
+
+    The corrected dialect is persisted, so the file is never decoded twice again.
+    """
+    logger.warning(f"⚠️ {file_path} is not valid {dialect['encoding']} beyond the detection sample, "
+                   f"using {FALLBACK_ENCODING}")
+    dialect = dict(dialect, encoding=FALLBACK_ENCODING)
+    save_dialect(file_path, dialect)
+    return dialect
+
+
+def read_csv_kwargs(dialect: Dict, with_header: bool = True) -> Dict:
+    """pandas.read_csv arguments for a dialect (`with_header=False` for rows read without the header)"""
+    kwargs = {
+        'encoding': dialect['encoding'],
+        'sep': dialect['delimiter'],
+        'quotechar': dialect['quotechar'],
+        'decimal': dialect['decimal']
+    }
+    if with_header and not dialect['header']:
+        kwargs['header'] = None
+        kwargs['names'] = dialect['names']
+    return kwargs
+
+
+def _remember(file_path: str, size: int, mtime_ns: int, dialect: Dict) -> None:
+    abs_path = os.path.abspath(file_path)
+    with _known_dialects_lock:
+        _known_dialects[abs_path] = dict(dialect, size=size, mtime_ns=mtime_ns)
+        _known_dialects.move_to_end(abs_path)
+        if len(_known_dialects) > 256:
+            _known_dialects.popitem(last=False)
+
+
+_db_retry_at = 0.0
+
+# Dialectes déjà connus, par chemin absolu (validés par taille + mtime)
+_known_dialects: 'OrderedDict[str, Dict]' = OrderedDict()
+# Partagé par les threads des lanes process et preview
+_known_dialects_lock = threading.Lock()
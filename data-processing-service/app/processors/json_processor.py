@@ -1,36 +1,218 @@
 import pandas as pd
+import numpy as np
 import json
-from typing import Dict, List, Any, Tuple
+import re
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 from ..models import ColumnInfo
+from ..preprocessing.analyzer import DatasetProfiler, PROFILE_CHUNK_ROWS
+from .cache import read_cached, read_sidecar_slice
+from .row_index import RowIndex
+from ..utils import frame_to_records
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+JSON_BLOCK_SIZE = 1024 * 1024
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+_decoder = json.JSONDecoder()
+_NON_WHITESPACE = re.compile(r'\S')
+
+
+class _JSONTextBuffer:
+    """
+    Sliding text window over a JSON document
+
+    Only the part of the file that has not been decoded yet is kept; the
+    window grows (doubling) when a single value does not fit in it.
+    """
+    
+    def __init__(self, f):
+        self._f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+    
+    def fill(self) -> bool:
+        """Append the next block, dropping what was already consumed"""
+        if self.eof:
+            return False
+        data = self._f.read(max(JSON_BLOCK_SIZE, len(self.buf) - self.pos))
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+    
+    def peek(self) -> str:
+        """Move to the next non-whitespace character and return it ('' at end of file)"""
+        while True:
+            match = _NON_WHITESPACE.search(self.buf, self.pos)
+            if match:
+                self.pos = match.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+            if not self.fill():
+                return ''
+    
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Invalid JSON: expected '{char}'")
+        self.pos += 1
+    
+    def decode_value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # Un nombre en fin de fenêtre peut continuer dans le bloc suivant
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+    
+    def decode_objects(self) -> Optional[List]:
+        """
+        Decode, in a single json.loads call, the run of array elements up to
+        the last "}," of the window. Returns [] if there is none and None if
+        the cut does not fall between elements (nested objects).
+        """
+        cut = self.buf.rfind('},', self.pos)
+        if cut <= self.pos:
+            return []
+        try:
+            values = json.loads('[' + self.buf[self.pos:cut + 1] + ']')
+        except ValueError:
+            return None
+        self.pos = cut + 1
+        return values
+
+
+def _iter_array_batches(buffer: _JSONTextBuffer) -> Iterator[List]:
+    """Yield the elements of the array whose '[' was just consumed, in batches"""
+    if buffer.peek() == ']':
+        buffer.pos += 1
+        return
+    
+    bulk = True
+    while True:
+        batch = buffer.decode_objects() if bulk else None
+        if batch is None:
+            # Éléments imbriqués : décodage élément par élément
+            bulk = False
+        if batch:
+            yield batch
+        else:
+            yield [buffer.decode_value()]
+        
+        char = buffer.peek()
+        if char == ',':
+            buffer.pos += 1
+        elif char == ']':
+            buffer.pos += 1
+            return
+        else:
+            raise ValueError("Invalid JSON: expected ',' or ']' in array")
+
+
+def _iter_document_batches(f) -> Iterator:
+    """
+    Stream the records of a JSON document: the top-level list, or the list
+    under the 'data' (then 'records') key, or the object itself as a single
+    record. Yields lists of records, or a DataFrame for column-oriented data.
+    """
+    buffer = _JSONTextBuffer(f)
+    char = buffer.peek()
+    
+    if char == '[':
+        buffer.pos += 1
+        yield from _iter_array_batches(buffer)
+        
+    elif char == '{':
+        buffer.pos += 1
+        fields = {}
+        first = True
+        
+        while buffer.peek() != '}':
+            if not first:
+                buffer.expect(',')
+            first = False
+            
+            key = buffer.decode_value()
+            buffer.expect(':')
+            
+            # La liste de 'data' est lue au fil de l'eau, le reste du document est ignoré
+            if key == 'data' and buffer.peek() == '[':
+                buffer.pos += 1
+                yield from _iter_array_batches(buffer)
+                return
+            
+            fields[key] = buffer.decode_value()
+        
+        buffer.pos += 1
+        
+        # Try to find the data array
+        if 'data' in fields:
+            yield pd.DataFrame(fields['data'])
+        elif 'records' in fields:
+            records = fields['records']
+            yield records if isinstance(records, list) else pd.DataFrame(records)
+        else:
+            # Assume it's a single record
+            yield [fields]
+        
+    else:
+        raise ValueError("Unsupported JSON structure")
+    
+    if buffer.peek() != '':
+        raise ValueError("Invalid JSON: extra data after the document")
+
+
+def _iter_ndjson_batches(f) -> Iterator[List]:
+    """Stream the records of an NDJSON file (one JSON value per line), block by block"""
+    carry = b''
+    
+    while True:
+        raw = f.read(JSON_BLOCK_SIZE)
+        if raw:
+            data = carry + raw
+            cut = data.rfind(b'\n') + 1
+            block, carry = data[:cut], data[cut:]
+        else:
+            block, carry = carry, b''
+        
+        lines = [line for line in block.split(b'\n') if line.strip()]
+        if lines:
+            try:
+                # Toutes les lignes du bloc en un seul appel au décodeur C
+                yield json.loads(b'[' + b','.join(lines) + b']')
+            except ValueError:
+                records = []
+                for line in lines:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError as e:
+                        raise ValueError(f"Invalid NDJSON line {line[:80]!r}: {e}")
+                yield records
+        
+        if not raw:
+            return
+
+
 class JSONProcessor:
-    """Processor for JSON files"""
+    """Processor for JSON and NDJSON files"""
     
     @staticmethod
     def read(file_path: str, sample_size: int = None) -> pd.DataFrame:
         """Read JSON file and return DataFrame"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Handle different JSON structures
-            if isinstance(data, list):
-                df = pd.DataFrame(data)
-            elif isinstance(data, dict):
-                # Try to find the data array
-                if 'data' in data:
-                    df = pd.DataFrame(data['data'])
-                elif 'records' in data:
-                    df = pd.DataFrame(data['records'])
-                else:
-                    # Assume it's a single record
-                    df = pd.DataFrame([data])
-            else:
-                raise ValueError("Unsupported JSON structure")
+            df = read_cached(file_path, JSONProcessor._read_json, variant='json')
             
             if sample_size:
                 df = df.head(sample_size)
@@ -42,45 +224,128 @@ class JSONProcessor:
             logger.error(f"Error reading JSON file: {e}")
             raise
     
+    @staticmethod
+    def _read_json(file_path: str) -> pd.DataFrame:
+        """Parse the JSON document into a DataFrame, batch by batch"""
+        # Seuls les blocs colonnaires restent en mémoire, jamais tous les dicts
+        chunks = list(JSONProcessor.iter_chunks(file_path))
+        if not chunks:
+            return pd.DataFrame()
+        return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    
+    @staticmethod
+    def is_ndjson(file_path: str) -> bool:
+        """True for .ndjson/.jsonl files, or .json files holding one object per line"""
+        if file_path.lower().endswith(NDJSON_EXTENSIONS):
+            return True
+        
+        with open(file_path, 'rb') as f:
+            head = f.read(JSON_BLOCK_SIZE).lstrip()
+        
+        if not head.startswith(b'{'):
+            return False
+        first_line, _, rest = head.partition(b'\n')
+        try:
+            json.loads(first_line)
+        except ValueError:
+            return False
+        return rest.lstrip().startswith(b'{')
+    
+    @staticmethod
+    def iter_batches(file_path: str) -> Iterator:
+        """Stream the raw record batches of a JSON or NDJSON file"""
+        if JSONProcessor.is_ndjson(file_path):
+            with open(file_path, 'rb') as f:
+                yield from _iter_ndjson_batches(f)
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                yield from _iter_document_batches(f)
+    
+    @staticmethod
+    def iter_chunks(file_path: str, chunksize: int = PROFILE_CHUNK_ROWS, columns: List[str] = None) -> Iterator[pd.DataFrame]:
+        """Read the file as successive DataFrames of at most `chunksize` rows"""
+        pending = []
+        
+        def frame(records):
+            df = pd.DataFrame(records)
+            return df.reindex(columns=columns) if columns else df
+        
+        for batch in JSONProcessor.iter_batches(file_path):
+            if isinstance(batch, pd.DataFrame):
+                yield batch.reindex(columns=columns) if columns else batch
+                continue
+            
+            pending.extend(batch)
+            while len(pending) >= chunksize:
+                yield frame(pending[:chunksize])
+                del pending[:chunksize]
+        
+        if pending:
+            yield frame(pending)
+    
+    @staticmethod
+    def profile(file_path: str, columns: List[str] = None, **profiler_kwargs) -> DatasetProfiler:
+        """Profile the JSON file in a single streaming pass, memory bounded by the chunk size"""
+        return DatasetProfiler.from_chunks(
+            JSONProcessor.iter_chunks(file_path, columns=columns),
+            **profiler_kwargs
+        )
+    
+    @staticmethod
+    def ensure_row_index(file_path: str) -> Optional[RowIndex]:
+        """Byte-offset row index of an NDJSON file (None for a JSON document)"""
+        if not JSONProcessor.is_ndjson(file_path):
+            return None
+        
+        # Les chaînes JSON ne contiennent pas de saut de ligne brut : pas de quote
+        return RowIndex.load_or_build(
+            file_path,
+            variant='rowindex-ndjson',
+            meta_factory=lambda: {'columns': JSONProcessor._collect_columns(file_path)},
+            quote=None
+        )
+    
+    @staticmethod
+    def _collect_columns(file_path: str) -> List:
+        """Union of the record keys, in order of first appearance"""
+        columns = {}
+        for chunk in JSONProcessor.iter_chunks(file_path):
+            columns.update(dict.fromkeys(chunk.columns))
+        return list(columns)
+    
     @staticmethod
     def get_preview(file_path: str, limit: int = 100, offset: int = 0) -> Tuple[List[Dict], int, List[str]]:
         """Get preview data from JSON"""
-        df = JSONProcessor.read(file_path)
-        total_rows = len(df)
-        
-        # Apply pagination
-        preview_df = df.iloc[offset:offset + limit]
-        
-        # CORRECTION: Garder les valeurs originales
-        records = preview_df.to_dict('records')
-        
-        # Nettoyer seulement NaN/Infinity, garder les strings originales
-        cleaned_data = []
-        for row in records:
-            cleaned_row = {}
-            for key, value in row.items():
-                # Garder les strings comme "?", "-", "N/A"
-                if isinstance(value, str):
-                    cleaned_row[key] = value
-                # Nettoyer seulement les NaN/Infinity
-                elif isinstance(value, (float, np.floating)):
-                    if pd.isna(value) or np.isnan(value) or np.isinf(value):
-                        cleaned_row[key] = None
-                    else:
-                        cleaned_row[key] = float(value)
-                elif isinstance(value, (np.integer, np.int64, np.int32)):
-                    cleaned_row[key] = int(value)
-                elif isinstance(value, (np.bool_, bool)):
-                    cleaned_row[key] = bool(value)
-                elif value is None:
-                    cleaned_row[key] = None
-                else:
-                    cleaned_row[key] = value
-            cleaned_data.append(cleaned_row)
-        
-        columns = df.columns.tolist()
-        
-        return cleaned_data, total_rows, columns
+        preview_df, total_rows, columns = JSONProcessor.get_preview_frame(file_path, limit, offset)
+        
+        # Garder les valeurs originales ("?", "-", "N/A"...), seuls NaN / Infinity deviennent null
+        return frame_to_records(preview_df), total_rows, columns
+    
+    @staticmethod
+    def get_preview_frame(file_path: str, limit: int = 100, offset: int = 0) -> Tuple[pd.DataFrame, int, List[str]]:
+        """Get a preview page as a DataFrame (total rows and columns included)"""
+        # NDJSON : seules les lignes de la page sont lues, via l'index d'offsets
+        index = JSONProcessor.ensure_row_index(file_path)
+        
+        # Un document JSON n'est pas découpable par lignes : la page est lue
+        # dans le sidecar colonnaire (memory-mappé), construit au premier accès
+        page = None if index is not None else read_sidecar_slice(file_path, 'json', offset, limit)
+        
+        if index is not None:
+            lines = [line for line in index.read_rows(offset, limit).split(b'\n') if line.strip()]
+            records = json.loads(b'[' + b','.join(lines) + b']')
+            preview_df = pd.DataFrame(records).reindex(columns=index.meta['columns'])
+            total_rows = index.total_rows
+        elif page is not None:
+            preview_df, total_rows = page
+        else:
+            df = JSONProcessor.read(file_path)
+            total_rows = len(df)
+            
+            # Apply pagination
+            preview_df = df.iloc[offset:offset + limit]
+        
+        return preview_df, total_rows, preview_df.columns.tolist()
         
     @staticmethod
     def analyze_dataframe(df: pd.DataFrame) -> List[ColumnInfo]:
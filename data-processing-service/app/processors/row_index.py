@@ -0,0 +1,273 @@
+"""
+Byte-offset row index for paginated previews
+
+The index stores the byte offset of every `stride`-th data row of a text
+file, plus the total row count. A preview page then seeks to the closest
+indexed row and reads only the bytes of the requested rows instead of
+parsing the whole file. Row boundaries are found with NumPy over raw byte
+blocks, honouring quoted newlines (CSV), blank lines and comment lines.
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from .cache import CACHE_DIR, purge_stale_sidecars, sidecar_path
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_STRIDE = int(os.getenv('ROW_INDEX_STRIDE', '1024'))
+INDEX_SUFFIX = '.rowidx.npz'
+SCAN_BLOCK_SIZE = 16 * 1024 * 1024
+PAGE_BLOCK_SIZE = 1024 * 1024
+
+NEWLINE = ord('\n')
+# Octets visibles : une ligne qui n'en contient aucun est vide
+VISIBLE_BYTES = np.ones(256, dtype=bool)
+VISIBLE_BYTES[[ord(' '), ord('\t'), ord('\r'), ord('\n')]] = False
+
+
+def _iter_rows(f, start: int, quote: Optional[int], comment: Optional[int],
+               block_size: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Scan a binary file from a row boundary and yield, block by block, the
+    absolute (start, end) offsets of complete rows and a mask of the rows
+    that hold data (not blank, not a comment). `end` is the offset of the
+    newline, or the end of file for a last row without one.
+    """
+    f.seek(start)
+    base = start
+    row_start = start
+    first_byte = -1       # premier octet non blanc de la ligne en cours (-1 : aucun pour l'instant)
+    in_quotes = False
+
+    while True:
+        raw = f.read(block_size)
+        if not raw:
+            break
+
+        buf = np.frombuffer(raw, dtype=np.uint8)
+        newlines = np.flatnonzero(buf == NEWLINE)
+        visible = np.flatnonzero(VISIBLE_BYTES[buf])
+
+        if quote is not None:
+            quotes = np.flatnonzero(buf == quote)
+            if len(quotes) or in_quotes:
+                # Un saut de ligne ne termine la ligne que hors guillemets
+                quotes_before = np.searchsorted(quotes, newlines) + int(in_quotes)
+                newlines = newlines[quotes_before % 2 == 0]
+                in_quotes = bool((len(quotes) + int(in_quotes)) % 2)
+
+        if len(newlines):
+            ends = newlines + base
+            starts = np.empty_like(ends)
+            starts[0] = row_start
+            starts[1:] = ends[:-1] + 1
+
+            # Premier octet non blanc de chaque ligne (la première peut venir du bloc précédent)
+            positions = np.searchsorted(visible, np.maximum(starts - base, 0))
+            has_visible = positions < len(visible)
+            positions = np.minimum(positions, max(len(visible) - 1, 0))
+            has_visible &= visible[positions] + base < ends if len(visible) else False
+            firsts = np.where(has_visible, buf[visible[positions]] if len(visible) else -1, -1).astype(np.int16)
+            if starts[0] < base and first_byte != -1:
+                firsts[0] = first_byte
+
+            data_mask = firsts != -1
+            if comment is not None:
+                data_mask &= firsts != comment
+
+            yield starts, ends, data_mask
+
+            row_start = int(ends[-1]) + 1
+            first_byte = -1
+
+        # Mémoriser le premier octet non blanc de la ligne incomplète pour le bloc suivant
+        if first_byte == -1:
+            position = np.searchsorted(visible, max(row_start - base, 0))
+            if position < len(visible):
+                first_byte = int(buf[visible[position]])
+
+        base += len(buf)
+
+    # Dernière ligne sans saut de ligne final
+    if row_start < base:
+        is_data = first_byte != -1 and (comment is None or first_byte != comment)
+        yield (np.array([row_start], dtype=np.int64), np.array([base], dtype=np.int64),
+               np.array([is_data]))
+
+
+class RowIndex:
+    """Sparse byte-offset index of the data rows of a text file"""
+
+    def __init__(self, file_path: str, data_start: int, offsets: np.ndarray, total_rows: int,
+                 stride: int, quote: Optional[int], comment: Optional[int], meta: Dict):
+        self.file_path = file_path
+        self.data_start = data_start
+        self.offsets = offsets
+        self.total_rows = total_rows
+        self.stride = stride
+        self.quote = quote
+        self.comment = comment
+        self.meta = meta
+
+    @classmethod
+    def build(cls, file_path: str, data_start: int = 0, header_rows: int = 0,
+              quote: Optional[str] = '"', comment: Optional[str] = None,
+              meta: Dict = None, stride: int = INDEX_STRIDE) -> 'RowIndex':
+        """Scan the file once and record the offset of every `stride`-th data row"""
+        quote_byte = ord(quote) if quote else None
+        comment_byte = ord(comment) if comment else None
+
+        chunks = []
+        count = 0
+        skip = header_rows
+
+        with open(file_path, 'rb') as f:
+            for starts, ends, data_mask in _iter_rows(f, data_start, quote_byte, comment_byte, SCAN_BLOCK_SIZE):
+                data_starts = starts[data_mask]
+
+                # Les premières lignes de données sont l'en-tête
+                if skip:
+                    taken = min(skip, len(data_starts))
+                    skip -= taken
+                    if taken:
+                        data_start = int(ends[data_mask][taken - 1]) + 1
+                    data_starts = data_starts[taken:]
+
+                if len(data_starts):
+                    positions = np.arange(count, count + len(data_starts))
+                    chunks.append(data_starts[positions % stride == 0])
+                    count += len(data_starts)
+
+        offsets = np.concatenate(chunks).astype(np.int64) if chunks else np.empty(0, dtype=np.int64)
+        logger.info(f"📇 Row index built for {file_path}: {count} rows")
+
+        return cls(file_path, data_start, offsets, count, stride, quote_byte, comment_byte, meta or {})
+
+    @classmethod
+    def load_or_build(cls, file_path: str, variant: str = 'rowindex',
+                      meta_factory: Callable[[], Dict] = None, **build_kwargs) -> 'RowIndex':
+        """
+        Return the persisted index of the current file version, building it if needed
+
+        `meta_factory` is only called when the index is (re)built, for metadata
+        that is expensive to compute (column names, types...).
+        """
+        path = sidecar_path(file_path, variant, suffix=INDEX_SUFFIX)
+
+        with _loaded_indexes_lock:
+            cached = _loaded_indexes.get(path)
+            if cached is not None:
+                _loaded_indexes.move_to_end(path)
+                return cached
+
+        index = None
+        if os.path.exists(path):
+            try:
+                index = cls._load(file_path, path)
+            except Exception as e:
+                logger.warning(f"⚠️ Corrupted row index {path}, rebuilding: {e}")
+
+        if index is None:
+            if meta_factory is not None:
+                build_kwargs['meta'] = meta_factory()
+            index = cls.build(file_path, **build_kwargs)
+            index._save(file_path, path, variant)
+
+        with _loaded_indexes_lock:
+            _loaded_indexes[path] = index
+            _loaded_indexes.move_to_end(path)
+            if len(_loaded_indexes) > 64:
+                _loaded_indexes.popitem(last=False)
+
+        return index
+
+    @classmethod
+    def _load(cls, file_path: str, path: str) -> 'RowIndex':
+        with np.load(path) as data:
+            header = json.loads(str(data['header']))
+            return cls(
+                file_path,
+                header['data_start'],
+                data['offsets'],
+                header['total_rows'],
+                header['stride'],
+                header['quote'],
+                header['comment'],
+                header['meta']
+            )
+
+    def _save(self, file_path: str, path: str, variant: str) -> None:
+        header = {
+            'data_start': self.data_start,
+            'total_rows': self.total_rows,
+            'stride': self.stride,
+            'quote': self.quote,
+            'comment': self.comment,
+            'meta': self.meta
+        }
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, offsets=self.offsets, header=np.array(json.dumps(header)))
+            os.replace(tmp_path, path)
+            purge_stale_sidecars(file_path, variant, keep=path)
+        except OSError as e:
+            # L'index reste utilisable en mémoire même s'il n'a pas pu être persisté
+            logger.warning(f"⚠️ Could not persist row index for {file_path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def read_rows(self, offset: int, limit: int) -> bytes:
+        """Return the raw bytes of data rows [offset, offset + limit)"""
+        if limit <= 0 or offset >= self.total_rows or len(self.offsets) == 0:
+            return b''
+
+        offset = max(offset, 0)
+        block = offset // self.stride
+        skip = offset - block * self.stride
+        wanted = min(limit, self.total_rows - offset)
+
+        page_start = None
+        page_end = None
+        seen = 0
+
+        with open(self.file_path, 'rb') as f:
+            for starts, ends, data_mask in _iter_rows(f, int(self.offsets[block]), self.quote,
+                                                      self.comment, PAGE_BLOCK_SIZE):
+                data_starts = starts[data_mask]
+                data_ends = ends[data_mask]
+                n = len(data_starts)
+
+                first = skip - seen
+                if page_start is None and 0 <= first < n:
+                    page_start = int(data_starts[first])
+
+                last = skip + wanted - 1 - seen
+                if 0 <= last < n:
+                    page_end = int(data_ends[last]) + 1
+                    break
+
+                seen += n
+
+            if page_start is None:
+                return b''
+            if page_end is None:
+                f.seek(0, os.SEEK_END)
+                page_end = f.tell()
+
+            f.seek(page_start)
+            return f.read(page_end - page_start)
+
+
+# Index déjà chargés, par chemin de sidecar (le chemin change avec le fichier source)
+_loaded_indexes: 'OrderedDict[str, RowIndex]' = OrderedDict()
+# Partagé par les threads de la lane preview
+_loaded_indexes_lock = threading.Lock()
@@ -0,0 +1,254 @@
+import pandas as pd
+import os
+import threading
+from typing import Dict, Iterator, List, Any, Tuple
+from ..models import ColumnInfo
+from ..preprocessing.analyzer import DatasetProfiler, PROFILE_CHUNK_ROWS
+from ..preprocessing import pipeline
+from ..storage import chunk_store, is_manifest, is_materialized, load_manifest
+from .cache import file_signature, frame_cache
+from ..utils import frame_to_records
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _base_processor(base_format: str):
+    """Processor class of the base file of a lazy version"""
+    from .csv_processor import CSVProcessor
+    from .json_processor import JSONProcessor
+    from .arff_processor import ARFFProcessor
+    processors = {
+        'csv': CSVProcessor,
+        'json': JSONProcessor,
+        'ndjson': JSONProcessor,
+        'arff': ARFFProcessor,
+        'version': VersionProcessor
+    }
+    if base_format not in processors:
+        raise ValueError(f"Unsupported base format: {base_format}")
+    return processors[base_format]
+
+
+def _check_base(file_path: str, manifest: Dict) -> None:
+    """Raise ValueError if the base of a lazy version changed since it was recorded"""
+    expected = manifest.get('base_signature')
+    if expected is None:
+        # Manifeste enregistré avant la signature : rien à comparer
+        return
+    try:
+        _, size, mtime_ns = file_signature(manifest['base'])
+    except FileNotFoundError:
+        raise ValueError(f"Base file {manifest['base']} of version {file_path} no longer exists")
+    if [size, mtime_ns] != list(expected):
+        raise ValueError(f"Base file {manifest['base']} of version {file_path} was modified after the version "
+                         f"was recorded, its content can no longer be rebuilt")
+
+
+# Un verrou par manifeste : une version paresseuse n'est matérialisée qu'une fois
+_materialize_locks: Dict[str, threading.Lock] = {}
+_materialize_locks_guard = threading.Lock()
+
+
+class VersionProcessor:
+    """Processor for dataset versions stored as column chunks (see storage.chunks)"""
+
+    @staticmethod
+    def is_version(file_path: str) -> bool:
+        return is_manifest(file_path)
+
+    @staticmethod
+    def read(file_path: str, sample_size: int = None) -> pd.DataFrame:
+        """Read a stored version and return DataFrame (materializing a lazy one first)"""
+        try:
+            # Les chunks sont déjà colonnaires : pas de sidecar, seulement le cache mémoire
+            df = frame_cache.get(file_path, 'version')
+            if df is not None:
+                logger.info(f"⚡ Loaded {file_path} from frame cache")
+                return df.head(sample_size) if sample_size else df
+
+            df = VersionProcessor.materialize(file_path)
+            if df is not None:
+                return df.head(sample_size) if sample_size else df
+
+            if sample_size:
+                return chunk_store.read_version(file_path, limit=sample_size)
+
+            key = frame_cache.key(file_path, 'version')
+            df = frame_cache.put(file_path, 'version', chunk_store.read_version(file_path), key=key)
+
+            logger.info(f"Successfully read version with {len(df)} rows")
+            return df
+
+        except Exception as e:
+            logger.error(f"Error reading dataset version: {e}")
+            raise
+
+    @staticmethod
+    def write(df: pd.DataFrame, file_path: str, base: str = None, changed: List[str] = None) -> Dict:
+        """Store a DataFrame as a version (only the chunks missing from the store are written)"""
+        return chunk_store.write_version(df, file_path, base=base, changed=changed)
+
+    @staticmethod
+    def record(file_path: str, source_path: str, source_format: str, operation: Dict) -> Dict:
+        """
+        Record a lazy version of `source_path` with one more operation, returns
+        the transformation info of that operation
+
+        A lazy source passes on its own base and log, so a chain of edits is
+        always replayed from the last materialized data in a single pass.
+        Before recording, the log is replayed on every row of the base columns
+        it touches (the other columns are not read): a step that cannot apply
+        to the whole base is refused and the source is left as it was.
+        """
+        base, base_format, operations, base_signature = source_path, source_format, [], None
+        if is_manifest(source_path):
+            source = load_manifest(source_path)
+            base_format = 'version'
+            if not is_materialized(source):
+                _check_base(source_path, source)
+                base, base_format, operations = source['base'], source['base_format'], source['operations']
+                base_signature = source.get('base_signature')
+
+        operations = operations + [operation]
+        processor = _base_processor(base_format)
+        _, _, base_columns = processor.get_preview_frame(base, limit=1)
+        changed = pipeline.changed_columns(operations)
+        touched = [column for column in base_columns if column in changed]
+
+        infos = pipeline.validate(VersionProcessor._read_columns(processor, base, touched), operations,
+                                  other_columns=len(base_columns) - len(touched))
+
+        chunk_store.write_lazy(file_path, base, base_format, operations, base_signature=base_signature)
+        return infos[-1]
+
+    @staticmethod
+    def _read_columns(processor, file_path: str, columns: List[str]) -> pd.DataFrame:
+        """Every row of some columns of a base file, read chunk by chunk"""
+        if not columns:
+            return pd.DataFrame()
+        try:
+            chunks = list(processor.iter_chunks(file_path, columns=columns))
+        except UnicodeDecodeError:
+            # Encodage à corriger au-delà de l'échantillon : la lecture complète s'en charge
+            return processor.read(file_path)[columns]
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(chunks, ignore_index=True)
+
+    @staticmethod
+    def materialize(file_path: str):
+        """
+        Replay the log of a lazy version and store the result as chunks
+
+        Returns the DataFrame, or None if the version is already materialized.
+        Only the columns written by the log are stored; the others reuse the
+        chunks of a stored base.
+        """
+        with _materialize_locks_guard:
+            lock = _materialize_locks.setdefault(os.path.abspath(file_path), threading.Lock())
+
+        with lock:
+            manifest = load_manifest(file_path)
+            if is_materialized(manifest):
+                return None
+
+            _check_base(file_path, manifest)
+            operations = pipeline.optimize(manifest['operations'])
+            logger.info(f"⚙️ Materializing {file_path}: {len(manifest['operations'])} operations "
+                        f"fused into {len(operations)}")
+
+            base_df = _base_processor(manifest['base_format']).read(manifest['base'])
+            df, _ = pipeline.apply_operations(base_df, operations)
+
+            chunk_store.write_version(
+                df, file_path,
+                base=manifest['base'],
+                changed=pipeline.changed_columns(operations),
+                extra={key: manifest[key] for key in ('base', 'base_format', 'operations')}
+            )
+            key = frame_cache.key(file_path, 'version')
+            return frame_cache.put(file_path, 'version', df, key=key)
+
+    @staticmethod
+    def _manifest(file_path: str) -> Dict:
+        """Manifest of a version, materialized if it was lazy"""
+        manifest = load_manifest(file_path)
+        if not is_materialized(manifest):
+            VersionProcessor.materialize(file_path)
+            manifest = load_manifest(file_path)
+        return manifest
+
+    @staticmethod
+    def iter_chunks(file_path: str, chunksize: int = PROFILE_CHUNK_ROWS, columns: List[str] = None) -> Iterator[pd.DataFrame]:
+        """Read the version as successive DataFrames of at most `chunksize` rows"""
+        for chunk in chunk_store.read_chunks(VersionProcessor._manifest(file_path), columns):
+            for start in range(0, len(chunk), chunksize):
+                yield chunk.iloc[start:start + chunksize]
+
+    @staticmethod
+    def profile(file_path: str, columns: List[str] = None, **profiler_kwargs) -> DatasetProfiler:
+        """Profile the version chunk by chunk, memory bounded by the chunk size"""
+        return DatasetProfiler.from_chunks(
+            VersionProcessor.iter_chunks(file_path, columns=columns),
+            **profiler_kwargs
+        )
+
+    @staticmethod
+    def get_preview(file_path: str, limit: int = 100, offset: int = 0) -> Tuple[List[Dict], int, List[str]]:
+        """Get preview data from a version"""
+        preview_df, total_rows, columns = VersionProcessor.get_preview_frame(file_path, limit, offset)
+        return frame_to_records(preview_df), total_rows, columns
+
+    @staticmethod
+    def get_preview_frame(file_path: str, limit: int = 100, offset: int = 0) -> Tuple[pd.DataFrame, int, List[str]]:
+        """Get a preview page as a DataFrame, reading only the chunks of the page"""
+        total_rows = VersionProcessor._manifest(file_path)['rows']
+        preview_df = chunk_store.read_version(file_path, offset=offset, limit=limit)
+        return preview_df, total_rows, preview_df.columns.tolist()
+
+    @staticmethod
+    def analyze_dataframe(df: pd.DataFrame) -> List[ColumnInfo]:
+        """Analyze version DataFrame - reuse CSV processor logic"""
+        from .csv_processor import CSVProcessor
+        return CSVProcessor.analyze_dataframe(df)
+
+    # ========== DÉLÉGUER LES MÉTHODES DE PREPROCESSING À CSVProcessor ==========
+
+    @staticmethod
+    def detect_custom_missing_values(series: pd.Series, custom_values: List[str]) -> pd.Series:
+        """Delegate to CSVProcessor"""
+        from .csv_processor import CSVProcessor
+        return CSVProcessor.detect_custom_missing_values(series, custom_values)
+
+    @staticmethod
+    def detect_outliers_iqr(series: pd.Series, multiplier: float = 1.5) -> Dict[str, Any]:
+        """Delegate to CSVProcessor"""
+        from .csv_processor import CSVProcessor
+        return CSVProcessor.detect_outliers_iqr(series, multiplier)
+
+    @staticmethod
+    def detect_outliers_zscore(series: pd.Series, threshold: float = 3.0) -> Dict[str, Any]:
+        """Delegate to CSVProcessor"""
+        from .csv_processor import CSVProcessor
+        return CSVProcessor.detect_outliers_zscore(series, threshold)
+
+    @staticmethod
+    def detect_outliers_range(series: pd.Series, min_val: float = None, max_val: float = None) -> Dict[str, Any]:
+        """Delegate to CSVProcessor"""
+        from .csv_processor import CSVProcessor
+        return CSVProcessor.detect_outliers_range(series, min_val, max_val)
+
+    @staticmethod
+    def get_value_frequencies(series: pd.Series, top_n: int = 20) -> Dict[str, int]:
+        """Delegate to CSVProcessor"""
+        from .csv_processor import CSVProcessor
+        return CSVProcessor.get_value_frequencies(series, top_n)
+
+    @staticmethod
+    def analyze_column_advanced(series: pd.Series, column_name: str,
+                               custom_missing: List[str] = None,
+                               detect_outliers: bool = True) -> Dict[str, Any]:
+        """Delegate to CSVProcessor"""
+        from .csv_processor import CSVProcessor
+        return CSVProcessor.analyze_column_advanced(series, column_name, custom_missing, detect_outliers)
@@ -0,0 +1,221 @@
+"""
+Scheduling of CPU-bound work off the event loop
+
+Heavy routes (parsing, pandas/NumPy transformations, predictions...) run
+on named lanes instead of the event loop. A lane has a concurrency limit, a
+bounded queue and its own thread pool; pandas, NumPy and scikit-learn
+release the GIL in their heavy loops, and the work that needs several cores
+fans out on its own (column-parallel analysis on the process pool of
+preprocessing.parallel). Training is not scheduled here: it goes through
+the durable queue of ml.worker. When a lane's queue is full, the request is
+rejected with SchedulerBusy (503) instead of piling up.
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Lanes par défaut : nom -> (requêtes exécutées en même temps, requêtes en attente)
+DEFAULT_LANES = {
+    'process': (4, 16),          # /process, /statistics
+    'preview': (8, 64),          # /preview, aperçus de transformations
+    'analysis': (2, 8),          # /analyze-advanced (parallèle par colonnes en interne)
+    'preprocess': (4, 16),       # /preprocess, /preprocess/batch, /transform-*
+    'predict': (8, 64),
+    'visualize': (2, 8)
+}
+# Surcharges, ex. "predict=16/128,preview=4/32" (concurrence/attente)
+SCHEDULER_LANES = os.getenv('SCHEDULER_LANES', '')
+# Délai suggéré au client (header Retry-After) quand une file est pleine
+SCHEDULER_RETRY_AFTER = int(os.getenv('SCHEDULER_RETRY_AFTER', '5'))
+
+
+class SchedulerBusy(Exception):
+    """Raised when a lane already holds as many queued jobs as it accepts"""
+
+    def __init__(self, lane: str, queued: int):
+        super().__init__(f"Lane '{lane}' is saturated ({queued} requests waiting), retry later")
+        self.lane = lane
+        self.retry_after = SCHEDULER_RETRY_AFTER
+
+
+class Lane:
+    """Concurrency limit and bounded FIFO queue in front of a thread pool"""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self._queue = deque()        # (future, fn, args, kwargs, instant de mise en attente)
+        self._running = 0
+        self._lock = threading.Lock()
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'cancelled': 0,
+            'peak_queued': 0,
+            'wait_time': 0.0,
+            'run_time': 0.0
+        }
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                   thread_name_prefix=f"lane-{self.name}")
+            return self._threads
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue `fn(*args, **kwargs)`, raises SchedulerBusy if the queue is full"""
+        future = Future()
+        with self._lock:
+            if self._running >= self.concurrency and len(self._queue) >= self.max_queue:
+                self._stats['rejected'] += 1
+                raise SchedulerBusy(self.name, len(self._queue))
+            self._queue.append((future, fn, args, kwargs, time.monotonic()))
+            self._stats['submitted'] += 1
+            self._stats['peak_queued'] = max(self._stats['peak_queued'], len(self._queue))
+        self._dispatch()
+        return future
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._lock:
+                if self._running >= self.concurrency or not self._queue:
+                    return
+                future, fn, args, kwargs, queued_at = self._queue.popleft()
+                # Requête abandonnée (client déconnecté) pendant l'attente
+                if not future.set_running_or_notify_cancel():
+                    self._stats['cancelled'] += 1
+                    continue
+                self._running += 1
+                started = time.monotonic()
+                self._stats['wait_time'] += started - queued_at
+
+            try:
+                inner = self._executor().submit(fn, *args, **kwargs)
+            except Exception as e:
+                self._finish(future, started, error=e)
+                continue
+            inner.add_done_callback(functools.partial(self._on_done, future, started))
+
+    def _on_done(self, future: Future, started: float, inner: Future) -> None:
+        error = CancelledError() if inner.cancelled() else inner.exception()
+        self._finish(future, started, error=error, result=None if error else inner.result())
+
+    def _finish(self, future: Future, started: float, error: BaseException = None, result=None) -> None:
+        with self._lock:
+            self._running -= 1
+            self._stats['run_time'] += time.monotonic() - started
+            self._stats['failed' if error is not None else 'completed'] += 1
+
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        self._dispatch()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            running, queued = self._running, len(self._queue)
+        started = stats['completed'] + stats['failed'] + running
+        finished = stats['completed'] + stats['failed']
+        wait_time, run_time = stats.pop('wait_time'), stats.pop('run_time')
+        return {
+            'concurrency': self.concurrency,
+            'max_queue': self.max_queue,
+            'running': running,
+            'queued': queued,
+            'avg_wait_ms': round(wait_time / started * 1000, 2) if started else 0.0,
+            'avg_run_ms': round(run_time / finished * 1000, 2) if finished else 0.0,
+            **stats
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            threads, self._threads = self._threads, None
+            queued, self._queue = list(self._queue), deque()
+        for future, *_ in queued:
+            future.cancel()
+        if threads is not None:
+            threads.shutdown(wait=False, cancel_futures=True)
+
+
+def _parse_overrides(spec: str) -> Dict[str, tuple]:
+    overrides = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        try:
+            name, limits = item.split('=')
+            concurrency, max_queue = limits.split('/')
+            overrides[name.strip()] = (int(concurrency), int(max_queue))
+        except ValueError:
+            logger.warning(f"⚠️ Ignoring invalid SCHEDULER_LANES entry: {item}")
+    return overrides
+
+
+class Scheduler:
+    """Named lanes shared by the routes"""
+
+    def __init__(self, lanes: Dict[str, tuple] = None, overrides: str = SCHEDULER_LANES):
+        limits = _parse_overrides(overrides)
+        self.lanes: Dict[str, Lane] = {}
+        for name, (concurrency, max_queue) in (lanes or DEFAULT_LANES).items():
+            concurrency, max_queue = limits.get(name, (concurrency, max_queue))
+            self.lanes[name] = Lane(name, concurrency, max_queue)
+
+    def lane(self, name: str) -> Lane:
+        if name not in self.lanes:
+            raise ValueError(f"Unknown lane: {name}")
+        return self.lanes[name]
+
+    def submit(self, lane: str, fn: Callable, *args, **kwargs) -> Future:
+        """Schedule a call on a lane and return its concurrent Future"""
+        return self.lane(lane).submit(fn, *args, **kwargs)
+
+    def call(self, lane: str, fn: Callable, *args, **kwargs):
+        """Run a call on a lane and wait for its result (from synchronous code)"""
+        return self.submit(lane, fn, *args, **kwargs).result()
+
+    async def run(self, lane: str, fn: Callable, *args, **kwargs):
+        """Run a call on a lane without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(lane, fn, *args, **kwargs))
+
+    def stats(self) -> Dict:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def shutdown(self) -> None:
+        for lane in self.lanes.values():
+            lane.shutdown()
+
+
+scheduler = Scheduler()
+
+
+def offload(lane: str):
+    """
+    Run a synchronous route handler on a lane of the scheduler
+
+    The decorated handler becomes a coroutine for FastAPI (same signature),
+    so the event loop only waits on the lane while the handler parses,
+    computes and talks to the database in a worker thread.
+    """
+    scheduler.lane(lane)  # lane inconnue : erreur dès l'import
+
+    def decorator(handler: Callable):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            return await scheduler.run(lane, handler, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,3 @@
+from .chunks import ChunkStore, chunk_store, is_manifest, is_materialized, load_manifest, MANIFEST_SUFFIX
+
+__all__ = ['ChunkStore', 'chunk_store', 'is_manifest', 'is_materialized', 'load_manifest', 'MANIFEST_SUFFIX']
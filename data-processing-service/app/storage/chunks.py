@@ -0,0 +1,270 @@
+"""
+Content-addressed column chunk store for dataset versions
+
+A dataset version is a small JSON manifest listing, for every column, the
+hashes of its row chunks. Each chunk is one column slice serialized as an
+Arrow IPC file and stored under its SHA-256, so identical chunks are kept
+once whatever the version, file or column name they belong to.
+
+A new version built from a stored one reuses the chunk lists of the
+unchanged columns: only the modified columns are serialized and written,
+so a version costs O(changed columns) in I/O and disk instead of a full
+copy of the dataset.
+
+A manifest can also be lazy: a base file plus an operation log (see
+preprocessing.pipeline), without chunks until it is first materialized.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.warning("pyarrow not installed. Versions are stored as CSV. Install with: pip install pyarrow")
+
+
+STORE_DIR = os.getenv('VERSION_STORE_DIR', '/app/uploads/.chunks')
+VERSION_CHUNK_ROWS = int(os.getenv('VERSION_CHUNK_ROWS', '1000000'))
+# Compression des chunks : 'zstd', 'lz4' ou 'uncompressed'
+VERSION_COMPRESSION = os.getenv('VERSION_STORE_COMPRESSION', 'zstd')
+
+MANIFEST_SUFFIX = '.version.json'
+MANIFEST_MAGIC = b'{"chunk_store"'
+STORE_FORMAT = 1
+# Nom de champ fixe : le hash d'un chunk ne dépend pas du nom de la colonne
+CHUNK_FIELD = 'values'
+
+
+def is_manifest(file_path: str) -> bool:
+    """True if the file is a version manifest (by suffix, else by its first bytes)"""
+    if file_path.endswith(MANIFEST_SUFFIX):
+        return True
+    if not file_path.endswith('.json'):
+        return False
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(len(MANIFEST_MAGIC)) == MANIFEST_MAGIC
+    except OSError:
+        return False
+
+
+def load_manifest(file_path: str) -> Dict:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('chunk_store') != STORE_FORMAT:
+        raise ValueError(f"Unsupported version manifest: {file_path}")
+    return manifest
+
+
+def is_materialized(manifest: Dict) -> bool:
+    """True if the manifest lists chunks (False for a lazy version not read yet)"""
+    return 'columns' in manifest
+
+
+def _write_atomic(path: str, data) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ChunkStore:
+    """Deduplicated store of column chunks addressed by content hash"""
+
+    def __init__(self, root: str = STORE_DIR, chunk_rows: int = VERSION_CHUNK_ROWS,
+                 compression: str = VERSION_COMPRESSION):
+        self.root = root
+        self.chunk_rows = chunk_rows
+        self.compression = None if compression == 'uncompressed' else compression
+
+    @property
+    def enabled(self) -> bool:
+        return PYARROW_AVAILABLE
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], f"{digest}.arrow")
+
+    # ========== ÉCRITURE ==========
+
+    def _encode(self, values: pd.Series) -> bytes:
+        """Serialize a column slice as a single-field Arrow IPC file"""
+        frame = pd.DataFrame({CHUNK_FIELD: values.reset_index(drop=True)})
+        try:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Colonne objet aux types mélangés : valeurs conservées en texte
+            frame[CHUNK_FIELD] = frame[CHUNK_FIELD].where(frame[CHUNK_FIELD].isna(), frame[CHUNK_FIELD].astype(str))
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+
+        sink = pa.BufferOutputStream()
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def put_chunk(self, values: pd.Series) -> Tuple[str, int]:
+        """Store one column slice, returns (hash, bytes written - 0 if already stored)"""
+        data = self._encode(values)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_atomic(path, data)
+        return digest, len(data)
+
+    def write_version(self, df: pd.DataFrame, manifest_path: str, base: Optional[str] = None,
+                      changed: Optional[Iterable[str]] = None, extra: Dict = None) -> Dict:
+        """
+        Store `df` as a version manifest at `manifest_path`
+
+        When `base` is the manifest the frame was derived from and `changed`
+        lists the columns that were modified, the other columns of the same
+        name reuse the chunks of the base without being serialized again.
+        Without `changed` every column is hashed, and only chunks not already
+        in the store are written. `extra` fields are kept in the manifest.
+        """
+        reusable = {}
+        base_manifest = load_manifest(base) if base is not None and changed is not None and is_manifest(base) else None
+        if base_manifest is not None and is_materialized(base_manifest):
+            # Réutilisable seulement si les lignes (et donc les chunks) sont les mêmes
+            if base_manifest['rows'] == len(df) and base_manifest['chunk_rows'] == self.chunk_rows:
+                changed = set(changed)
+                reusable = {
+                    column['name']: column for column in base_manifest['columns']
+                    if column['name'] not in changed
+                }
+
+        n_rows = len(df)
+        bounds = list(range(0, n_rows, self.chunk_rows)) or [0]
+        columns = []
+        reused = 0
+        written_chunks = 0
+        written_bytes = 0
+
+        for position, name in enumerate(df.columns):
+            if name in reusable:
+                columns.append(reusable[name])
+                reused += 1
+                continue
+
+            series = df.iloc[:, position]
+            chunks = []
+            for start in bounds:
+                digest, size = self.put_chunk(series.iloc[start:start + self.chunk_rows])
+                chunks.append(digest)
+                written_chunks += bool(size)
+                written_bytes += size
+            columns.append({'name': name, 'dtype': str(series.dtype), 'chunks': chunks})
+
+        manifest = {
+            'chunk_store': STORE_FORMAT,
+            **(extra or {}),
+            'rows': n_rows,
+            'chunk_rows': self.chunk_rows,
+            'chunk_sizes': [min(self.chunk_rows, n_rows - start) for start in bounds],
+            'columns': columns,
+            'parent': os.path.abspath(base) if base else None
+        }
+        _write_atomic(manifest_path, json.dumps(manifest).encode('utf-8'))
+
+        logger.info(f"💾 Version stored at {manifest_path}: {len(columns) - reused} columns written "
+                    f"({written_chunks} new chunks, {written_bytes / 1024 / 1024:.1f} MB), {reused} reused")
+        return {
+            'manifest': manifest_path,
+            'columns_written': len(columns) - reused,
+            'columns_reused': reused,
+            'chunks_written': written_chunks,
+            'bytes_written': written_bytes
+        }
+
+    def write_lazy(self, manifest_path: str, base: str, base_format: str, operations: List[Dict],
+                   base_signature: List[int] = None) -> Dict:
+        """
+        Record a version as `base` + `operations` without reading any data
+
+        `base_signature` ([size, mtime_ns], the current one by default) is
+        what the base must still be when the version is materialized: a base
+        rewritten in place would otherwise change the content of the version.
+        """
+        if base_signature is None:
+            stat = os.stat(base)
+            base_signature = [stat.st_size, stat.st_mtime_ns]
+        manifest = {
+            'chunk_store': STORE_FORMAT,
+            'base': os.path.abspath(base),
+            'base_format': base_format,
+            'base_signature': list(base_signature),
+            'operations': operations,
+            'parent': os.path.abspath(base)
+        }
+        _write_atomic(manifest_path, json.dumps(manifest).encode('utf-8'))
+        logger.info(f"💾 Lazy version recorded at {manifest_path}: {len(operations)} operations on {base}")
+        return manifest
+
+    # ========== LECTURE ==========
+
+    def _read_chunk(self, digest: str) -> pd.Series:
+        with pa.memory_map(self.object_path(digest), 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas()[CHUNK_FIELD]
+
+    def _chunk_range(self, manifest: Dict, offset: int, limit: Optional[int]) -> List[int]:
+        """Indexes of the chunks overlapping rows [offset, offset + limit)"""
+        end = manifest['rows'] if limit is None else min(offset + limit, manifest['rows'])
+        indexes = []
+        start = 0
+        for i, size in enumerate(manifest['chunk_sizes']):
+            if start < end and start + size > offset:
+                indexes.append(i)
+            start += size
+        return indexes
+
+    def read_chunks(self, manifest: Dict, columns: List[str] = None,
+                    chunk_indexes: Iterable[int] = None) -> Iterator[pd.DataFrame]:
+        """Yield the version chunk by chunk as DataFrames (optionally a subset of columns)"""
+        entries = manifest['columns']
+        if columns is not None:
+            wanted = set(columns)
+            entries = [column for column in entries if column['name'] in wanted]
+        if chunk_indexes is None:
+            chunk_indexes = range(len(manifest['chunk_sizes']))
+
+        for i in chunk_indexes:
+            yield pd.DataFrame({column['name']: self._read_chunk(column['chunks'][i]) for column in entries},
+                               columns=[column['name'] for column in entries])
+
+    def read_version(self, manifest_path: str, columns: List[str] = None,
+                     offset: int = 0, limit: Optional[int] = None) -> pd.DataFrame:
+        """Read a version (or rows [offset, offset + limit) of it) as a DataFrame"""
+        manifest = load_manifest(manifest_path)
+        indexes = self._chunk_range(manifest, offset, limit)
+        chunks = list(self.read_chunks(manifest, columns, indexes))
+        if not chunks:
+            names = [column['name'] for column in manifest['columns']]
+            return pd.DataFrame(columns=names if columns is None else [n for n in names if n in set(columns)])
+
+        df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+        first_row = sum(manifest['chunk_sizes'][:indexes[0]])
+        if offset > first_row or limit is not None:
+            start = offset - first_row
+            df = df.iloc[start:start + limit if limit is not None else None].reset_index(drop=True)
+        return df
+
+
+chunk_store = ChunkStore()
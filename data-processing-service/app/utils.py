@@ -1,6 +1,30 @@
+import json
+import logging
+import math
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    logger.warning("orjson not installed. Falling back to json for responses. Install with: pip install orjson")
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
 
 
 def clean_value_for_json(value):
@@ -46,4 +70,196 @@ def clean_records_for_json(records: List[Dict]) -> List[Dict]:
         for key, value in row.items():
             cleaned_row[key] = clean_value_for_json(value)
         cleaned_records.append(cleaned_row)
-    return cleaned_records
\ No newline at end of file
+    return cleaned_records
+
+
+# ========== SÉRIALISATION COLONNE PAR COLONNE ==========
+
+def _json_safe_cell(value):
+    """JSON-safe version of one non-null cell of an object column"""
+    if isinstance(value, (float, np.floating)):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, (np.bool_, bool)):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def json_safe_column(series: pd.Series) -> List:
+    """
+    Convert a column to a list of JSON-safe Python values, vectorized by dtype
+
+    NaN / Infinity / NA become None and numpy scalars native Python types,
+    like clean_value_for_json, but whole columns are converted at once with
+    `tolist()`. Only object columns holding more than strings fall back to
+    a per-cell conversion.
+    """
+    dtype = series.dtype
+    kind = getattr(dtype, 'kind', 'O')
+
+    if kind in 'iub' and isinstance(dtype, np.dtype):
+        return series.to_numpy().tolist()
+
+    if kind == 'f' and isinstance(dtype, np.dtype):
+        array = series.to_numpy()
+        values = array.tolist()
+        for position in np.flatnonzero(~np.isfinite(array)):
+            values[position] = None
+        return values
+
+    if kind == 'M':
+        return [None if pd.isna(value) else value.isoformat() for value in series.astype(object)]
+
+    array = series.to_numpy(dtype=object)
+    values = array.tolist()
+    for position in np.flatnonzero(pd.isna(array)):
+        values[position] = None
+
+    if pd.api.types.infer_dtype(array, skipna=True) not in ('string', 'empty'):
+        values = [None if value is None else _json_safe_cell(value) for value in values]
+    return values
+
+
+def frame_to_columns(df: pd.DataFrame) -> Dict[Any, List]:
+    """JSON-safe column-oriented view of a DataFrame ({column: values})"""
+    return {column: json_safe_column(df.iloc[:, position]) for position, column in enumerate(df.columns)}
+
+
+def frame_to_records(df: pd.DataFrame) -> List[Dict]:
+    """
+    JSON-safe records of a DataFrame, same output as
+    clean_records_for_json(df.to_dict('records')) without the per-cell loop
+    """
+    if len(df.columns) == 0:
+        return [{} for _ in range(len(df))]
+    columns = list(df.columns)
+    values = [json_safe_column(df.iloc[:, position]) for position in range(len(columns))]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def _json_default(value):
+    """Types orjson / json cannot encode on their own"""
+    if isinstance(value, BaseModel):
+        # Copie superficielle : les modèles imbriqués repassent par ici
+        return dict(value)
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return _json_safe_cell(value.item())
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if value is pd.NA or value is pd.NaT:
+        return None
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _finite(value):
+    """Copy of a decoded structure with NaN / Infinity replaced by None (json fallback)"""
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return _finite(value.tolist())
+    if isinstance(value, (float, np.floating)):
+        return _json_safe_cell(value)
+    return value
+
+
+def dumps(content) -> bytes:
+    """Encode to JSON bytes (orjson when available, NaN / Infinity as null)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            content,
+            default=_json_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    # json écrirait NaN tel quel (JSON invalide) : valeurs non finies nettoyées d'abord
+    return json.dumps(
+        _finite(content),
+        default=lambda value: _finite(_json_default(value)),
+        ensure_ascii=False,
+        allow_nan=False
+    ).encode('utf-8')
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response encoded with `dumps`
+
+    Returning it from an endpoint skips FastAPI's response_model validation
+    and jsonable_encoder pass, which dominate the cost of large previews.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# ========== NÉGOCIATION DU FORMAT DES DONNÉES TABULAIRES ==========
+
+ARROW_STREAM_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+# Métadonnées du schéma Arrow portant les champs non tabulaires de la réponse
+ARROW_METADATA_KEY = b'inovadata'
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Pick 'records' (JSON array of objects), 'columns' (JSON {column: values})
+    or 'arrow' (Arrow IPC stream): an explicit `format` wins over the Accept header
+    """
+    response_format = requested or ('arrow' if accept and ARROW_STREAM_MEDIA_TYPE in accept else 'records')
+    if response_format == 'arrow' and not PYARROW_AVAILABLE:
+        raise HTTPException(status_code=406, detail="Arrow responses need pyarrow")
+    return response_format
+
+
+def _arrow_column(series: pd.Series):
+    try:
+        return pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # Colonne objet à types mélangés : transmise en texte
+        return pa.array([None if value is None else str(value) for value in json_safe_column(series)],
+                        type=pa.string())
+
+
+def frame_to_arrow(df: pd.DataFrame):
+    """Arrow table of a DataFrame (column names as text, mixed columns as strings)"""
+    arrays = [_arrow_column(df.iloc[:, position]) for position in range(len(df.columns))]
+    return pa.Table.from_arrays(arrays, names=[str(column) for column in df.columns])
+
+
+def encode_table(df: pd.DataFrame, response_format: str):
+    """Table part of a response: records list, {column: values} dict or Arrow table"""
+    if response_format == 'arrow':
+        return frame_to_arrow(df)
+    if response_format == 'columns':
+        return frame_to_columns(df)
+    return frame_to_records(df)
+
+
+def tabular_response(fields: Dict[str, Any], table_key: str, table, response_format: str) -> Response:
+    """
+    Response made of `fields` plus one table (built by encode_table)
+
+    JSON formats put the table under `table_key`. The Arrow format streams
+    the table itself and carries the other fields as JSON in the schema
+    metadata, so one request still returns everything.
+    """
+    if response_format != 'arrow':
+        return FastJSONResponse({**fields, table_key: table})
+
+    metadata = {key: value for key, value in fields.items() if key != table_key}
+    table = table.replace_schema_metadata({ARROW_METADATA_KEY: dumps(metadata)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_STREAM_MEDIA_TYPE)
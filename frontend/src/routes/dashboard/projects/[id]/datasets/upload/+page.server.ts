@@ -61,11 +61,11 @@ export const actions: Actions = {
     }
 
     // Check file type
-    const allowedTypes = ['.csv', '.json', '.arff'];
+    const allowedTypes = ['.csv', '.json', '.ndjson', '.jsonl', '.arff'];
     const fileExtension = '.' + file.name.split('.').pop()?.toLowerCase();
     if (!allowedTypes.includes(fileExtension)) {
       return fail(400, { 
-        error: 'Invalid file type. Only CSV, JSON, and ARFF files are allowed',
+        error: 'Invalid file type. Only CSV, JSON, NDJSON and ARFF files are allowed',
         name,
         description
       });
@@ -118,7 +118,7 @@ export const actions: Actions = {
         name,
         filename: file.name,
         file_path: filePath,
-        file_format: fileExtension.replace('.', ''),
+        file_format: fileExtension === '.jsonl' ? 'ndjson' : fileExtension.replace('.', ''),
         file_size: file.size,
         rows_count: 0,
         columns_count: 0,
@@ -126,6 +126,18 @@ CREATE TABLE ml_experiments (
     status VARCHAR(20) DEFAULT 'pending',
     error_message TEXT,
     
+    -- File d'entraînement (voir data-processing-service/app/ml/worker.py)
+    queued_at TIMESTAMP,
+    started_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    worker_id VARCHAR(100),
+    attempts INT DEFAULT 0,
+    
+    -- Recherche d'hyperparamètres (voir data-processing-service/app/ml/search.py) :
+    -- configuration sur l'expérience parente, candidats en lignes enfants
+    parent_id INT REFERENCES ml_experiments(id) ON DELETE CASCADE,
+    search_config JSONB,
+    
     -- Audit
     created_by INT NOT NULL REFERENCES users(id),
     created_at TIMESTAMP DEFAULT NOW(),
@@ -164,5 +176,7 @@ CREATE TABLE activity_logs (
 CREATE INDEX idx_projects_owner ON projects(owner_id);
 CREATE INDEX idx_datasets_project ON datasets(project_id);
 CREATE INDEX idx_experiments_project ON ml_experiments(project_id);
+CREATE INDEX idx_experiments_queue ON ml_experiments(queued_at) WHERE status = 'pending' AND queued_at IS NOT NULL;
+CREATE INDEX idx_experiments_parent ON ml_experiments(parent_id) WHERE parent_id IS NOT NULL;
 CREATE INDEX idx_sessions_user ON sessions(user_id);
 CREATE INDEX idx_sessions_expires ON sessions(expires_at);
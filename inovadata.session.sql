@@ -127,3 +127,27 @@ CREATE TABLE ml_experiments (
 
 CREATE INDEX idx_ml_experiments_dataset ON ml_experiments(dataset_id);
 CREATE INDEX idx_ml_experiments_status ON ml_experiments(status);
+
+
+--@block
+-- File d'entraînement durable : /train met l'expérience en file (queued_at),
+-- les workers la prennent avec SELECT ... FOR UPDATE SKIP LOCKED
+ALTER TABLE ml_experiments
+ADD COLUMN IF NOT EXISTS queued_at TIMESTAMP,
+ADD COLUMN IF NOT EXISTS started_at TIMESTAMP,
+ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP,
+ADD COLUMN IF NOT EXISTS worker_id VARCHAR(100),
+ADD COLUMN IF NOT EXISTS attempts INT DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_experiments_queue ON ml_experiments(queued_at)
+WHERE status = 'pending' AND queued_at IS NOT NULL;
+
+
+--@block
+-- Recherche d'hyperparamètres : expérience parente (search_config) et candidats enfants
+ALTER TABLE ml_experiments
+ADD COLUMN IF NOT EXISTS parent_id INT REFERENCES ml_experiments(id) ON DELETE CASCADE,
+ADD COLUMN IF NOT EXISTS search_config JSONB;
+
+CREATE INDEX IF NOT EXISTS idx_experiments_parent ON ml_experiments(parent_id)
+WHERE parent_id IS NOT NULL;